@@ -1,19 +1,37 @@
-from flask import Flask, render_template, request, redirect, jsonify
+from flask import Flask, Response, render_template, request, redirect, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from auth import authenticate, User
-from database import setup, connect
+from database import (
+    setup, connect, init_app, pool_stats, read_only, placeholders, values_rows, for_update, begin_write,
+    change_horizon, IntegrityError
+)
+from audit import record as record_audit, record_many as record_audit_many
+from events import publish, stock_payload, stream as event_stream
+from stock_ledger import record_movements, stock_as_of, parse_as_of
+from history import history_page, parse_filters as parse_history_filters
+from search import search as search_history, PAGE_SIZE as SEARCH_PAGE_SIZE
+from catalog import (
+    list_products, parse_filters as parse_inventory_filters,
+    total as inventory_total, facets as inventory_facets,
+    clear_cache as clear_inventory_cache
+)
+from product_import import import_products, read_rows, ImportFileError
+from rollups import (
+    SalesDelta, GRANULARITIES, parse_range, sales_series, downsample,
+    top_products as rollup_top_products
+)
 from flask import abort
 from werkzeug.security import generate_password_hash
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import datetime, os, uuid, json
-from math import ceil
+import datetime, os, uuid, json, hashlib
 
 # ===================== APP SETUP =====================
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret")
 csrf = CSRFProtect(app)
+init_app(app)
 
 limiter = Limiter(
     get_remote_address,
@@ -108,22 +126,18 @@ def load_user(user_id):
 
 
 # ===================== AUDIT LOG =====================
-def log_action(action, product, details=""):
-    conn = connect()
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO audit_logs (action, product_name, details, created_at)
-        VALUES (%s, %s, %s, %s)
-    """, (
+def log_action(c, action, product, details=""):
+    # Call before the caller's commit; see audit.py for AUDIT_MODE
+    record_audit(
+        c,
         action,
         product,
         details,
-        datetime.datetime.now().isoformat()
-    ))
-    conn.commit()
-    conn.close()
+        current_user.username if current_user.is_authenticated else None
+    )
 
 @app.route("/landing")
+@read_only
 def landing():
     conn = connect()
     c = conn.cursor()
@@ -214,43 +228,68 @@ def logout():
 # ===================== INVENTORY =====================
 @app.route("/inventory")
 @login_required
+@read_only
 def inventory():
     if current_user.role not in ["admin", "staff"]:
         return redirect("/")
 
-    page = int(request.args.get("page", 1))
-    per_page = 10
-    offset = (page - 1) * per_page
+    try:
+        filters = parse_inventory_filters(request.args)
+    except ValueError:
+        filters = parse_inventory_filters({})
 
     conn = connect()
     c = conn.cursor()
-
-    # Count total
-    c.execute("SELECT COUNT(*) FROM products WHERE is_deleted = 0")
-    total = c.fetchone()[0]
-
-    pages = ceil(total / per_page)
-
-    c.execute("""
-        SELECT id, name, material_type, category, price, stock
-        FROM products
-        WHERE is_deleted = 0
-        ORDER BY name
-        LIMIT %s OFFSET %s
-    """, (per_page, offset))
-
-    items = c.fetchall()
+    items, next_cursor = list_products(c, filters)
+    total, total_capped = inventory_total(c, filters)
+    options = inventory_facets(c)
     conn.close()
 
     return render_template(
         "inventory.html",
         items=items,
         is_admin=current_user.role == "admin",
-        page=page,
-        pages=pages
+        next_cursor=next_cursor,
+        total=total,
+        total_capped=total_capped,
+        materials=options["materials"],
+        categories=options["categories"],
+        filters=request.args
     )
 
 
+# ===================== API INVENTORY =====================
+@app.route("/api/inventory")
+@login_required
+@read_only
+def api_inventory():
+    """
+    ?q=&material=&category=&sort=name|price|-price|stock|-stock&limit=
+    &cursor= — pass back next_cursor for the following page. total is
+    approximate: cached briefly, and total_capped when counting stopped
+    early.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    try:
+        filters = parse_inventory_filters(request.args)
+    except ValueError:
+        return jsonify(status="error", error="Invalid inventory filter"), 400
+
+    conn = connect()
+    c = conn.cursor()
+    items, next_cursor = list_products(c, filters)
+    total, total_capped = inventory_total(c, filters)
+    conn.close()
+
+    return jsonify(
+        items=items,
+        next_cursor=next_cursor,
+        total=total,
+        total_capped=total_capped
+    )
+
 
 # ===================== ADD PRODUCT =====================
 @app.route("/inventory/add", methods=["POST"])
@@ -272,21 +311,13 @@ def inventory_add():
         conn = connect()
         c = conn.cursor()
 
-        c.execute("""
-            SELECT id FROM products
-            WHERE name = %s AND is_deleted = 0
-        """, (name,))
-        if c.fetchone():
-            conn.close()
-            return jsonify(
-                status="error",
-                message="Product name already exists"
-            ), 400
-
+        # The unique name index rejects duplicates; nothing is returned then
         c.execute("""
             INSERT INTO products
             (name, material_type, category, price, stock)
             VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT DO NOTHING
+            RETURNING id
         """, (
             name,
             material_type,
@@ -294,16 +325,31 @@ def inventory_add():
             price,
             stock
         ))
+        row = c.fetchone()
+        if not row:
+            conn.close()
+            return jsonify(
+                status="error",
+                message="Product name already exists"
+            ), 400
+        product_id = row[0]
 
-        conn.commit()
-        conn.close()
+        record_movements(c, [(
+            product_id, stock, "edit", None, None,
+            current_user.username, datetime.datetime.now()
+        )])
 
         log_action(
+            c,
             "ADD",
             name,
             f"Material:{material_type} Category:{category} Price:{price} Stock:{stock}"
         )
 
+        conn.commit()
+        conn.close()
+        clear_inventory_cache()
+
         return jsonify(status="success")
 
     except Exception as e:
@@ -334,28 +380,253 @@ def inventory_edit():
     conn = connect()
     c = conn.cursor()
 
-    c.execute("""
-        SELECT id FROM products
-        WHERE name = %s AND id != %s AND is_deleted = 0
-    """, (name, product_id))
-    if c.fetchone():
+    # Lock the row so the ledger records the exact change
+    begin_write(conn)
+    c.execute(f"""
+        SELECT stock FROM products WHERE id = %s {for_update()}
+    """, (product_id,))
+    row = c.fetchone()
+    old_stock = (row[0] or 0) if row else 0
+
+    try:
+        c.execute("""
+            UPDATE products
+            SET name = %s, material_type = %s, category = %s, price = %s, stock = %s
+            WHERE id = %s
+            RETURNING id, stock, is_deleted
+        """, (name, material_type, category, price, stock, product_id))
+    except IntegrityError:
+        # Another active product already has this name (see m014)
+        conn.rollback()
         conn.close()
         return jsonify(status="error", message="Duplicate product name"), 400
+    publish(c, "stock", stock_payload(c.fetchall()))
 
-    c.execute("""
-        UPDATE products
-        SET name = %s, material_type = %s, category = %s, price = %s, stock = %s
-        WHERE id = %s
+    if row:
+        record_movements(c, [(
+            product_id, stock - old_stock, "edit", None, None,
+            current_user.username, datetime.datetime.now()
+        )])
 
-    """, (name, material_type, category, price, stock, product_id))
+    log_action(c, "EDIT", name, f"Category:{category} Price:{price} Stock:{stock}")
 
     conn.commit()
     conn.close()
+    clear_inventory_cache()
 
-    log_action("EDIT", name, f"Category:{category} Price:{price} Stock:{stock}")
     return jsonify(status="success")
 
 
+# ===================== IMPORT PRODUCTS =====================
+@app.route("/inventory/import", methods=["POST"])
+@login_required
+@csrf.exempt
+def inventory_import():
+    """
+    Multipart upload of a CSV/XLSX catalogue (field "file"). Returns the
+    import summary with a per-line error report; see product_import.py.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify(status="error", error="No file uploaded"), 400
+
+    filename = secure_filename(upload.filename) or "upload"
+    conn = connect()
+    try:
+        summary = import_products(
+            conn, read_rows(upload.stream, filename), current_user.username, filename
+        )
+    except ImportFileError as e:
+        return jsonify(status="error", error=str(e)), 400
+    finally:
+        conn.close()
+
+    clear_inventory_cache()
+    return jsonify(status="success", **summary)
+
+
+# ===================== BULK EDIT PRODUCTS =====================
+BULK_EDIT_MAX = 1000
+
+# Fields a bulk edit may change, in the order diffs are reported
+BULK_EDIT_FIELDS = ("material_type", "category", "price", "stock")
+
+
+def parse_bulk_edit(update):
+    """
+    One partial update to {"id", field: value, "stock_delta"}. Raises
+    ValueError with the message for the error report.
+    """
+    if not isinstance(update, dict):
+        raise ValueError("Update must be an object")
+
+    try:
+        parsed = {"id": int(update["id"])}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Missing product id")
+
+    if "price" in update:
+        try:
+            parsed["price"] = float(update["price"])
+        except (TypeError, ValueError):
+            raise ValueError("Invalid price")
+        if not 0 <= parsed["price"] < float("inf"):
+            raise ValueError("Invalid price")
+
+    if "stock" in update and "stock_delta" in update:
+        raise ValueError("Give stock or stock_delta, not both")
+    for field in ("stock", "stock_delta"):
+        if field in update:
+            value = update[field]
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"Invalid {field}")
+            parsed[field] = value
+
+    if "category" in update:
+        parsed["category"] = str(update["category"] or "").strip() or "uncategorized"
+    if "material_type" in update:
+        parsed["material_type"] = str(update["material_type"] or "").strip() or None
+
+    if len(parsed) == 1:
+        raise ValueError("Nothing to change")
+    return parsed
+
+
+@app.route("/inventory/bulk-edit", methods=["POST"])
+@login_required
+@csrf.exempt
+def inventory_bulk_edit():
+    """
+    {"updates": [{"id", "price"?, "stock"? | "stock_delta"?, "category"?,
+    "material_type"?}]} — applied all together or not at all. Returns the
+    before/after values of every field that changed.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    data = request.get_json(silent=True) or {}
+    updates = data.get("updates")
+
+    if not isinstance(updates, list) or not updates:
+        return jsonify(status="error", error="No updates"), 400
+
+    if len(updates) > BULK_EDIT_MAX:
+        return jsonify(
+            status="error",
+            error=f"At most {BULK_EDIT_MAX} updates per request"
+        ), 400
+
+    errors, parsed, seen = [], [], set()
+    for index, update in enumerate(updates):
+        try:
+            item = parse_bulk_edit(update)
+            if item["id"] in seen:
+                raise ValueError("Product appears more than once")
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        seen.add(item["id"])
+        parsed.append((index, item))
+
+    if errors:
+        return jsonify(status="error", error="Invalid updates", errors=errors), 400
+
+    conn = connect()
+    c = conn.cursor()
+
+    # Lock every row first: deltas and the ledger see the exact old values
+    begin_write(conn)
+    ids = [item["id"] for _, item in parsed]
+    c.execute(f"""
+        SELECT id, name, material_type, category, price, stock
+        FROM products
+        WHERE id IN ({placeholders(len(ids))}) AND is_deleted = 0
+        {for_update()}
+    """, ids)
+    current = {
+        row[0]: dict(zip(("name",) + BULK_EDIT_FIELDS, row[1:]))
+        for row in c.fetchall()
+    }
+
+    changes = []
+    for index, item in parsed:
+        old = current.get(item["id"])
+        if old is None:
+            errors.append({"index": index, "id": item["id"], "error": "Product not found"})
+            continue
+
+        new = {field: item.get(field, old[field]) for field in BULK_EDIT_FIELDS}
+        if "stock_delta" in item:
+            new["stock"] = (old["stock"] or 0) + item["stock_delta"]
+        if new["stock"] is not None and new["stock"] < 0:
+            errors.append({"index": index, "id": item["id"], "error": "Stock would go negative"})
+            continue
+
+        diff = {
+            field: [old[field], new[field]]
+            for field in BULK_EDIT_FIELDS if new[field] != old[field]
+        }
+        if diff:
+            changes.append({"id": item["id"], "name": old["name"], "changes": diff, "new": new})
+
+    if errors:
+        conn.rollback()
+        conn.close()
+        return jsonify(status="error", error="Invalid updates", errors=errors), 400
+
+    if changes:
+        c.execute(f"""
+            UPDATE products
+            SET material_type = v.material_type, category = v.category,
+                price = v.price, stock = v.stock
+            FROM (
+                SELECT column1 AS id, column2 AS material_type, column3 AS category,
+                       column4 AS price, column5 AS stock
+                FROM (VALUES {values_rows(5, len(changes))}) AS v
+            ) AS v
+            WHERE products.id = v.id
+            RETURNING products.id, products.stock, products.is_deleted
+        """, [
+            value for change in changes
+            for value in (change["id"], *(change["new"][field] for field in BULK_EDIT_FIELDS))
+        ])
+        publish(c, "stock", stock_payload(sorted(c.fetchall())))
+
+        now = datetime.datetime.now()
+        movements = []
+        for change in changes:
+            if "stock" in change["changes"]:
+                old, new = change["changes"]["stock"]
+                movements.append((
+                    change["id"], new - (old or 0), "edit", None, None,
+                    current_user.username, now
+                ))
+        record_movements(c, movements)
+
+        record_audit_many(c, [
+            ("EDIT", change["name"], " ".join(
+                f"{field.capitalize()}:{old}->{new}"
+                for field, (old, new) in change["changes"].items()
+            ))
+            for change in changes
+        ], current_user.username)
+
+    conn.commit()
+    conn.close()
+    if changes:
+        clear_inventory_cache()
+
+    return jsonify(
+        status="success",
+        updated=len(changes),
+        unchanged=len(parsed) - len(changes),
+        changes=[{key: change[key] for key in ("id", "name", "changes")} for change in changes]
+    )
+
+
 # ===================== PRODUCT API =====================
 @app.route("/api/product/<int:id>")
 @login_required
@@ -385,23 +656,107 @@ def api_get_product(id):
 # ===================== PRODUCT STOCK API (FOR POS) =====================
 @app.route("/api/products/stock")
 @login_required
+@limiter.exempt
+@read_only
 def api_products_stock():
+    """
+    Stock for the POS. Without ?since= it returns every active product;
+    with it, only products changed after that version (deleted ones
+    included, so terminals can drop them). Clients pass the returned
+    "version" back as the next cursor.
+    """
+    since = request.args.get("since", type=int)
+
     conn = connect()
     c = conn.cursor()
 
+    # Only versions up to the horizon are final; rows changed meanwhile
+    # come back next time rather than being skipped.
+    horizon = change_horizon(c, "products")
+
+    # A cursor ahead of the horizon (a lagging replica, or one issued
+    # before versions became transaction ids) can't be trusted
+    if since is not None and since > horizon:
+        since = None
+
+    # The cursor and ETag are the newest final product version, not the
+    # horizon itself: on Postgres that moves with every transaction in
+    # the cluster, and an unchanged catalogue must keep its ETag
     c.execute("""
-        SELECT id, stock
-        FROM products
-        WHERE is_deleted = 0
-    """)
+        SELECT COALESCE(MAX(change_version), 0) FROM products
+        WHERE change_version <= %s
+    """, (horizon,))
+    version = c.fetchone()[0]
+
+    etag = f"products-{since}-{version}"
+    if request.if_none_match.contains(etag):
+        conn.close()
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    if since is None:
+        c.execute("""
+            SELECT id, stock, is_deleted
+            FROM products
+            WHERE is_deleted = 0
+            ORDER BY id
+        """)
+    else:
+        c.execute("""
+            SELECT id, stock, is_deleted
+            FROM products
+            WHERE change_version > %s AND change_version <= %s
+            ORDER BY change_version
+        """, (since, version))
 
     rows = c.fetchall()
     conn.close()
 
-    return jsonify([
-        {"id": row[0], "stock": row[1]}
-        for row in rows
-    ])
+    response = jsonify(
+        version=version,
+        products=[
+            {"id": row[0], "stock": row[1], "deleted": bool(row[2])}
+            for row in rows
+        ]
+    )
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# ===================== STOCK AS OF DATE =====================
+@app.route("/api/inventory/stock-as-of")
+@login_required
+@read_only
+def api_stock_as_of():
+    """
+    ?at=YYYY-MM-DD (end of that day) or a full ISO timestamp. Answered
+    from the stock ledger's snapshots plus movements.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    try:
+        before = parse_as_of(request.args.get("at", ""))
+    except ValueError:
+        return jsonify(status="error", message="Invalid date"), 400
+
+    conn = connect()
+    c = conn.cursor()
+    rows = stock_as_of(c, before)
+    conn.close()
+
+    if rows is None:
+        return jsonify(status="error", message="No stock history for that date"), 404
+
+    return jsonify(
+        at=request.args["at"],
+        products=[
+            {"id": r[0], "name": r[1], "stock": r[2], "deleted": bool(r[3])}
+            for r in rows
+        ]
+    )
 
 
 # ===================== DELETE PRODUCT =====================
@@ -414,11 +769,18 @@ def delete_inventory(id):
 
     conn = connect()
     c = conn.cursor()
-    c.execute("UPDATE products SET is_deleted = 1 WHERE id=%s", (id,))
+    c.execute("""
+        UPDATE products SET is_deleted = 1 WHERE id=%s
+        RETURNING id, stock, is_deleted
+    """, (id,))
+    publish(c, "stock", stock_payload(c.fetchall()))
+
+    log_action(c, "DELETE", f"Product ID {id}")
+
     conn.commit()
     conn.close()
+    clear_inventory_cache()
 
-    log_action("DELETE", f"Product ID {id}")
     return jsonify(status="deleted")
 
 
@@ -440,90 +802,500 @@ def sales():
 
 
 # ===================== CHECKOUT =====================
+# How long a checkout response is kept for replay under its request key
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+
+
+class CheckoutError(Exception):
+    def __init__(self, error, status=400, **details):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+        self.details = details
+
+
+def request_fingerprint(payload):
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def claim_request_keys(c, username, fingerprints):
+    """
+    Claim client request keys ({key: fingerprint}) inside the current write
+    transaction. Returns {key: stored} for keys seen before, where stored is
+    the (status_code, body) to replay or a CheckoutError when the key was
+    used for a different cart; every other key is now claimed and its
+    response must be saved with store_responses before committing. A
+    concurrent request with the same key waits on the unique index until
+    the first one commits or rolls back.
+    """
+    now = datetime.datetime.now()
+    expires = now + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    keys = list(fingerprints)
+
+    c.execute("DELETE FROM idempotency_keys WHERE expires_at <= %s", (now,))
+    c.execute(f"""
+        INSERT INTO idempotency_keys (username, request_key, fingerprint, created_at, expires_at)
+        VALUES {values_rows(5, len(keys))}
+        ON CONFLICT (username, request_key) DO NOTHING
+        RETURNING request_key
+    """, [v for key in keys for v in (username, key, fingerprints[key], now, expires)])
+    claimed = {row[0] for row in c.fetchall()}
+
+    seen = [key for key in keys if key not in claimed]
+    if not seen:
+        return {}
+
+    c.execute(f"""
+        SELECT request_key, fingerprint, status_code, response
+        FROM idempotency_keys
+        WHERE username = %s AND request_key IN ({placeholders(len(seen))})
+    """, [username] + seen)
+
+    stored = {}
+    for key, fingerprint, status_code, response in c.fetchall():
+        if fingerprint != fingerprints[key]:
+            stored[key] = CheckoutError(
+                "Idempotency key reused with a different cart", status=422
+            )
+        else:
+            stored[key] = (status_code, json.loads(response))
+
+    return stored
+
+
+def store_responses(c, username, responses):
+    # responses: {key: (status_code, body)}
+    c.execute(f"""
+        UPDATE idempotency_keys
+        SET status_code = r.status_code, response = r.response
+        FROM (
+            SELECT column1 AS request_key, column2 AS status_code, column3 AS response
+            FROM (VALUES {values_rows(3, len(responses))}) AS v
+        ) AS r
+        WHERE idempotency_keys.username = %s
+          AND idempotency_keys.request_key = r.request_key
+    """, [
+        v for key, (status_code, body) in responses.items()
+        for v in (key, status_code, json.dumps(body))
+    ] + [username])
+
+
+def release_request_keys(c, username, keys):
+    # Un-claim keys whose order failed so the client can retry them
+    c.execute(f"""
+        DELETE FROM idempotency_keys
+        WHERE username = %s AND request_key IN ({placeholders(len(keys))})
+    """, [username] + list(keys))
+
+
+def parse_cart(cart):
+    lines = []
+
+    for item in cart:
+        line = {
+            "id": int(item["id"]),
+            "qty": int(item["qty"]),
+            "custom": isinstance(item.get("source"), str)
+                and item["source"].startswith("pricing"),
+            "name": item.get("name"),
+            "price": float(item.get("price") or 0),
+        }
+        if line["qty"] < 1:
+            raise ValueError("Invalid quantity")
+        lines.append(line)
+
+    return lines
+
+
+def stock_shortfall(c, wanted):
+    # Re-read current stock for the lines we could not decrement
+    ids = list(wanted)
+    c.execute(f"""
+        SELECT id, name, stock
+        FROM products
+        WHERE id IN ({placeholders(len(ids))})
+    """, ids)
+
+    return [
+        {"id": pid, "name": name, "requested": wanted[pid], "available": stock}
+        for pid, name, stock in c.fetchall()
+        if wanted[pid] > (stock or 0)
+    ]
+
+
+# Sale lines per multi-row INSERT (7 params each, well under SQLite's limit)
+SALE_INSERT_CHUNK = 500
+
+
+def record_orders(c, carts, username):
+    """
+    Reserve stock for a batch of carts and record each one that can be
+    fulfilled, in cart order. Every step is one statement for the whole
+    batch, however many carts it holds. Each cart is a dict with "lines"
+    (see parse_cart) and optionally "sold_at".
+
+    Returns one entry per cart: the new order id, or the CheckoutError that
+    rejected it. Must run inside a write transaction (see begin_write).
+    """
+
+    # -------- LOCK + VALIDATE ALL CARTS (1 query) --------
+    # Rows are locked in id order so overlapping carts can't deadlock.
+    ids = sorted({line["id"] for cart in carts for line in cart["lines"]})
+    c.execute(f"""
+        SELECT id, name, price, stock
+        FROM products
+        WHERE id IN ({placeholders(len(ids))}) AND is_deleted = 0
+        ORDER BY id
+        {for_update()}
+    """, ids)
+    products = {row[0]: row for row in c.fetchall()}
+
+    # The rows are locked, so carts can be checked against this running
+    # copy of the stock one after another.
+    stock = {pid: row[3] or 0 for pid, row in products.items()}
+    results = []
+    accepted = []
+    wanted_total = {}
+
+    for cart in carts:
+        lines = cart["lines"]
+
+        missing = [
+            line["id"] for line in lines
+            if not line["custom"] and line["id"] not in products
+        ]
+        if missing:
+            results.append(CheckoutError("Product not found", ids=missing))
+            continue
+
+        # product_id -> total qty; custom "pricing" items consume the stock
+        # of the material they were priced from
+        wanted = {}
+        for line in lines:
+            if line["id"] in products:
+                wanted[line["id"]] = wanted.get(line["id"], 0) + line["qty"]
+
+        short = [
+            {"id": pid, "name": products[pid][1], "requested": qty, "available": stock[pid]}
+            for pid, qty in wanted.items()
+            if qty > stock[pid]
+        ]
+        if short:
+            results.append(CheckoutError("Insufficient stock", items=short))
+            continue
+
+        for pid, qty in wanted.items():
+            stock[pid] -= qty
+            wanted_total[pid] = wanted_total.get(pid, 0) + qty
+
+        results.append(None)
+        accepted.append((len(results) - 1, cart))
+
+    if not accepted:
+        return results
+
+    # -------- DECREMENT STOCK (1 conditional update) --------
+    if wanted_total:
+        c.execute(f"""
+            UPDATE products
+            SET stock = stock - cart.qty
+            FROM (
+                SELECT column1 AS id, column2 AS qty
+                FROM (VALUES {values_rows(2, len(wanted_total))}) AS v
+            ) AS cart
+            WHERE products.id = cart.id
+              AND products.stock >= cart.qty
+        """, [v for item in wanted_total.items() for v in item])
+
+        # The guard never trips while the rows are locked, but it is what
+        # makes overselling impossible if they ever aren't.
+        if c.rowcount != len(wanted_total):
+            raise CheckoutError("Insufficient stock", items=stock_shortfall(c, wanted_total))
+
+    # -------- PRICE LINES --------
+    now = datetime.datetime.now()
+    orders = []
+    for _, cart in accepted:
+        priced = []
+        for line in cart["lines"]:
+            if line["custom"]:
+                name, total = line["name"], line["price"] * line["qty"]
+            else:
+                name, price = products[line["id"]][1], products[line["id"]][2]
+                total = price * line["qty"]
+            priced.append((line["id"], name, line["qty"], total))
+        orders.append((cart.get("sold_at") or now, priced))
+
+    # -------- INSERT ORDER HEADERS (1 multi-row insert) --------
+    c.execute(f"""
+        INSERT INTO orders (username, created_at, line_count, items, total)
+        VALUES {values_rows(5, len(orders))}
+        RETURNING id
+    """, [
+        v for sold_at, priced in orders
+        for v in (
+            username,
+            sold_at,
+            len(priced),
+            sum(qty for _, _, qty, _ in priced),
+            sum(total for _, _, _, total in priced),
+        )
+    ])
+    # Ids are handed out in VALUES order; RETURNING order isn't guaranteed
+    order_ids = sorted(row[0] for row in c.fetchall())
+
+    # -------- INSERT SALE LINES (multi-row inserts) --------
+    rows = [
+        (order_id, product_id, name, qty, total, username, sold_at)
+        for order_id, (sold_at, priced) in zip(order_ids, orders)
+        for product_id, name, qty, total in priced
+    ]
+    for start in range(0, len(rows), SALE_INSERT_CHUNK):
+        chunk = rows[start:start + SALE_INSERT_CHUNK]
+        c.execute(f"""
+            INSERT INTO sales (order_id, product_id, product_name, qty, total, username, date)
+            VALUES {values_rows(7, len(chunk))}
+        """, [v for row in chunk for v in row])
+
+    # -------- LEDGER (1 multi-row insert per chunk) --------
+    movements = []
+    for order_id, (sold_at, priced) in zip(order_ids, orders):
+        used = {}
+        for product_id, _, qty, _ in priced:
+            if product_id in products:
+                used[product_id] = used.get(product_id, 0) + qty
+        movements += [
+            (pid, -qty, "sale", order_id, None, username, sold_at)
+            for pid, qty in used.items()
+        ]
+    record_movements(c, movements)
+
+    # -------- DASHBOARD ROLLUPS (1 upsert per table) --------
+    delta = SalesDelta()
+    for sold_at, priced in orders:
+        delta.order(sold_at)
+        for _, name, qty, total in priced:
+            delta.line(sold_at, name, qty, total)
+    delta.apply(c)
+
+    for (index, _), order_id in zip(accepted, order_ids):
+        results[index] = order_id
+
+    # -------- LIVE UPDATES --------
+    # The rows are still locked, so the running copy is the new stock
+    publish(c, "sale", {
+        "orders": [
+            {"id": order_id, "username": username, "total": sum(t for *_, t in priced)}
+            for order_id, (_, priced) in zip(order_ids, orders)
+        ]
+    })
+    if wanted_total:
+        publish(c, "stock", stock_payload(
+            (pid, stock[pid], 0) for pid in sorted(wanted_total)
+        ))
+
+    return results
+
+
+def reserve_and_record(c, lines, username):
+    """
+    Reserve stock for one cart, write its order header and sale rows, and
+    return the new order id. Raises CheckoutError without writing anything
+    when the cart can't be fulfilled.
+    """
+    result = record_orders(c, [{"lines": lines}], username)[0]
+
+    if isinstance(result, CheckoutError):
+        raise result
+
+    return result
+
+
 @app.route("/sales/checkout", methods=["POST"])
 @login_required
 @csrf.exempt
 def sales_checkout():
     try:
         data = request.get_json(silent=True) or {}
-        cart = data.get("cart", [])
 
+        # Retries of the same cart carry the same key and get the first
+        # response back instead of a second sale
+        key = request.headers.get("Idempotency-Key")
+        if key is not None and not 0 < len(key) <= 200:
+            return jsonify(status="error", error="Invalid idempotency key"), 400
 
+        try:
+            lines = parse_cart(data.get("cart", []))
+        except (KeyError, TypeError, ValueError):
+            return jsonify(status="error", error="Invalid cart item"), 400
+
+        if not lines:
+            return jsonify(status="success")
+
+        username = current_user.username
         conn = connect()
         c = conn.cursor()
 
-        for item in cart:
-
-            # -------- CUSTOM ITEM --------
-            if isinstance(item.get("source"), str) and item.get("source").startswith("pricing"):
-
-                c.execute("""
-                    UPDATE products
-                    SET stock = stock - %s
-                    WHERE id = %s
-                """, (int(item["qty"]), int(item["id"])))
-
-                c.execute("""
-                    INSERT INTO sales (product_id, product_name, qty, total, username, date)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    int(item["id"]),
-                    item["name"],
-                    int(item["qty"]),
-                    float(item["price"]) * int(item["qty"]),
-                    current_user.username,
-                    datetime.datetime.now()
-                ))
-                continue
-
-            # -------- NORMAL PRODUCT --------
-            product_id = int(item["id"])
-            qty = int(item["qty"])
-
-            c.execute("""
-                SELECT name, price, stock
-                FROM products
-                WHERE id = %s AND is_deleted = 0
-            """, (product_id,))
-            row = c.fetchone()
-
-            if not row:
-                conn.rollback()
-                return jsonify(status="error", error="Product not found"), 400
-
-            name, price, stock = row
-
-            if qty > stock:
-                conn.rollback()
-                return jsonify(status="error", error="Insufficient stock"), 400
-
-            c.execute("""
-                UPDATE products
-                SET stock = stock - %s
-                WHERE id = %s
-            """, (qty, product_id))
-
-            c.execute("""
-                INSERT INTO sales (product_id, product_name, qty, total, username, date)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                product_id,
-                name,
-                qty,
-                price * qty,
-                current_user.username,
-                datetime.datetime.now()
-            ))
+        begin_write(conn)
+        try:
+            if key:
+                stored = claim_request_keys(
+                    c, username, {key: request_fingerprint(data["cart"])}
+                ).get(key)
+                if isinstance(stored, CheckoutError):
+                    raise stored
+                if stored:
+                    conn.commit()
+                    status_code, body = stored
+                    return jsonify(body), status_code, {"Idempotent-Replayed": "true"}
+
+            order_id = reserve_and_record(c, lines, username)
+        except CheckoutError as e:
+            conn.rollback()
+            return jsonify(status="error", error=e.error, **e.details), e.status
+
+        body = {"status": "success", "order_id": order_id}
+        if key:
+            store_responses(c, username, {key: (200, body)})
 
         conn.commit()
         conn.close()
-        return jsonify(status="success")
+        return jsonify(body)
 
     except Exception as e:
         print("CHECKOUT ERROR:", e)
         return jsonify(status="error", error=str(e)), 500
 
 
+# Most queued orders a terminal may sync in one request
+BULK_CHECKOUT_MAX = 500
+
+
+def parse_sold_at(value, now):
+    # Client clock for when an offline sale happened; never in the future
+    try:
+        sold_at = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return now
+
+    if sold_at.tzinfo is not None:
+        sold_at = sold_at.astimezone().replace(tzinfo=None)
+
+    return min(sold_at, now)
+
+
+@app.route("/sales/checkout/bulk", methods=["POST"])
+@login_required
+@csrf.exempt
+def sales_checkout_bulk():
+    """
+    Apply a batch of carts queued offline by the POS in one transaction.
+    Every order needs its own request key, so a batch that is re-sent
+    after a dropped connection is applied once. Orders are independent:
+    one that can't be fulfilled is reported and the rest still go through.
+    """
+    data = request.get_json(silent=True) or {}
+    queued = data.get("orders")
+
+    if not isinstance(queued, list) or not queued:
+        return jsonify(status="error", error="No orders"), 400
+
+    if len(queued) > BULK_CHECKOUT_MAX:
+        return jsonify(
+            status="error",
+            error=f"At most {BULK_CHECKOUT_MAX} orders per request"
+        ), 400
+
+    now = datetime.datetime.now()
+    results = [None] * len(queued)
+    pending = {}  # key -> (index, cart)
+
+    for index, order in enumerate(queued):
+        key = order.get("key") if isinstance(order, dict) else None
+
+        if not isinstance(key, str) or not 0 < len(key) <= 200:
+            results[index] = {"key": key, "status": "error", "error": "Missing request key"}
+            continue
+
+        if key in pending:
+            results[index] = {"key": key, "status": "error", "error": "Duplicate request key"}
+            continue
+
+        try:
+            lines = parse_cart(order.get("cart", []))
+        except (KeyError, TypeError, ValueError):
+            results[index] = {"key": key, "status": "error", "error": "Invalid cart item"}
+            continue
+
+        if not lines:
+            results[index] = {"key": key, "status": "success"}
+            continue
+
+        pending[key] = (index, {
+            "lines": lines,
+            "sold_at": parse_sold_at(order.get("sold_at"), now),
+            "fingerprint": request_fingerprint(order["cart"]),
+        })
+
+    if pending:
+        username = current_user.username
+        conn = connect()
+        c = conn.cursor()
+
+        try:
+            begin_write(conn)
+
+            stored = claim_request_keys(
+                c, username, {key: cart["fingerprint"] for key, (_, cart) in pending.items()}
+            )
+            for key, replay in stored.items():
+                index, _ = pending.pop(key)
+                if isinstance(replay, CheckoutError):
+                    results[index] = {
+                        "key": key, "status": "error",
+                        "error": replay.error, **replay.details
+                    }
+                else:
+                    results[index] = {"key": key, **replay[1], "replayed": True}
+
+            keys = list(pending)
+            outcomes = record_orders(
+                c, [pending[key][1] for key in keys], username
+            ) if keys else []
+
+            responses = {}
+            failed = []
+            for key, outcome in zip(keys, outcomes):
+                index, _ = pending[key]
+                if isinstance(outcome, CheckoutError):
+                    failed.append(key)
+                    results[index] = {
+                        "key": key, "status": "error",
+                        "error": outcome.error, **outcome.details
+                    }
+                else:
+                    body = {"status": "success", "order_id": outcome}
+                    responses[key] = (200, body)
+                    results[index] = {"key": key, **body}
+
+            if failed:
+                release_request_keys(c, username, failed)
+            if responses:
+                store_responses(c, username, responses)
+
+            conn.commit()
+            conn.close()
+
+        except Exception as e:
+            conn.rollback()
+            print("BULK CHECKOUT ERROR:", e)
+            return jsonify(status="error", error=str(e)), 500
+
+    return jsonify(status="success", results=results)
+
+
 # ===================== VOID SALE =====================
 @app.route("/sales/void/<int:sale_id>", methods=["POST"])
 @login_required
@@ -538,29 +1310,48 @@ def void_sale(sale_id):
     conn = connect()
     c = conn.cursor()
 
-    c.execute("""
-        SELECT product_id, qty, voided
+    begin_write(conn)
+
+    # Lock the order header before the line, as void_order does: the two
+    # can't deadlock, and voids of sibling lines queue on the header, so
+    # the last one sees every other line voided
+    c.execute("SELECT order_id FROM sales WHERE id = %s", (sale_id,))
+    row = c.fetchone()
+    if row and row[0]:
+        c.execute(f"SELECT id FROM orders WHERE id = %s {for_update()}", (row[0],))
+
+    c.execute(f"""
+        SELECT product_id, product_name, qty, total, date, order_id, voided
         FROM sales
         WHERE id = %s
+        {for_update()}
     """, (sale_id,))
     row = c.fetchone()
 
     if not row:
-        conn.close()
+        conn.rollback()
         return jsonify(status="error", error="Sale not found"), 404
 
-    product_id, qty, voided = row
+    product_id, product_name, qty, total, sold_at, order_id, voided = row
 
     if voided:
-        conn.close()
+        conn.rollback()
         return jsonify(status="error", error="Already voided"), 400
 
+    now = datetime.datetime.now()
+
     if product_id:
         c.execute("""
             UPDATE products
             SET stock = stock + %s
             WHERE id = %s
+            RETURNING id, stock, is_deleted
         """, (qty, product_id))
+        publish(c, "stock", stock_payload(c.fetchall()))
+        record_movements(c, [(
+            product_id, qty, "void", order_id, sale_id,
+            current_user.username, now
+        )])
 
     c.execute("""
         UPDATE sales
@@ -568,69 +1359,310 @@ def void_sale(sale_id):
             void_reason = %s,
             voided_at = %s
         WHERE id = %s
-    """, (reason, datetime.datetime.now(), sale_id))
+    """, (reason, now, sale_id))
+
+    delta = SalesDelta()
+    delta.line(sold_at, product_name, qty, total, sign=-1)
+
+    # Keep the order header net of voided lines; it is voided with its last line
+    if order_id:
+        c.execute("""
+            UPDATE orders
+            SET total = total - %s,
+                items = items - %s,
+                voided = CASE WHEN EXISTS (
+                    SELECT 1 FROM sales WHERE order_id = orders.id AND voided = 0
+                ) THEN 0 ELSE 1 END,
+                voided_at = CASE WHEN EXISTS (
+                    SELECT 1 FROM sales WHERE order_id = orders.id AND voided = 0
+                ) THEN NULL ELSE %s END
+            WHERE id = %s
+            RETURNING voided
+        """, (total, qty, now, order_id))
+        if c.fetchone()[0]:
+            delta.order(sold_at, sign=-1)
+
+    delta.apply(c)
+    publish(c, "void", {"sales": [sale_id], "order_id": order_id})
+
+    log_action(c, "VOID SALE", f"Sale ID {sale_id}", reason)
 
     conn.commit()
     conn.close()
 
-    log_action("VOID SALE", f"Sale ID {sale_id}", reason)
     return jsonify(status="success")
 
 
-# ===================== SYSTEM HISTORY =====================
+@app.route("/sales/orders/<int:order_id>/void", methods=["POST"])
+@login_required
+@csrf.exempt
+def void_order(order_id):
+    if current_user.role != "admin":
+        return jsonify(status="forbidden"), 403
+
+    data = request.get_json(silent=True) or {}
+    reason = data.get("reason", "No reason provided")
+
+    conn = connect()
+    c = conn.cursor()
+
+    begin_write(conn)
+    c.execute(f"""
+        SELECT voided, created_at FROM orders WHERE id = %s {for_update()}
+    """, (order_id,))
+    row = c.fetchone()
+
+    if not row:
+        conn.rollback()
+        return jsonify(status="error", error="Order not found"), 404
+
+    if row[0]:
+        conn.rollback()
+        return jsonify(status="error", error="Already voided"), 400
+
+    # Restock every remaining line in one statement
+    c.execute("""
+        SELECT product_id, SUM(qty)
+        FROM sales
+        WHERE order_id = %s AND voided = 0 AND product_id IS NOT NULL
+        GROUP BY product_id
+        ORDER BY product_id
+    """, (order_id,))
+    restock = c.fetchall()
+
+    if restock:
+        c.execute(f"""
+            UPDATE products
+            SET stock = stock + back.qty
+            FROM (
+                SELECT column1 AS id, column2 AS qty
+                FROM (VALUES {values_rows(2, len(restock))}) AS v
+            ) AS back
+            WHERE products.id = back.id
+            RETURNING products.id, products.stock, products.is_deleted
+        """, [v for item in restock for v in item])
+        publish(c, "stock", stock_payload(sorted(c.fetchall())))
+
+    now = datetime.datetime.now()
+    record_movements(c, [
+        (pid, qty, "void", order_id, None, current_user.username, now)
+        for pid, qty in restock
+    ])
+
+    c.execute("""
+        UPDATE sales
+        SET voided = 1,
+            void_reason = %s,
+            voided_at = %s
+        WHERE order_id = %s AND voided = 0
+        RETURNING id, product_name, qty, total, date
+    """, (reason, now, order_id))
+    lines = sorted(c.fetchall())
+    voided_lines = [line[0] for line in lines]
+
+    delta = SalesDelta()
+    delta.order(row[1], sign=-1)
+    for _, product_name, qty, total, sold_at in lines:
+        delta.line(sold_at, product_name, qty, total, sign=-1)
+    delta.apply(c)
+
+    c.execute("""
+        UPDATE orders
+        SET total = 0, items = 0, voided = 1, voided_at = %s
+        WHERE id = %s
+    """, (now, order_id))
+
+    publish(c, "void", {"sales": voided_lines, "order_id": order_id})
+
+    log_action(c, "VOID ORDER", f"Order ID {order_id}", reason)
+
+    conn.commit()
+    conn.close()
+
+    return jsonify(status="success")
+
+
+@app.route("/api/orders/<int:order_id>")
+@login_required
+@read_only
+def api_order(order_id):
+    """Order header and lines, e.g. to reprint a receipt."""
+    conn = connect()
+    c = conn.cursor()
+
+    c.execute("""
+        SELECT id, username, created_at, line_count, items, total, voided
+        FROM orders
+        WHERE id = %s
+    """, (order_id,))
+    order = c.fetchone()
+
+    if not order:
+        conn.close()
+        return jsonify(status="error", error="Order not found"), 404
+
+    c.execute("""
+        SELECT id, product_id, product_name, qty, total, voided
+        FROM sales
+        WHERE order_id = %s
+        ORDER BY id
+    """, (order_id,))
+    lines = c.fetchall()
+    conn.close()
+
+    return jsonify(
+        id=order[0],
+        username=order[1],
+        created_at=str(order[2]),
+        line_count=order[3],
+        items=order[4],
+        total=order[5],
+        voided=bool(order[6]),
+        lines=[
+            {
+                "sale_id": l[0],
+                "product_id": l[1],
+                "name": l[2],
+                "qty": l[3],
+                "total": l[4],
+                "voided": bool(l[5]),
+            }
+            for l in lines
+        ]
+    )
+
+
+# ===================== LIVE UPDATES =====================
+@app.route("/api/events")
+@login_required
+@limiter.exempt
+def api_events():
+    """
+    Server-sent events: "stock", "sale" and "void". Browsers reconnect on
+    their own and send Last-Event-ID to catch up. The stream holds no
+    database connection between polls of the shared events table.
+    """
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+
+    return Response(
+        event_stream(last_event_id),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 # ===================== SYSTEM HISTORY =====================
 @app.route("/history")
 @login_required
+@read_only
 def system_history():
     if current_user.role not in ["admin", "staff"]:
         return redirect("/")
 
+    try:
+        filters = parse_history_filters(request.args)
+    except ValueError:
+        filters = parse_history_filters({})
+
     conn = connect()
     c = conn.cursor()
 
-    c.execute("""
-        SELECT
-        id,
-        CAST(created_at AS TIMESTAMP) AS time,
-        'INVENTORY' AS type,
-        action AS title,
-        product_name AS subject,
-        details AS details,
-        '' AS status,
-        NULL AS amount,
-        NULL AS qty,
-        '' AS user
-    FROM audit_logs
-
-    UNION ALL
-
-    SELECT
-        id,
-        date AS time,
-        'SALE' AS type,
-        'Sale Completed' AS title,
-        product_name AS subject,
-        '' AS details,
-        CASE WHEN voided = 1 THEN 'VOIDED' ELSE 'COMPLETED' END AS status,
-        total AS amount,
-        qty AS qty,
-        username AS user
-    FROM sales
-
-    ORDER BY time DESC
+    # ?q= switches the page to ranked search results
+    query = request.args.get("q", "").strip()
+    next_cursor = next_page = None
+    if query:
+        page = request.args.get("page", 1, type=int)
+        try:
+            history, has_more = search_history(c, query, filters["type"], page)
+        except ValueError:
+            page, (history, has_more) = 1, search_history(c, query, filters["type"])
+        next_page = page + 1 if has_more else None
+    else:
+        history, next_cursor = history_page(c, filters)
 
-    """)
-
-    history = c.fetchall()
     conn.close()
 
     return render_template(
         "history.html",
         history=history,
+        next_cursor=next_cursor,
+        next_page=next_page,
+        query=query,
+        filters=request.args,
         is_admin=current_user.role == "admin"
     )
+
+
+# ===================== API HISTORY =====================
+@app.route("/api/history")
+@login_required
+@read_only
+def api_history():
+    """
+    ?type=SALE|INVENTORY&user=&from=&to=&status=COMPLETED|VOIDED
+    &limit=&cursor= — pass back next_cursor for the following page.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    try:
+        filters = parse_history_filters(request.args)
+    except ValueError:
+        return jsonify(status="error", error="Invalid history filter"), 400
+
+    conn = connect()
+    c = conn.cursor()
+    history, next_cursor = history_page(c, filters)
+    conn.close()
+
+    return jsonify(
+        history=[dict(row, time=row["time"].isoformat()) for row in history],
+        next_cursor=next_cursor
+    )
+
+
+# ===================== API SEARCH =====================
+@app.route("/api/search")
+@login_required
+@limiter.limit("120 per minute")
+@read_only
+def api_search():
+    """
+    ?q=words&type=SALE|INVENTORY&page=&limit= — ranked matches across
+    sales and audit log entries, best first.
+    """
+    if current_user.role not in ["admin", "staff"]:
+        return jsonify(status="error", message="Unauthorized"), 403
+
+    kind = request.args.get("type", "").upper() or None
+    if kind not in (None, "SALE", "INVENTORY"):
+        return jsonify(status="error", error="Invalid search type"), 400
+
+    page = request.args.get("page", 1, type=int)
+    limit = request.args.get("limit", SEARCH_PAGE_SIZE, type=int)
+
+    conn = connect()
+    c = conn.cursor()
+    try:
+        results, has_more = search_history(c, request.args.get("q", ""), kind, page, limit)
+    except ValueError:
+        return jsonify(status="error", error="Invalid page"), 400
+    finally:
+        conn.close()
+
+    return jsonify(
+        results=[dict(row, time=row["time"].isoformat()) for row in results],
+        page=page,
+        has_more=has_more
+    )
+
+
 # ===================== LANDING PAGE =====================
 @app.route("/")
+@read_only
 def landing_home():
     conn = connect()
     c = conn.cursor()
@@ -676,8 +1708,18 @@ def landing_home():
 
 
 # ===================== DASHBOARD =====================
+def dashboard_range():
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month
+    return parse_range(
+        request.args.get("from") or None,
+        request.args.get("to") or None,
+        request.args.get("granularity") or None
+    )
+
+
 @app.route("/dashboard")
 @login_required
+@read_only
 def dashboard():
     if not current_user.is_authenticated:
         return redirect("/landing")
@@ -685,36 +1727,26 @@ def dashboard():
     conn = connect()
     c = conn.cursor()
 
-    # ===== TOTAL REVENUE =====
-    c.execute("SELECT SUM(total) FROM sales WHERE voided = 0")
-    revenue = c.fetchone()[0] or 0
+    try:
+        start, end, granularity = dashboard_range()
+    except ValueError:
+        start, end, granularity = parse_range()
 
-    # ===== TOTAL ORDERS =====
-    c.execute("SELECT COUNT(*) FROM sales WHERE voided = 0")
-    total_orders = c.fetchone()[0]
+    # Sales figures come from the daily rollups (see rollups.py), never
+    # from the sales table itself.
 
-    # ===== SALES BY DAY =====
+    # ===== TOTAL REVENUE + ORDERS =====
     c.execute("""
-        SELECT DATE(date), SUM(total)
-        FROM sales
-        WHERE voided = 0
-        GROUP BY DATE(date)
-        ORDER BY DATE(date)
-    """)
-    sales_data = c.fetchall()
+        SELECT
+            COALESCE(SUM(revenue), 0),
+            COALESCE(SUM(orders), 0)
+        FROM sales_daily
+        WHERE day >= %s AND day < %s
+    """, (start, end))
+    revenue, total_orders = c.fetchone()
 
     # ===== TOP PRODUCTS =====
-    c.execute("""
-        SELECT
-            product_name,
-            SUM(qty) AS total_sold
-        FROM sales
-        WHERE voided = 0
-        GROUP BY product_name
-        ORDER BY total_sold DESC
-        LIMIT 5
-    """)
-    top_products = c.fetchall()
+    top_products = rollup_top_products(c, start, end)
 
     # ===== INVENTORY LEVELS =====
     c.execute("""
@@ -732,11 +1764,45 @@ def dashboard():
         "dashboard.html",
         revenue=revenue,
         total_orders=total_orders,
-        sales_data=sales_data,
         top_products=top_products,
-        inventory=inventory
+        inventory=inventory,
+        range_from=start.isoformat(),
+        range_to=(end - datetime.timedelta(days=1)).isoformat(),
+        granularity=granularity,
+        granularities=GRANULARITIES
     )
 
+
+# ===================== API DASHBOARD SALES =====================
+@app.route("/api/dashboard/sales")
+@login_required
+@read_only
+def api_dashboard_sales():
+    try:
+        start, end, granularity = dashboard_range()
+    except ValueError:
+        return jsonify(status="error", error="Invalid date range"), 400
+
+    conn = connect()
+    c = conn.cursor()
+    series = sales_series(c, start, end, granularity)
+    conn.close()
+
+    points = downsample(series)
+
+    return jsonify({
+        "from": start.isoformat(),
+        "to": (end - datetime.timedelta(days=1)).isoformat(),
+        "granularity": granularity,
+        "totals": {
+            "revenue": sum(p["revenue"] for p in series),
+            "orders": sum(p["orders"] for p in series),
+            "items": sum(p["items"] for p in series),
+        },
+        "downsampled": len(points) < len(series),
+        "series": points,
+    })
+
 # ===================== PRICING =====================
 @app.route("/pricing", methods=["GET"])
 @login_required
@@ -771,7 +1837,8 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # ===================== GALLERY =====================
 @app.route("/gallery", methods=["GET", "POST"])
 def gallery():
-    conn = connect()
+    # The admin upload (POST) writes, so only plain views use the replica
+    conn = connect(readonly=request.method == "GET")
     c = conn.cursor()
 
     # ADMIN UPLOAD
@@ -856,10 +1923,11 @@ def gallery_add():
         1 if request.form.get("show_price") else 0
     ))
 
+    log_action(c, "ADD GALLERY", request.form["name"])
+
     conn.commit()
     conn.close()
 
-    log_action("ADD GALLERY", request.form["name"])
     return jsonify(status="success")
 
 
@@ -885,6 +1953,9 @@ def delete_gallery(id):
 
     # Delete record
     c.execute("DELETE FROM gallery WHERE id = %s", (id,))
+
+    log_action(c, "DELETE GALLERY", f"Gallery ID {id}")
+
     conn.commit()
     conn.close()
 
@@ -894,7 +1965,6 @@ def delete_gallery(id):
         if os.path.exists(file_path):
             os.remove(file_path)
 
-    log_action("DELETE GALLERY", f"Gallery ID {id}")
     return jsonify(status="deleted")
 
 @app.route("/gallery/edit", methods=["POST"])
@@ -921,15 +1991,17 @@ def gallery_edit():
         int(data["id"])
     ))
 
+    log_action(c, "EDIT GALLERY", data["name"])
+
     conn.commit()
     conn.close()
 
-    log_action("EDIT GALLERY", data["name"])
     return jsonify(status="success")
 
 
 # ===================== GALLERY DESIGNS =====================
 @app.route("/gallery/<int:gallery_id>/designs")
+@read_only
 def gallery_designs(gallery_id):
     conn = connect()
     c = conn.cursor()
@@ -998,10 +2070,11 @@ def add_gallery_design():
         datetime.datetime.now().isoformat()
     ))
 
+    log_action(c, "ADD DESIGN", request.form["name"])
+
     conn.commit()
     conn.close()
 
-    log_action("ADD DESIGN", request.form["name"])
     return jsonify(status="success")
 
 @app.route("/gallery/design/edit", methods=["POST"])
@@ -1058,11 +2131,11 @@ def edit_gallery_design():
             WHERE id = %s
         """, params)
 
+        log_action(c, "EDIT DESIGN", data["name"])
+
         conn.commit()
         conn.close()
 
-        log_action("EDIT DESIGN", data["name"])
-
         return jsonify(status="success")
 
     except Exception as e:
@@ -1093,6 +2166,9 @@ def delete_gallery_design(id):
 
     # Delete record
     c.execute("DELETE FROM gallery_designs WHERE id = %s", (id,))
+
+    log_action(c, "DELETE DESIGN", name)
+
     conn.commit()
     conn.close()
 
@@ -1102,7 +2178,6 @@ def delete_gallery_design(id):
         if os.path.exists(file_path):
             os.remove(file_path)
 
-    log_action("DELETE DESIGN", name)
     return jsonify(status="deleted")
 
 # ===================== MATERIAL GUIDE =====================
@@ -1275,11 +2350,11 @@ def add_user():
         datetime.datetime.now().isoformat()
     ))
 
+    log_action(c, "USER_CREATE", username, f"Role={role}")
+
     conn.commit()
     conn.close()
 
-    log_action("USER_CREATE", username, f"Role={role}")
-
     return jsonify(status="success")
 
 
@@ -1306,11 +2381,11 @@ def update_user():
         WHERE id = %s
     """, (full_name, role, user_id))
 
+    log_action(c, "USER_UPDATE", f"user_id={user_id}")
+
     conn.commit()
     conn.close()
 
-    log_action("USER_UPDATE", f"user_id={user_id}")
-
     return jsonify(status="success")
 
 
@@ -1347,11 +2422,12 @@ def toggle_user():
     new_status = 0 if is_active else 1
 
     c.execute("UPDATE users SET is_active=%s WHERE id=%s", (new_status, user_id))
+
+    log_action(c, "USER_STATUS", username, f"active={new_status}")
+
     conn.commit()
     conn.close()
 
-    log_action("USER_STATUS", username, f"active={new_status}")
-
     return jsonify(status="success")
 
 
@@ -1385,11 +2461,11 @@ def reset_user_password():
         user_id
     ))
 
+    log_action(c, "USER_RESET_PW", username)
+
     conn.commit()
     conn.close()
 
-    log_action("USER_RESET_PW", username)
-
     return jsonify(status="success")
 
 # ===================== API USERS =====================
@@ -1450,7 +2526,18 @@ def api_users():
         "page": page
     })
 
+# ===================== DB POOL STATS =====================
+@app.route("/api/db/pool")
+@login_required
+def api_db_pool():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(pool_stats())
+
+
 @app.route("/api/featured-designs")
+@read_only
 def api_featured_designs():
     conn = connect()
     c = conn.cursor()
@@ -1512,21 +2599,23 @@ def match_designs(preferences):
     conn = connect()
     c = conn.cursor()
 
-    c.execute("SELECT id, name, image FROM gallery_designs")
-    designs = c.fetchall()
-
-    results = []
+    # Every design with its tags in one query, not one tag query per design
+    c.execute("""
+        SELECT d.id, d.name, d.image, t.tag_type, t.tag_value
+        FROM gallery_designs d
+        LEFT JOIN design_tags t ON t.design_id = d.id
+        ORDER BY d.id
+    """)
 
-    for d in designs:
-        design_id = d[0]
+    designs = {}
+    for design_id, name, image, tag_type, tag_value in c.fetchall():
+        _, tags = designs.setdefault(design_id, ((design_id, name, image), []))
+        if tag_type is not None:
+            tags.append((tag_type, tag_value))
 
-        c.execute("""
-            SELECT tag_type, tag_value
-            FROM design_tags
-            WHERE design_id = %s
-        """, (design_id,))
-        tags = c.fetchall()
+    results = []
 
+    for d, tags in designs.values():
         score = 0
         max_score = 0
 
@@ -0,0 +1,309 @@
+"""
+Cold storage for old sales and audit log rows.
+
+archive() moves rows older than the retention window out of the hot
+tables into gzip-compressed NDJSON files, one or more parts per table and
+month:
+
+  data/archive/sales/2025-01/part-001.ndjson.gz
+  data/archive/audit_logs/2025-01/part-001.ndjson.gz
+  data/archive/manifest.json
+
+Only whole months are archived. A row that lands in an archived month
+later (a backdated offline sale) goes into a new part on the next run.
+The manifest lists every part with its row count, time and id range and
+checksum. The history page reads parts on demand when a page reaches
+back past the hot tables; the dashboard is unaffected because it reads
+the daily rollups, which keep archived days.
+
+A part file and the manifest are written before the rows are deleted, so
+a crash in between leaves rows in both places rather than in neither;
+readers drop such duplicates. Run the job from one place only (cron).
+
+Usage:
+  python archive.py run [days]   # default ARCHIVE_RETENTION_DAYS
+  python archive.py list
+  python archive.py verify
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from database import connect, begin_write, placeholders
+
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "data/archive")
+RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", 365))
+
+# Archived table -> its time column
+ARCHIVED_TABLES = {
+    "sales": "date",
+    "audit_logs": "created_at",
+}
+
+# Columns written to the part files. Listed rather than SELECT *, which
+# would also pick up the generated search vector (Postgres) and the
+# pre-migration product/user columns of old sales tables.
+ARCHIVED_COLUMNS = {
+    "sales": (
+        "id", "product_id", "product_name", "qty", "total", "username",
+        "date", "voided", "void_reason", "voided_at", "order_id",
+    ),
+    "audit_logs": ("id", "action", "product_name", "details", "username", "created_at"),
+}
+
+DELETE_CHUNK = 500
+
+
+# -----------------------------
+# MANIFEST
+# -----------------------------
+_manifest_cache = {}
+
+
+def manifest_path():
+    return os.path.join(ARCHIVE_DIR, "manifest.json")
+
+
+def load_manifest():
+    # Re-read only when the file changed; history requests call this
+    path = manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {"partitions": []}
+
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+
+def write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_manifest(manifest):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    write_atomic(manifest_path(), json.dumps(manifest, indent=1).encode("utf-8"))
+
+
+def partitions(table, start=None, end=None):
+    """Manifest entries of `table` overlapping [start, end), newest first."""
+    found = []
+    for part in load_manifest()["partitions"]:
+        if part["table"] != table:
+            continue
+        if start and as_datetime(part["max_time"]) < start:
+            continue
+        if end and as_datetime(part["min_time"]) >= end:
+            continue
+        found.append(part)
+
+    return sorted(found, key=lambda p: (p["max_time"], p["path"]), reverse=True)
+
+
+def newest_time(tables):
+    times = [
+        as_datetime(part["max_time"])
+        for part in load_manifest()["partitions"]
+        if part["table"] in tables
+    ]
+    return max(times) if times else None
+
+
+def archived_until(table):
+    """Everything in `table` before this (exclusive) may be archived."""
+    months = [p["month"] for p in load_manifest()["partitions"] if p["table"] == table]
+    if not months:
+        return None
+    return next_month(datetime.datetime.strptime(max(months), "%Y-%m")).date()
+
+
+# -----------------------------
+# ARCHIVING
+# -----------------------------
+def as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def cutoff_for(retention_days, today=None):
+    # Start of the month that contains (today - retention): only months
+    # wholly outside the window are archived
+    oldest_kept = (today or datetime.date.today()) - datetime.timedelta(days=retention_days)
+    return datetime.datetime(oldest_kept.year, oldest_kept.month, 1)
+
+
+def encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def archive_month(conn, table, month):
+    """
+    Move one month of `table` into a new part file. Returns the manifest
+    entry, or None if the month had no rows.
+    """
+    column = ARCHIVED_TABLES[table]
+    c = conn.cursor()
+    begin_write(conn)
+
+    names = ARCHIVED_COLUMNS[table]
+    c.execute(f"""
+        SELECT {", ".join(names)} FROM {table}
+        WHERE {column} >= %s AND {column} < %s
+        ORDER BY {column}, id
+    """, (month, next_month(month)))
+    rows = [dict(zip(names, map(encode, row))) for row in c.fetchall()]
+
+    if not rows:
+        conn.rollback()
+        return None
+
+    manifest = load_manifest()
+    label = month.strftime("%Y-%m")
+    folder = os.path.join(ARCHIVE_DIR, table, label)
+    os.makedirs(folder, exist_ok=True)
+    number = 1 + sum(1 for p in manifest["partitions"] if p["table"] == table and p["month"] == label)
+    relative = f"{table}/{label}/part-{number:03d}.ndjson.gz"
+
+    body = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+    data = gzip.compress(body, mtime=0)
+    write_atomic(os.path.join(ARCHIVE_DIR, relative), data)
+
+    ids = [row["id"] for row in rows]
+    times = [as_datetime(row[column]) for row in rows]
+    entry = {
+        "table": table,
+        "month": label,
+        "path": relative,
+        "format": "ndjson.gz",
+        "rows": len(rows),
+        "min_time": min(times).isoformat(),
+        "max_time": max(times).isoformat(),
+        "min_id": min(ids),
+        "max_id": max(ids),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "archived_at": datetime.datetime.now().isoformat(),
+    }
+    save_manifest({"partitions": manifest["partitions"] + [entry]})
+
+    # Delete exactly what was written; anything inserted meanwhile stays
+    for start in range(0, len(ids), DELETE_CHUNK):
+        chunk = ids[start:start + DELETE_CHUNK]
+        c.execute(f"DELETE FROM {table} WHERE id IN ({placeholders(len(chunk))})", chunk)
+
+    conn.commit()
+    return entry
+
+
+def archive(conn, retention_days=RETENTION_DAYS, today=None):
+    """Archive every month older than the retention window. Returns the new parts."""
+    cutoff = cutoff_for(retention_days, today)
+    c = conn.cursor()
+    added = []
+
+    for table, column in ARCHIVED_TABLES.items():
+        c.execute(f"SELECT MIN({column}) FROM {table} WHERE {column} < %s", (cutoff,))
+        oldest = c.fetchone()[0]
+        if oldest is None:
+            continue
+
+        oldest = as_datetime(oldest)
+        month = datetime.datetime(oldest.year, oldest.month, 1)
+        while month < cutoff:
+            entry = archive_month(conn, table, month)
+            if entry:
+                added.append(entry)
+            month = next_month(month)
+
+    return added
+
+
+# -----------------------------
+# READING
+# -----------------------------
+def read_partition(part):
+    with gzip.open(os.path.join(ARCHIVE_DIR, part["path"]), "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def rows(table, start=None, end=None):
+    """
+    Archived rows of `table` in [start, end), newest first. Files are read
+    lazily, one month at a time, as the caller iterates.
+    """
+    column = ARCHIVED_TABLES[table]
+
+    months = {}
+    for part in partitions(table, start, end):
+        months.setdefault(part["month"], []).append(part)
+
+    for month in sorted(months, reverse=True):
+        # Later parts of a month can overlap earlier ones in time
+        batch = [row for part in months[month] for row in read_partition(part)]
+        for row in batch:
+            row[column] = as_datetime(row[column])
+        batch.sort(key=lambda row: (row[column], row["id"]), reverse=True)
+
+        for row in batch:
+            if start and row[column] < start:
+                continue
+            if end and row[column] >= end:
+                continue
+            yield row
+
+
+def verify():
+    """Manifest entries whose file is missing or fails its checksum."""
+    bad = []
+    for part in load_manifest()["partitions"]:
+        try:
+            with open(os.path.join(ARCHIVE_DIR, part["path"]), "rb") as f:
+                ok = hashlib.sha256(f.read()).hexdigest() == part["sha256"]
+        except FileNotFoundError:
+            ok = False
+        if not ok:
+            bad.append(part["path"])
+    return bad
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("run", "list", "verify"):
+        print(__doc__)
+        sys.exit(1)
+
+    if sys.argv[1] == "run":
+        conn = connect()
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else RETENTION_DAYS
+        for part in archive(conn, days):
+            print(f"{part['path']}: {part['rows']} rows")
+        conn.close()
+    elif sys.argv[1] == "list":
+        for part in load_manifest()["partitions"]:
+            print(f"{part['path']:<45} {part['rows']:>8}  {part['min_time']} .. {part['max_time']}")
+    else:
+        bad = verify()
+        for path in bad:
+            print(f"BAD: {path}")
+        sys.exit(1 if bad else 0)
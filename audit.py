@@ -0,0 +1,187 @@
+"""
+Audit log writer.
+
+AUDIT_MODE picks how an entry reaches audit_logs:
+
+  transaction  (default) inserted on the caller's cursor, so it commits or
+               rolls back with the change it describes; no extra commit
+  async        queued in memory once the caller's transaction commits and
+               bulk-inserted by a background thread; the request never
+               waits on the audit write. Entries still queued when the
+               process dies are lost, which is why the queue is flushed
+               at exit
+  sync         inserted and committed on a connection of its own once the
+               caller's transaction commits (at once outside one); an
+               entry for a change that rolls back is dropped with it
+"""
+
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+
+from database import connect_private, checkout, after_commit, values_rows
+
+
+AUDIT_MODES = ("transaction", "async", "sync")
+AUDIT_MODE = os.environ.get("AUDIT_MODE", "transaction")
+
+if AUDIT_MODE not in AUDIT_MODES:
+    raise RuntimeError(f"Unknown AUDIT_MODE: {AUDIT_MODE}")
+
+BATCH = 500
+FLUSH_SECONDS = float(os.environ.get("AUDIT_FLUSH_SECONDS", 1.0))
+QUEUE_MAX = 10000
+SHUTDOWN_TIMEOUT = 10
+
+
+# -----------------------------
+# WRITING
+# -----------------------------
+def write(c, rows):
+    # rows: (action, product_name, details, created_at, username)
+    for start in range(0, len(rows), BATCH):
+        chunk = rows[start:start + BATCH]
+        c.execute(f"""
+            INSERT INTO audit_logs (action, product_name, details, created_at, username)
+            VALUES {values_rows(5, len(chunk))}
+        """, [v for row in chunk for v in row])
+
+
+def write_committed(rows):
+    # Never the caller's connection: committing that would make whatever
+    # it has half done durable
+    conn = connect_private()
+    try:
+        write(conn.cursor(), rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_after_commit(rows):
+    def callback():
+        try:
+            write_committed(rows)
+        except Exception as e:
+            print(f"AUDIT WRITE ERROR ({len(rows)} entries lost):", e)
+
+    after_commit(callback)
+
+
+def record(c, action, product_name, details="", username=None, mode=None):
+    record_many(c, [(action, product_name, details)], username, mode)
+
+
+def record_many(c, entries, username=None, mode=None):
+    # entries: (action, product_name, details); one batched insert
+    now = datetime.datetime.now()
+    rows = [(action, product_name, details, now, username) for action, product_name, details in entries]
+    mode = mode or AUDIT_MODE
+
+    if mode == "async":
+        # Queued only once the change it describes has committed
+        def enqueue():
+            for row in rows:
+                writer.put(row)
+        after_commit(enqueue)
+    elif mode == "transaction" and c is not None:
+        write(c, rows)
+    else:
+        write_after_commit(rows)
+
+
+# -----------------------------
+# ASYNC WRITER (one per worker process)
+# -----------------------------
+class Writer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = None
+        self.pid = None
+        self.thread = None
+
+    def put(self, row):
+        with self.lock:
+            self._ensure_thread()
+            q = self.queue
+
+        try:
+            q.put_nowait(row)
+        except queue.Full:
+            # The database has fallen behind; write this one inline rather
+            # than grow without bound
+            print("AUDIT QUEUE FULL: writing inline")
+            write_after_commit([row])
+
+    def _ensure_thread(self):
+        # A forked worker inherits the object but not the thread
+        if self.pid != os.getpid() or not (self.thread and self.thread.is_alive()):
+            self.pid = os.getpid()
+            self.queue = queue.Queue(maxsize=QUEUE_MAX)
+            self.thread = threading.Thread(target=self._run, args=(self.queue,), daemon=True)
+            self.thread.start()
+
+    def _run(self, q):
+        while True:
+            row = q.get()
+            if row is None:
+                q.task_done()
+                return
+
+            # Whatever else arrives within FLUSH_SECONDS goes in the same batch
+            rows = [row]
+            stop = False
+            deadline = time.monotonic() + FLUSH_SECONDS
+            while len(rows) < BATCH:
+                try:
+                    row = q.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+
+            self._flush(rows)
+            for _ in range(len(rows) + stop):
+                q.task_done()
+            if stop:
+                return
+
+    def _flush(self, rows):
+        try:
+            conn = checkout()
+            try:
+                write(conn.cursor(), rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"AUDIT WRITER ERROR ({len(rows)} entries lost):", e)
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        with self.lock:
+            q = self.queue if self.pid == os.getpid() else None
+        if q is not None:
+            q.join()
+
+    def close(self):
+        with self.lock:
+            if self.pid != os.getpid() or not (self.thread and self.thread.is_alive()):
+                return
+            q, thread = self.queue, self.thread
+
+        try:
+            q.put(None, timeout=SHUTDOWN_TIMEOUT)
+        except queue.Full:
+            print("AUDIT WRITER: queue still full at shutdown")
+            return
+        thread.join(SHUTDOWN_TIMEOUT)
+
+
+writer = Writer()
+atexit.register(writer.close)
@@ -0,0 +1,164 @@
+"""
+Compare SQLite connection profiles under POS-like load.
+
+Every profile gets a fresh database. Several worker processes (like
+gunicorn workers) then run checkouts (SELECT + UPDATE stock + INSERT sale
+per cart line, one commit per cart) while other processes run the
+inventory/dashboard reads. The script reports throughput and how many
+operations failed with "database is locked".
+
+Usage:
+  python bench_sqlite_profile.py [--seconds 5] [--writers 4] [--readers 4]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ["DATABASE_URL"] = ""
+
+import database
+from migrations import migrate
+
+
+PRODUCTS = 500
+CART_LINES = 3
+
+
+def prepare(path, profile):
+    database.SQLITE_PATH = path
+    database.SQLITE_PROFILE = profile
+    database.close_pool()
+
+    migrate()
+
+    conn = database.connect()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO products (name, price, stock, category) VALUES (%s, %s, %s, %s)",
+        [(f"bench product {i}", 10 + i % 90, 1_000_000, "product") for i in range(PRODUCTS)]
+    )
+    conn.commit()
+    conn.close()
+    database.close_pool()
+
+
+def checkout_once(c, conn):
+    for _ in range(CART_LINES):
+        product_id = random.randint(1, PRODUCTS)
+
+        c.execute(
+            "SELECT name, price, stock FROM products WHERE id = %s AND is_deleted = 0",
+            (product_id,)
+        )
+        name, price, stock = c.fetchone()
+
+        c.execute(
+            "UPDATE products SET stock = stock - %s WHERE id = %s",
+            (1, product_id)
+        )
+        c.execute("""
+            INSERT INTO sales (product_id, product_name, qty, total, username, date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (product_id, name, 1, price, "bench", datetime.datetime.now()))
+
+    conn.commit()
+
+
+def read_once(c, conn):
+    c.execute("""
+        SELECT id, name, material_type, category, price, stock
+        FROM products WHERE is_deleted = 0
+        ORDER BY name LIMIT 10 OFFSET %s
+    """, (random.randint(0, PRODUCTS - 10),))
+    c.fetchall()
+
+    c.execute("SELECT SUM(total), COUNT(*) FROM sales WHERE voided = 0")
+    c.fetchone()
+
+
+def worker(path, profile, kind, seconds):
+    database.SQLITE_PATH = path
+    database.SQLITE_PROFILE = profile
+    database.close_pool()
+
+    op = checkout_once if kind == "write" else read_once
+    conn = database.connect()
+    c = conn.cursor()
+
+    done = locked = 0
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        try:
+            op(c, conn)
+            done += 1
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if "locked" not in str(e):
+                raise
+            locked += 1
+
+    conn.close()
+    return kind, done, locked
+
+
+def run(profile, seconds, writers, readers):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+
+    try:
+        prepare(path, profile)
+
+        jobs = ["write"] * writers + ["read"] * readers
+        totals = {"write": [0, 0], "read": [0, 0]}
+
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = [
+                pool.submit(worker, path, profile, kind, seconds)
+                for kind in jobs
+            ]
+            for f in futures:
+                kind, done, locked = f.result()
+                totals[kind][0] += done
+                totals[kind][1] += locked
+
+        return totals
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument(
+        "--profiles", nargs="+", default=list(database.SQLITE_PROFILES)
+    )
+    args = parser.parse_args()
+
+    print(f"{args.writers} checkout + {args.readers} read processes, "
+          f"{args.seconds:g}s per profile, {CART_LINES} lines per cart\n")
+    print(f"{'profile':<12}{'checkouts/s':>14}{'reads/s':>12}{'locked':>10}")
+
+    for profile in args.profiles:
+        totals = run(profile, args.seconds, args.writers, args.readers)
+        writes, write_locked = totals["write"]
+        reads, read_locked = totals["read"]
+
+        print(f"{profile:<12}"
+              f"{writes / args.seconds:>14.1f}"
+              f"{reads / args.seconds:>12.1f}"
+              f"{write_locked + read_locked:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Inventory listing: active products, filtered, sorted and paged.
+
+Pages continue from an opaque cursor (the last row's sort value and id)
+instead of an OFFSET, and every sort has a matching partial index (see
+m013_inventory_listing), so page 500 costs the same as page 1.
+
+Name search matches substrings through a trigram index: pg_trgm on
+Postgres, an FTS5 trigram table on SQLite. Trigrams need three
+characters; shorter searches match name prefixes.
+
+Totals are counted up to COUNT_CAP and cached per filter for
+TOTAL_TTL_SECONDS. The product write paths clear this worker's cache;
+other workers' totals can lag behind until they expire.
+"""
+
+import base64
+import json
+import threading
+import time
+
+from database import is_postgres
+
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+MAX_QUERY_LENGTH = 100
+
+# Shorter searches can't use the trigram index
+TRIGRAM = 3
+
+# sort -> (expression, direction). Expressions must match the indexes in
+# migrations.INVENTORY_INDEXES.
+SORTS = {
+    "name": ("name", "ASC"),
+    "price": ("COALESCE(price, 0)", "ASC"),
+    "-price": ("COALESCE(price, 0)", "DESC"),
+    "stock": ("COALESCE(stock, 0)", "ASC"),
+    "-stock": ("COALESCE(stock, 0)", "DESC"),
+}
+
+COUNT_CAP = 10000
+TOTAL_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 1000
+
+
+# -----------------------------
+# FILTERS + CURSOR
+# -----------------------------
+def parse_filters(args):
+    """Request args to a filter dict. Raises ValueError on anything malformed."""
+    sort = args.get("sort") or "name"
+    if sort not in SORTS:
+        raise ValueError("sort")
+
+    limit = int(args.get("limit") or PAGE_SIZE)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError("limit")
+
+    cursor = args.get("cursor") or None
+    if cursor:
+        cursor = decode_cursor(cursor, sort)
+
+    return {
+        "q": (args.get("q") or "").strip().lower()[:MAX_QUERY_LENGTH] or None,
+        "material": (args.get("material") or "").strip() or None,
+        "category": (args.get("category") or "").strip() or None,
+        "sort": sort,
+        "limit": limit,
+        "cursor": cursor,
+    }
+
+
+def encode_cursor(sort, row):
+    key = row["name"] if sort == "name" else row[sort.lstrip("-")] or 0
+    data = json.dumps([sort, key, row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(value, sort):
+    try:
+        cursor_sort, key, row_id = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+    except Exception:
+        raise ValueError("cursor")
+
+    # A cursor only makes sense for the order it was taken from
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise ValueError("cursor")
+    return key, row_id
+
+
+# -----------------------------
+# QUERIES
+# -----------------------------
+def escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def name_match(q):
+    if len(q) >= TRIGRAM:
+        if is_postgres():
+            return "name ILIKE %s", [f"%{escape_like(q)}%"]
+        # A quoted FTS5 phrase of trigrams is a case-insensitive substring
+        phrase = '"' + q.replace('"', '""') + '"'
+        return "id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH %s)", [phrase]
+
+    like = "ILIKE" if is_postgres() else "LIKE"
+    return f"name {like} %s ESCAPE '\\'", [f"{escape_like(q)}%"]
+
+
+def where_clause(filters):
+    where, params = ["is_deleted = 0"], []
+
+    if filters["q"]:
+        clause, values = name_match(filters["q"])
+        where.append(clause)
+        params += values
+    if filters["material"]:
+        where.append("material_type = %s")
+        params.append(filters["material"])
+    if filters["category"]:
+        where.append("category = %s")
+        params.append(filters["category"])
+
+    return where, params
+
+
+def list_products(c, filters):
+    """
+    One page of products as (rows, next_cursor). next_cursor is None on
+    the last page.
+    """
+    expression, direction = SORTS[filters["sort"]]
+    where, params = where_clause(filters)
+
+    if filters["cursor"]:
+        key, row_id = filters["cursor"]
+        op = ">" if direction == "ASC" else "<"
+        where.append(f"{expression} {op}= %s AND ({expression} {op} %s OR id {op} %s)")
+        params += [key, key, row_id]
+
+    # One extra row tells whether another page follows
+    limit = filters["limit"]
+    c.execute(f"""
+        SELECT id, name, material_type, category, price, stock
+        FROM products
+        WHERE {" AND ".join(where)}
+        ORDER BY {expression} {direction}, id {direction}
+        LIMIT %s
+    """, params + [limit + 1])
+
+    rows = [
+        {
+            "id": row[0],
+            "name": row[1],
+            "material_type": row[2],
+            "category": row[3],
+            "price": row[4],
+            "stock": row[5],
+        }
+        for row in c.fetchall()
+    ]
+
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(filters["sort"], rows[limit - 1])
+    return rows, None
+
+
+# -----------------------------
+# CACHED TOTALS + FACETS
+# -----------------------------
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def cached(key, compute):
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+
+    value = compute()
+    with _cache_lock:
+        # Keys include the free-text search, so keep the dict bounded:
+        # expired entries go first, then the oldest
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            for stale in [k for k, (expires, _) in _cache.items() if expires <= now]:
+                del _cache[stale]
+            while len(_cache) >= CACHE_MAX_ENTRIES:
+                del _cache[next(iter(_cache))]
+        _cache.pop(key, None)
+        _cache[key] = (now + TOTAL_TTL_SECONDS, value)
+    return value
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def total(c, filters):
+    """
+    (count, capped) of the products matching `filters`, ignoring the
+    cursor. Counting stops at COUNT_CAP; capped is True when it did.
+    """
+    where, params = where_clause(filters)
+
+    def count():
+        c.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM products WHERE {" AND ".join(where)} LIMIT %s
+            ) AS matching
+        """, params + [COUNT_CAP + 1])
+        n = c.fetchone()[0]
+        return min(n, COUNT_CAP), n > COUNT_CAP
+
+    key = ("total", filters["q"], filters["material"], filters["category"])
+    return cached(key, count)
+
+
+def facets(c):
+    """Distinct materials and categories of active products, for filter menus."""
+    def compute():
+        c.execute("""
+            SELECT DISTINCT material_type FROM products
+            WHERE is_deleted = 0 AND material_type IS NOT NULL
+            ORDER BY material_type
+        """)
+        materials = [row[0] for row in c.fetchall()]
+
+        c.execute("""
+            SELECT DISTINCT category FROM products
+            WHERE is_deleted = 0 AND category IS NOT NULL
+            ORDER BY category
+        """)
+        categories = [row[0] for row in c.fetchall()]
+        return {"materials": materials, "categories": categories}
+
+    return cached(("facets",), compute)
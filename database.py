@@ -1,16 +1,63 @@
+import logging
 import os
+import re
 import sqlite3
+import threading
+import time
+import weakref
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from collections import Counter
+from flask import g, has_app_context, has_request_context, request, session
 
 load_dotenv()
 
 try:
     import psycopg2
+    import psycopg2.pool
 except ImportError:
     psycopg2 = None
 
 
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "data/database.db")
+SQLITE_READ_PATH = os.environ.get("SQLITE_READ_PATH")
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "production")
+
+# PRAGMAs applied once to every new SQLite connection.
+SQLITE_PROFILES = {
+    # Stock SQLite: rollback journal, synchronous=FULL, no mmap
+    "legacy": {},
+    # WAL lets readers run alongside the single writer; NORMAL sync is
+    # still crash-safe in WAL mode (only the last commits may roll back
+    # on power loss).
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+    },
+}
+
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+
+# After a session writes, its reads stay on the primary this long so it
+# never sees a replica that hasn't caught up yet.
+READ_AFTER_WRITE_SECONDS = float(os.environ.get("DB_READ_AFTER_WRITE_SECONDS", 5))
+REPLICA_RETRY_SECONDS = 30
+# At most one "replica unavailable" warning per worker this often
+REPLICA_WARN_SECONDS = 300
+
+PRIMARY = "primary"
+REPLICA = "replica"
+
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG = os.environ.get("DB_SLOW_QUERY_LOG", "data/slow_queries.log")
+
+
 # -----------------------------
 # DB MODE DETECTION
 # -----------------------------
@@ -19,28 +66,84 @@ def is_postgres():
     return bool(os.environ.get("DATABASE_URL"))
 
 
+def has_replica():
+    if is_postgres():
+        return bool(os.environ.get("DATABASE_READ_URL"))
+    return bool(SQLITE_READ_PATH)
+
+
 # -----------------------------
 # CONNECTION
 # -----------------------------
 
-def connect():
-    if is_postgres():
-        return connect_postgres()
-    else:
-        return connect_sqlite()
+def connect(readonly=None):
+    # readonly=None inherits the marker set by @read_only on the route.
+    if readonly is None:
+        readonly = has_app_context() and g.get("db_readonly", False)
+
+    role = REPLICA if readonly and _replica_allowed() else PRIMARY
 
+    # Inside a Flask request every caller shares one connection per role,
+    # handed back to the pool on teardown (see init_app).
+    if has_app_context():
+        if role == REPLICA:
+            if "db_read_conn" not in g:
+                conn = _checkout_replica(request_scoped=True)
+                if conn is not None:
+                    g.db_read_conn = conn
+            if "db_read_conn" in g:
+                return g.db_read_conn
 
-def connect_sqlite():
-    return sqlite3.connect("data/database.db")
+        if "db_conn" not in g:
+            g.db_conn = checkout(PRIMARY, request_scoped=True)
+        return g.db_conn
+
+    if role == REPLICA:
+        conn = _checkout_replica()
+        if conn is not None:
+            return conn
+
+    return checkout(PRIMARY)
+
+
+def connect_sqlite(path=None, readonly=False):
+    if SQLITE_PROFILE not in SQLITE_PROFILES:
+        raise RuntimeError(f"Unknown SQLITE_PROFILE: {SQLITE_PROFILE}")
+
+    pragmas = SQLITE_PROFILES[SQLITE_PROFILE]
+    timeout = pragmas.get("busy_timeout", 5000) / 1000
+
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True,
+            timeout=timeout, check_same_thread=False
+        )
+    else:
+        conn = sqlite3.connect(
+            path or SQLITE_PATH, timeout=timeout, check_same_thread=False
+        )
+
+    for key, value in pragmas.items():
+        if readonly and key == "journal_mode":
+            continue
+        conn.execute(f"PRAGMA {key} = {value}")
+    return conn
 
 
 def connect_postgres():
     if psycopg2 is None:
         raise RuntimeError("psycopg2 not installed")
 
-    url = urlparse(os.environ["DATABASE_URL"])
+    return psycopg2.connect(**postgres_params())
+
+
+def postgres_params(role=PRIMARY):
+    if role == REPLICA:
+        url = urlparse(os.environ["DATABASE_READ_URL"])
+    else:
+        url = urlparse(os.environ["DATABASE_URL"])
 
-    conn = psycopg2.connect(
+    params = dict(
         dbname=url.path[1:],
         user=url.username,
         password=url.password,
@@ -48,147 +151,627 @@ def connect_postgres():
         port=url.port,
         sslmode="prefer"
     )
-    return conn
+
+    if role == REPLICA:
+        params.update(
+            connect_timeout=3,
+            options="-c default_transaction_read_only=on"
+        )
+
+    return params
 
 
 # -----------------------------
-# SCHEMA SETUP
+# SQL HELPERS
 # -----------------------------
 
-def setup():
-    conn = connect()
-    c = conn.cursor()
-
-    # ---------------- USERS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id SERIAL PRIMARY KEY,
-        username TEXT UNIQUE,
-        password TEXT,
-        role TEXT,
-        is_active INTEGER DEFAULT 1,
-        full_name TEXT,
-        created_at TEXT,
-        last_login TEXT
-    )
-    """)
-
-    # ---------------- PRODUCTS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS products (
-        id SERIAL PRIMARY KEY,
-        name TEXT UNIQUE,
-        price REAL,
-        stock INTEGER
-    )
-    """)
-
-    # Extra columns used by app
-    safe_add_column(c, "products", "is_deleted", "INTEGER DEFAULT 0")
-    safe_add_column(c, "products", "category", "TEXT")
-    safe_add_column(c, "products", "material_type", "TEXT")
-
-    # ---------------- SALES ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS sales (
-        id SERIAL PRIMARY KEY,
-        product_id INTEGER,
-        product_name TEXT,
-        qty INTEGER,
-        total REAL,
-        username TEXT,
-        date TIMESTAMP,
-        voided INTEGER DEFAULT 0,
-        void_reason TEXT,
-        voided_at TIMESTAMP
-    )
-    """)
-
-    # ---------------- GALLERY ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS gallery (
-        id SERIAL PRIMARY KEY,
-        name TEXT,
-        category TEXT,
-        image TEXT,
-        price REAL,
-        show_price INTEGER
-    )
-    """)
-
-    # ---------------- GALLERY DESIGNS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS gallery_designs (
-        id SERIAL PRIMARY KEY,
-        gallery_id INTEGER,
-        name TEXT,
-        image TEXT,
-        laser_settings TEXT,
-        created_at TEXT
-    )
-    """)
-
-    # ---------------- USER SETTINGS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS user_settings (
-        user_id INTEGER PRIMARY KEY,
-        settings TEXT,
-        updated_at TEXT
-    )
-    """)
-
-    # ---------------- MATERIALS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS materials (
-        id SERIAL PRIMARY KEY,
-        name TEXT,
-        thickness REAL,
-        notes TEXT
-    )
-    """)
-
-    # ---------------- MATERIAL SETTINGS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS material_settings (
-        id SERIAL PRIMARY KEY,
-        material_id INTEGER NOT NULL,
-        process TEXT NOT NULL,
-        intensity TEXT,
-        power INTEGER NOT NULL,
-        speed INTEGER,
-        passes INTEGER NOT NULL,
-        notes TEXT
-    )
-    """)
-
-    # ---------------- AUDIT LOGS ----------------
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS audit_logs (
-        id SERIAL PRIMARY KEY,
-        action TEXT,
-        product_name TEXT,
-        details TEXT,
-        created_at TEXT
-    )
-    """)
+def placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def values_rows(width, count):
+    # "(%s, %s), (%s, %s), ..." for multi-row VALUES lists
+    row = "(" + placeholders(width) + ")"
+    return ", ".join([row] * count)
+
+
+def for_update():
+    # Row locks only exist on Postgres; SQLite locks the whole database
+    # for the write transaction instead (see begin_write).
+    return " FOR UPDATE" if is_postgres() else ""
+
+
+# Postgres: the writing transaction's id, standing in for a change version
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+
+def change_horizon(c, counter):
+    """
+    The highest change version a reader can resume after without ever
+    skipping a row: everything stamped with it or lower has committed or
+    rolled back. SQLite writers take turns under the database lock, so
+    the counter in change_versions is such a horizon already. On Postgres
+    versions are transaction ids (CURRENT_XID), which need no shared row
+    lock; every transaction below the snapshot's xmin has finished.
+    """
+    if is_postgres():
+        c.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1")
+    else:
+        c.execute("SELECT value FROM change_versions WHERE name = %s", (counter,))
+    row = c.fetchone()
+    return row[0] if row else 0
+
 
-    conn.commit()
-    conn.close()
+# Constraint violations from either driver, e.g. a duplicate product name
+IntegrityError = (sqlite3.IntegrityError,) + ((psycopg2.IntegrityError,) if psycopg2 else ())
+
+
+def begin_write(conn):
+    # SQLite: take the write lock up front (BEGIN IMMEDIATE) so a
+    # read-check-write sequence can't interleave with another writer or
+    # fail to upgrade its lock halfway. Postgres transactions start
+    # implicitly and rely on row locks.
+    if isinstance(conn._raw, sqlite3.Connection) and not conn.in_transaction:
+        conn.cursor().execute("BEGIN IMMEDIATE")
 
 
 # -----------------------------
-# SAFE COLUMN ADDER
+# READ REPLICA ROUTING
 # -----------------------------
 
-def safe_add_column(cursor, table, column, coltype):
+replica_log = logging.getLogger("ae_lasercraft.replica")
+
+_replica_down_until = 0
+_replica_warned_at = 0
+
+
+def _recently_wrote():
+    if has_app_context() and g.get("db_wrote"):
+        return True
+
+    if has_request_context():
+        last = session.get("db_last_write")
+        return last is not None and time.time() - last < READ_AFTER_WRITE_SECONDS
+
+    return False
+
+
+def _replica_allowed():
+    return (
+        has_replica()
+        and time.time() >= _replica_down_until
+        and not _recently_wrote()
+    )
+
+
+def _checkout_replica(request_scoped=False):
+    global _replica_down_until, _replica_warned_at
+
     try:
-        if is_postgres():
-            cursor.execute(
-                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {coltype}"
-            )
+        return checkout(REPLICA, request_scoped)
+    except Exception as e:
+        # Callers fall back to the primary; leave the replica alone a bit
+        now = time.time()
+        _replica_down_until = now + REPLICA_RETRY_SECONDS
+        if now - _replica_warned_at >= REPLICA_WARN_SECONDS:
+            _replica_warned_at = now
+            replica_log.warning("Read replica unavailable, reading from the primary: %s", e)
+        return None
+
+
+def mark_write():
+    if has_app_context():
+        g.db_wrote = True
+    # Only worth a session cookie when there is a replica to steer away from
+    if has_request_context() and has_replica():
+        session["db_last_write"] = time.time()
+
+
+def read_only(view):
+    """
+    Route decorator: DB reads made while handling the request go to the
+    read replica when one is configured.
+    """
+    from functools import wraps
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_readonly = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+# -----------------------------
+# CONNECTION POOL
+# -----------------------------
+
+class PooledConnection:
+    """
+    Thin proxy around a DB-API connection checked out from the pool.
+
+    close() hands the connection back to the pool instead of dropping it.
+    Request-scoped connections ignore close() so helpers called from a
+    handler can share them; they are released on teardown instead.
+    """
+
+    def __init__(self, raw, role=PRIMARY, request_scoped=False):
+        self._raw = raw
+        self.role = role
+        self._request_scoped = request_scoped
+        self._released = False
+        self._after_commit = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if isinstance(self._raw, sqlite3.Connection):
+            cursor = SQLiteCursor(cursor)
+        return InstrumentedCursor(cursor)
+
+    def commit(self):
+        self._raw.commit()
+        if self.role == PRIMARY and self._request_scoped:
+            mark_write()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._raw.rollback()
+        self._after_commit = []
+
+    @property
+    def in_transaction(self):
+        if isinstance(self._raw, sqlite3.Connection):
+            return self._raw.in_transaction
+        return self._raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._after_commit = []
+        release(self._raw, self.role)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
         else:
-            cursor.execute(
-                f"ALTER TABLE {table} ADD COLUMN {column} {coltype}"
+            self.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class PrivateConnection(PooledConnection):
+    """
+    A SQLite connection of its own, outside the per-thread slots; close()
+    really closes it. See connect_private().
+    """
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._raw.close()
+
+
+def connect_private():
+    """
+    A primary connection no other caller shares, so committing it can't
+    commit anyone else's work. Pooled Postgres connections already are;
+    SQLite shares one per thread, so this opens a separate one.
+    """
+    if is_postgres():
+        return checkout(PRIMARY)
+    return PrivateConnection(connect_sqlite())
+
+
+def after_commit(callback):
+    """
+    Run `callback` once the request's open transaction commits, or
+    drop it if that transaction rolls back. Runs it at once outside a
+    request or when no transaction is open.
+    """
+    conn = g.get("db_conn") if has_app_context() else None
+    if conn is None or conn._released or not conn.in_transaction:
+        callback()
+        return
+    conn._after_commit.append(callback)
+
+
+class SQLiteCursor:
+    """
+    The app's SQL is written for psycopg2 (%s placeholders); translate it
+    so the same statements run on the SQLite backend.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(sql.replace("%s", "?"), seq_of_params)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _new_stats():
+    return {
+        "checkouts": 0,
+        "in_use": 0,
+        "opened": 0,
+        "waits": 0,
+        "timeouts": 0,
+    }
+
+
+_pools = {}
+_pool_slots = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+_sqlite_local = threading.local()
+_sqlite_slots = weakref.WeakSet()
+_stats = {PRIMARY: _new_stats(), REPLICA: _new_stats()}
+
+
+def _count(role, key, n=1):
+    with _pool_lock:
+        _stats[role][key] += n
+
+
+def _ensure_pool(role):
+    global _pool_pid, _sqlite_slots, _sqlite_local
+
+    if _pool_pid == os.getpid() and (role in _pools or not is_postgres()):
+        return
+
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            # Forked worker: never reuse the parent's sockets/handles.
+            _pools.clear()
+            _sqlite_slots = weakref.WeakSet()
+            _sqlite_local = threading.local()
+            _pool_slots.clear()
+            _pool_pid = os.getpid()
+
+        if role not in _pool_slots:
+            _pool_slots[role] = threading.BoundedSemaphore(POOL_MAX)
+
+        if is_postgres() and role not in _pools:
+            if psycopg2 is None:
+                raise RuntimeError("psycopg2 not installed")
+            _pools[role] = psycopg2.pool.ThreadedConnectionPool(
+                POOL_MIN, POOL_MAX, **postgres_params(role)
             )
+            _stats[role]["opened"] += POOL_MIN
+
+
+def checkout(role=PRIMARY, request_scoped=False):
+    _ensure_pool(role)
+
+    if is_postgres():
+        raw = _checkout_postgres(role)
+    else:
+        raw = _checkout_sqlite(role)
+
+    with _pool_lock:
+        _stats[role]["checkouts"] += 1
+        _stats[role]["in_use"] += 1
+
+    return PooledConnection(raw, role=role, request_scoped=request_scoped)
+
+
+def _checkout_postgres(role):
+    pool = _pools[role]
+    slots = _pool_slots[role]
+
+    if not slots.acquire(blocking=False):
+        _count(role, "waits")
+        if not slots.acquire(timeout=POOL_TIMEOUT):
+            _count(role, "timeouts")
+            raise RuntimeError("Database connection pool exhausted")
+
+    try:
+        idle_before = len(pool._pool)
+        conn = pool.getconn()
+        if conn.closed:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        if idle_before == 0:
+            _count(role, "opened")
+        return conn
+    except Exception:
+        slots.release()
+        raise
+
+
+class _SQLiteSlot:
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+        self.depth = 0
+
+
+def _checkout_sqlite(role):
+    # One long-lived connection per thread and database file. The slots
+    # live in thread-local storage, so connections are closed when their
+    # thread goes away.
+    path = SQLITE_READ_PATH if role == REPLICA else SQLITE_PATH
+
+    slots = getattr(_sqlite_local, "slots", None)
+    if slots is None:
+        slots = _sqlite_local.slots = {}
+
+    slot = slots.get(role)
+    if slot is None or slot.path != path:
+        conn = connect_sqlite(path, readonly=role == REPLICA)
+        slot = slots[role] = _SQLiteSlot(conn, path)
+        with _pool_lock:
+            _sqlite_slots.add(slot)
+            _stats[role]["opened"] += 1
+
+    slot.depth += 1
+    return slot.conn
+
+
+def release(raw, role=PRIMARY):
+    _count(role, "in_use", -1)
+
+    if isinstance(raw, sqlite3.Connection):
+        # Nested checkouts on one thread share the connection; only the
+        # outermost release may discard uncommitted work.
+        slot = getattr(_sqlite_local, "slots", {}).get(role)
+        if slot is not None and slot.conn is raw:
+            slot.depth -= 1
+            if slot.depth > 0:
+                return
+        raw.rollback()
+        return
+
+    try:
+        raw.rollback()
     except Exception:
         pass
+
+    pool = _pools.get(role)
+    if pool is None or _pool_pid != os.getpid():
+        raw.close()
+        return
+
+    try:
+        pool.putconn(raw, close=bool(raw.closed))
+    finally:
+        _pool_slots[role].release()
+
+
+def close_pool():
+    global _pool_pid, _sqlite_slots, _sqlite_local, _replica_down_until
+
+    with _pool_lock:
+        if _pool_pid == os.getpid():
+            for pool in _pools.values():
+                pool.closeall()
+        for slot in list(_sqlite_slots):
+            try:
+                slot.conn.close()
+            except Exception:
+                pass
+
+        _pools.clear()
+        _pool_slots.clear()
+        _pool_pid = None
+        _sqlite_slots = weakref.WeakSet()
+        _sqlite_local = threading.local()
+        _replica_down_until = 0
+        for role in _stats:
+            _stats[role] = _new_stats()
+
+
+def _role_stats(role):
+    with _pool_lock:
+        stats = dict(_stats[role])
+
+    if is_postgres():
+        pool = _pools.get(role)
+        stats.update(
+            backend="postgres",
+            min_size=POOL_MIN,
+            max_size=POOL_MAX,
+            idle=len(pool._pool) if pool is not None else 0,
+        )
+    else:
+        stats.update(
+            backend="sqlite",
+            path=SQLITE_READ_PATH if role == REPLICA else SQLITE_PATH,
+            profile=SQLITE_PROFILE,
+        )
+
+    return stats
+
+
+def pool_stats():
+    stats = _role_stats(PRIMARY)
+
+    if not is_postgres():
+        stats["threads"] = len(_sqlite_slots)
+
+    if has_replica():
+        stats["replica"] = _role_stats(REPLICA)
+        stats["replica"]["down"] = time.time() < _replica_down_until
+
+    return stats
+
+
+# -----------------------------
+# QUERY INSTRUMENTATION
+# -----------------------------
+
+slow_query_log = logging.getLogger("ae_lasercraft.slow_queries")
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SQL_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    # Literals, placeholders, IN lists and multi-row VALUES collapse so the
+    # same statement shape always normalizes to the same text.
+    sql = _SQL_STRING.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _SQL_PARAM_LIST.sub("(...)", sql)
+    sql = _SQL_ROWS.sub("(...), ...", sql)
+    return _SQL_SPACE.sub(" ", sql).strip()
+
+
+def _new_query_stats():
+    return {
+        "count": 0,
+        "time": 0.0,
+        "slowest_time": 0.0,
+        "slowest_sql": None,
+        "statements": Counter(),
+    }
+
+
+def query_stats():
+    # Stats for the current request (or app context)
+    if not has_app_context():
+        return None
+    if "db_query_stats" not in g:
+        g.db_query_stats = _new_query_stats()
+    return g.db_query_stats
+
+
+def record_query(sql, elapsed):
+    stats = query_stats()
+    normalized = None
+
+    if stats is not None:
+        normalized = normalize_sql(sql)
+        stats["count"] += 1
+        stats["time"] += elapsed
+        stats["statements"][normalized] += 1
+        if elapsed > stats["slowest_time"]:
+            stats["slowest_time"] = elapsed
+            stats["slowest_sql"] = normalized
+
+    ms = elapsed * 1000
+    if ms >= SLOW_QUERY_MS:
+        slow_query_log.warning(
+            "%.1fms %s %s",
+            ms,
+            request.path if has_request_context() else "-",
+            normalized or normalize_sql(sql)
+        )
+
+
+def n_plus_one(stats, limit):
+    # Statements repeated more than `limit` times in one request
+    return {
+        sql: n for sql, n in stats["statements"].items() if n > limit
+    }
+
+
+class InstrumentedCursor:
+    """
+    Times every statement for the per-request stats and the slow-query log.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, params)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _setup_slow_query_log():
+    if slow_query_log.handlers or not SLOW_QUERY_LOG:
+        return
+
+    os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+    handler = logging.FileHandler(SLOW_QUERY_LOG, delay=True)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_log.addHandler(handler)
+    slow_query_log.setLevel(logging.WARNING)
+
+
+def init_app(app):
+    _setup_slow_query_log()
+
+    @app.after_request
+    def add_query_stats(response):
+        stats = g.get("db_query_stats")
+        if stats is None:
+            return response
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries"'
+        )
+
+        # Test mode: fail loudly on per-row query loops
+        limit = app.config.get("DB_N_PLUS_ONE_LIMIT")
+        if limit:
+            repeated = n_plus_one(stats, limit)
+            if repeated:
+                raise AssertionError(
+                    f"N+1 queries in {request.method} {request.path}: {repeated}"
+                )
+
+        return response
+
+    @app.teardown_appcontext
+    def release_request_connection(exc):
+        for key in ("db_conn", "db_read_conn"):
+            conn = g.pop(key, None)
+            if conn is not None:
+                conn.release()
+
+
+# -----------------------------
+# SCHEMA SETUP
+# -----------------------------
+
+def setup():
+    # Schema changes live in migrations.py; once the database is current
+    # this is a single SELECT against schema_version.
+    from migrations import migrate
+    return migrate()
@@ -0,0 +1,260 @@
+"""
+Live updates for the POS, inventory and history pages.
+
+Write paths call publish() inside their own transaction, so an event
+exists only if the change it describes was committed. Every worker process
+runs one hub thread that polls the events table and fans new rows out to
+the server-sent-event streams connected to that process. The database is
+the only thing the workers share; there is no broker.
+"""
+
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+from database import checkout, is_postgres, change_horizon, CURRENT_XID
+
+
+POLL_SECONDS = float(os.environ.get("EVENTS_POLL_SECONDS", 0.5))
+HEARTBEAT_SECONDS = 15
+RETENTION_SECONDS = int(os.environ.get("EVENTS_RETENTION_SECONDS", 3600))
+PURGE_EVERY_SECONDS = 300
+BATCH = 500
+# Postgres event ids: the writer's transaction id times this, plus the
+# event's number within its transaction
+EVENTS_PER_TRANSACTION = 1 << 16
+
+
+# -----------------------------
+# PUBLISH
+# -----------------------------
+def publish(c, kind, payload):
+    """
+    Append an event in the caller's transaction. No reader sees an id
+    until every lower one has committed (see safe_id), so the hub's cursor
+    never skips an event that commits late. SQLite takes ids from the
+    change_versions counter; on Postgres they derive from the transaction
+    id, so concurrent writers don't queue for one counter row.
+    """
+    if is_postgres():
+        c.execute(f"""
+            SELECT x.base, MAX(e.id)
+            FROM (SELECT {CURRENT_XID} * %s AS base) AS x
+            LEFT JOIN events AS e ON e.id >= x.base AND e.id < x.base + %s
+            GROUP BY x.base
+        """, (EVENTS_PER_TRANSACTION, EVENTS_PER_TRANSACTION))
+        base, last = c.fetchone()
+        event_id = base if last is None else last + 1
+        if event_id >= base + EVENTS_PER_TRANSACTION:
+            raise RuntimeError("Too many events in one transaction")
+    else:
+        c.execute("""
+            UPDATE change_versions SET value = value + 1
+            WHERE name = 'events'
+            RETURNING value
+        """)
+        event_id = c.fetchone()[0]
+
+    c.execute("""
+        INSERT INTO events (id, kind, payload, created_at)
+        VALUES (%s, %s, %s, %s)
+    """, (event_id, kind, json.dumps(payload), datetime.datetime.now()))
+
+    return event_id
+
+
+def stock_payload(rows):
+    # rows: (id, stock, is_deleted)
+    return {
+        "products": [
+            {"id": pid, "stock": stock, "deleted": bool(deleted)}
+            for pid, stock, deleted in rows
+        ]
+    }
+
+
+def safe_id(c):
+    # Highest event id with nothing at or below it still to commit
+    horizon = change_horizon(c, "events")
+    if is_postgres():
+        return (horizon + 1) * EVENTS_PER_TRANSACTION - 1
+    return horizon
+
+
+def fetch_since(event_id, limit=BATCH):
+    conn = checkout()
+    try:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, kind, payload
+            FROM events
+            WHERE id > %s AND id <= %s
+            ORDER BY id
+            LIMIT %s
+        """, (event_id, safe_id(c), limit))
+        return c.fetchall()
+    finally:
+        conn.close()
+
+
+def latest_id():
+    conn = checkout()
+    try:
+        return safe_id(conn.cursor())
+    finally:
+        conn.close()
+
+
+def purge():
+    conn = checkout()
+    try:
+        c = conn.cursor()
+        c.execute(
+            "DELETE FROM events WHERE created_at < %s",
+            (datetime.datetime.now() - datetime.timedelta(seconds=RETENTION_SECONDS),)
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print("EVENTS PURGE ERROR:", e)
+    finally:
+        conn.close()
+
+
+# -----------------------------
+# HUB (one per worker process)
+# -----------------------------
+class Hub:
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.subscribers = set()
+        self.cursor = None
+        self.pid = None
+        self.thread = None
+
+    def subscribe(self, start):
+        """
+        Register a stream that has seen every event up to `start`. An idle
+        hub resumes from there, so nothing committed after it is skipped.
+        """
+        q = queue.Queue(maxsize=1000)
+        with self.lock:
+            self._ensure_thread()
+            if self.cursor is None:
+                self.cursor = start
+            self.subscribers.add(q)
+            self.lock.notify()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _ensure_thread(self):
+        # A forked worker inherits the object but not the thread
+        if self.pid != os.getpid() or not (self.thread and self.thread.is_alive()):
+            self.pid = os.getpid()
+            self.subscribers = set()
+            self.cursor = None
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _broadcast(self, rows):
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for q in subscribers:
+            for row in rows:
+                try:
+                    q.put_nowait(row)
+                except queue.Full:
+                    # A stalled client: end its stream, it reconnects with
+                    # Last-Event-ID and catches up from the table
+                    self.unsubscribe(q)
+                    with q.mutex:
+                        q.queue.clear()
+                    q.put_nowait(None)
+                    break
+
+    def _run(self):
+        next_purge = 0
+
+        while True:
+            with self.lock:
+                while not self.subscribers:
+                    self.cursor = None
+                    self.lock.wait()
+                cursor = self.cursor
+
+            rows = []
+            try:
+                rows = fetch_since(cursor)
+                if rows:
+                    with self.lock:
+                        self.cursor = rows[-1][0]
+                    self._broadcast(rows)
+
+                if time.time() >= next_purge:
+                    purge()
+                    next_purge = time.time() + PURGE_EVERY_SECONDS
+
+            except Exception as e:
+                print("EVENTS HUB ERROR:", e)
+
+            # A full batch means more are waiting
+            if len(rows) < BATCH:
+                time.sleep(POLL_SECONDS)
+
+
+hub = Hub()
+
+
+# -----------------------------
+# SERVER-SENT EVENTS
+# -----------------------------
+def format_event(event_id, kind, payload):
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+def stream(last_event_id=None):
+    """
+    SSE body generator. Reads the backlog only after subscribing, so an
+    event lands in the backlog, the queue or both; duplicates are dropped
+    by id.
+    """
+    sent = last_event_id if last_event_id is not None else latest_id()
+    q = hub.subscribe(sent)
+
+    try:
+        yield "retry: 3000\n\n"
+
+        # Everything the hub read before this subscription is only in the
+        # table; fetch_since is capped at BATCH, so page up to its cursor
+        with hub.lock:
+            target = hub.cursor or 0
+        while True:
+            rows = fetch_since(sent)
+            for row in rows:
+                yield format_event(*row)
+                sent = row[0]
+            if len(rows) < BATCH or sent >= target:
+                break
+
+        while True:
+            try:
+                row = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+
+            if row is None:
+                return
+
+            if row[0] > sent:
+                yield format_event(*row)
+                sent = row[0]
+    finally:
+        hub.unsubscribe(q)
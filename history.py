@@ -0,0 +1,285 @@
+"""
+System history: sales and audit log entries, newest first.
+
+Each source is read through its own index with a keyset predicate and a
+LIMIT, and the two ordered streams are merged lazily, so a page costs
+O(page size) however long the history is. Pages continue from an opaque
+cursor (the last row's time, type and id) instead of an OFFSET.
+
+Rows moved to cold storage by archive.py are merged in the same way, but
+only once a page reaches back past the hot tables.
+
+Order is time DESC, then SALE before INVENTORY, then id DESC.
+"""
+
+import datetime
+import heapq
+import itertools
+
+import archive
+
+
+HISTORY_TYPES = ("SALE", "INVENTORY")
+HISTORY_STATUSES = ("COMPLETED", "VOIDED")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Tie-break between sources at the same timestamp
+TYPE_RANK = {"SALE": 0, "INVENTORY": 1}
+
+
+# -----------------------------
+# FILTERS + CURSOR
+# -----------------------------
+def parse_filters(args):
+    """
+    Request args to a filter dict. from/to are inclusive YYYY-MM-DD days.
+    Raises ValueError on anything malformed.
+    """
+    kind = (args.get("type") or "").upper() or None
+    if kind is not None and kind not in HISTORY_TYPES:
+        raise ValueError("type")
+
+    status = (args.get("status") or "").upper() or None
+    if status is not None and status not in HISTORY_STATUSES:
+        raise ValueError("status")
+
+    start = args.get("from") or None
+    if start:
+        start = datetime.datetime.fromisoformat(start[:10])
+
+    end = args.get("to") or None
+    if end:
+        end = datetime.datetime.fromisoformat(end[:10]) + datetime.timedelta(days=1)
+
+    limit = int(args.get("limit") or PAGE_SIZE)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError("limit")
+
+    cursor = args.get("cursor") or None
+    if cursor:
+        cursor = decode_cursor(cursor)
+
+    return {
+        "type": kind,
+        "user": (args.get("user") or "").strip() or None,
+        "status": status,
+        "start": start,
+        "end": end,
+        "limit": limit,
+        "cursor": cursor,
+    }
+
+
+def encode_cursor(row):
+    return f"{row['time'].isoformat()},{row['type']},{row['id']}"
+
+
+def decode_cursor(value):
+    time, kind, row_id = value.split(",")
+    if kind not in TYPE_RANK:
+        raise ValueError("cursor")
+    return datetime.datetime.fromisoformat(time), kind, int(row_id)
+
+
+def as_datetime(value):
+    # TIMESTAMP columns come back as datetimes on Postgres and as ISO
+    # strings on SQLite
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def keyset(column, kind, cursor):
+    """
+    WHERE clause continuing after `cursor` for the source `kind`, in the
+    global order.
+    """
+    time, cursor_kind, row_id = cursor
+
+    if TYPE_RANK[kind] < TYPE_RANK[cursor_kind]:
+        return f"{column} < %s", [time]
+    if TYPE_RANK[kind] > TYPE_RANK[cursor_kind]:
+        return f"{column} <= %s", [time]
+    return f"{column} <= %s AND ({column} < %s OR id < %s)", [time, time, row_id]
+
+
+# -----------------------------
+# SOURCES
+# -----------------------------
+def sales_rows(c, filters, limit):
+    where, params = ["date IS NOT NULL"], []
+
+    if filters["start"]:
+        where.append("date >= %s")
+        params.append(filters["start"])
+    if filters["end"]:
+        where.append("date < %s")
+        params.append(filters["end"])
+    if filters["user"]:
+        where.append("username = %s")
+        params.append(filters["user"])
+    if filters["status"] == "VOIDED":
+        where.append("voided = 1")
+    elif filters["status"] == "COMPLETED":
+        where.append("voided = 0")
+    if filters["cursor"]:
+        clause, values = keyset("date", "SALE", filters["cursor"])
+        where.append(clause)
+        params += values
+
+    c.execute(f"""
+        SELECT id, date, product_name, voided, total, qty, username, order_id
+        FROM sales
+        WHERE {" AND ".join(where)}
+        ORDER BY date DESC, id DESC
+        LIMIT %s
+    """, params + [limit])
+
+    for row in c.fetchall():
+        yield sale_entry(*row)
+
+
+def sale_entry(row_id, time, name, voided, total, qty, username, order_id):
+    return {
+        "id": row_id,
+        "time": as_datetime(time),
+        "type": "SALE",
+        "title": "Sale Completed",
+        "subject": name,
+        "details": "",
+        "status": "VOIDED" if voided == 1 else "COMPLETED",
+        "amount": total,
+        "qty": qty,
+        "user": username or "",
+        "order_id": order_id,
+    }
+
+
+def audit_rows(c, filters, limit):
+    where, params = ["created_at IS NOT NULL"], []
+
+    if filters["start"]:
+        where.append("created_at >= %s")
+        params.append(filters["start"])
+    if filters["end"]:
+        where.append("created_at < %s")
+        params.append(filters["end"])
+    if filters["user"]:
+        where.append("username = %s")
+        params.append(filters["user"])
+    if filters["cursor"]:
+        clause, values = keyset("created_at", "INVENTORY", filters["cursor"])
+        where.append(clause)
+        params += values
+
+    c.execute(f"""
+        SELECT id, created_at, action, product_name, details, username
+        FROM audit_logs
+        WHERE {" AND ".join(where)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, params + [limit])
+
+    for row in c.fetchall():
+        yield audit_entry(*row)
+
+
+def audit_entry(row_id, time, action, name, details, username):
+    return {
+        "id": row_id,
+        "time": as_datetime(time),
+        "type": "INVENTORY",
+        "title": action,
+        "subject": name,
+        "details": details or "",
+        "status": "",
+        "amount": None,
+        "qty": None,
+        "user": username or "",
+        "order_id": None,
+    }
+
+
+def archived_rows(filters, table):
+    """
+    Rows moved to cold storage by archive.py, newest first, with the same
+    filters applied in Python. Files are only opened when iterated.
+    """
+    cursor_key, end = None, filters["end"]
+    if filters["cursor"]:
+        time, kind, row_id = filters["cursor"]
+        cursor_key = (time, -TYPE_RANK[kind], row_id)
+        # Months newer than the cursor needn't be opened at all; rows at
+        # the cursor's own time are still compared below
+        bound = time + datetime.timedelta(microseconds=1)
+        end = min(end, bound) if end else bound
+
+    for row in archive.rows(table, filters["start"], end):
+        if table == "sales":
+            entry = sale_entry(
+                row["id"], row["date"], row.get("product_name"), row.get("voided"),
+                row.get("total"), row.get("qty"), row.get("username"), row.get("order_id")
+            )
+            if filters["status"] and entry["status"] != filters["status"]:
+                continue
+        else:
+            entry = audit_entry(
+                row["id"], row["created_at"], row.get("action"), row.get("product_name"),
+                row.get("details"), row.get("username")
+            )
+
+        if filters["user"] and entry["user"] != filters["user"]:
+            continue
+        if cursor_key and sort_key(entry) >= cursor_key:
+            continue
+        yield entry
+
+
+# -----------------------------
+# PAGE
+# -----------------------------
+def sort_key(row):
+    return row["time"], -TYPE_RANK[row["type"]], row["id"]
+
+
+def merged(streams):
+    # A row archived just before a crash can still be in its hot table
+    # too; both copies sort next to each other
+    previous = None
+    for row in heapq.merge(*streams, key=sort_key, reverse=True):
+        if (row["type"], row["id"]) != previous:
+            yield row
+        previous = row["type"], row["id"]
+
+
+def history_page(c, filters):
+    """
+    One page of history as (rows, next_cursor). next_cursor is None on
+    the last page.
+    """
+    limit = filters["limit"]
+
+    # One extra row tells whether another page follows. Each source
+    # fetches its rows before yielding, so they can share the cursor.
+    streams, tables = [], []
+    if filters["type"] in (None, "SALE"):
+        streams.append(sales_rows(c, filters, limit + 1))
+        tables.append("sales")
+    if filters["type"] in (None, "INVENTORY") and not filters["status"]:
+        streams.append(audit_rows(c, filters, limit + 1))
+        tables.append("audit_logs")
+
+    rows = list(itertools.islice(merged(streams), limit + 1))
+
+    # Cold storage only holds older rows, so it is read only when this
+    # page runs out of hot rows or reaches back into archived time
+    newest_archived = archive.newest_time(tables)
+    if newest_archived and (len(rows) <= limit or rows[-1]["time"] <= newest_archived):
+        archived = [archived_rows(filters, table) for table in tables]
+        rows = list(itertools.islice(merged([iter(rows)] + archived), limit + 1))
+
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
@@ -0,0 +1,930 @@
+import datetime
+import logging
+import re
+
+from database import connect, begin_write, is_postgres, CURRENT_XID
+
+
+migration_log = logging.getLogger("ae_lasercraft.migrations")
+
+# Arbitrary key for pg_advisory_xact_lock so that only one worker at a
+# time applies migrations.
+MIGRATION_LOCK_ID = 72_0401
+
+# Rows per transaction when a migration backfills a large table
+BACKFILL_BATCH = 5000
+
+
+# -----------------------------
+# DIALECT HELPERS
+# -----------------------------
+
+def pk():
+    if is_postgres():
+        return "SERIAL PRIMARY KEY"
+    return "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+
+def table_exists(c, table):
+    if is_postgres():
+        c.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+        return c.fetchone()[0]
+
+    c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+        (table,)
+    )
+    return c.fetchone() is not None
+
+
+def reset_sequence(c, table):
+    # After inserting explicit ids; SQLite's AUTOINCREMENT tracks them itself
+    if is_postgres():
+        c.execute(f"""
+            SELECT setval(
+                pg_get_serial_sequence('{table}', 'id'),
+                COALESCE((SELECT MAX(id) FROM {table}), 0) + 1,
+                false
+            )
+        """)
+
+
+def column_exists(c, table, column):
+    if is_postgres():
+        c.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = %s AND column_name = %s
+        """, (table, column))
+        return c.fetchone() is not None
+
+    c.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in c.fetchall())
+
+
+def column_type(c, table, column):
+    # Declared type, lower-cased; None if the column doesn't exist
+    if is_postgres():
+        c.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = %s AND column_name = %s
+        """, (table, column))
+        row = c.fetchone()
+        return row[0].lower() if row else None
+
+    c.execute(f"PRAGMA table_info({table})")
+    for row in c.fetchall():
+        if row[1] == column:
+            return row[2].lower()
+    return None
+
+
+def add_column(c, table, column, coltype):
+    if not column_exists(c, table, column):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {coltype}")
+
+
+def create_index(c, name, table, columns, where=None, unique=False):
+    # Same syntax on SQLite (>= 3.9 for expression/partial indexes) and
+    # Postgres, so one definition serves both backends.
+    sql = (
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+        f"ON {table} ({columns})"
+    )
+    if where:
+        sql += f" WHERE {where}"
+    c.execute(sql)
+
+
+def rebuild_table(c, table, definition):
+    """
+    SQLite can't alter a column's constraints in place: build a copy of
+    `table` from definition(its CREATE TABLE), move the rows over, swap it
+    in and recreate the table's indexes and triggers.
+    """
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+    original = c.fetchone()[0]
+    rebuilt = definition(original)
+    if rebuilt == original:
+        raise RuntimeError(f"Rebuilding {table} would not change it")
+
+    c.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = %s AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """, (table,))
+    dependents = [row[0] for row in c.fetchall()]
+
+    c.execute(f"PRAGMA table_info({table})")
+    columns = ", ".join(row[1] for row in c.fetchall())
+
+    # AUTOINCREMENT's high-water mark goes with the dropped table
+    sequence = None
+    if table_exists(c, "sqlite_sequence"):
+        c.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", (table,))
+        row = c.fetchone()
+        sequence = row[0] if row else None
+
+    c.execute(re.sub(rf'^CREATE TABLE\s+"?{table}"?', f"CREATE TABLE {table}_rebuild", rebuilt, count=1))
+    c.execute(f"INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}")
+    c.execute(f"DROP TABLE {table}")
+    c.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    for sql in dependents:
+        c.execute(sql)
+
+    if sequence is not None:
+        c.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", (sequence, table))
+
+
+# -----------------------------
+# MIGRATION STEPS
+# -----------------------------
+
+def m001_baseline(c):
+    # ---------------- USERS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS users (
+        id {pk()},
+        username TEXT UNIQUE,
+        password TEXT,
+        role TEXT,
+        is_active INTEGER DEFAULT 1,
+        full_name TEXT,
+        created_at TEXT,
+        last_login TEXT
+    )
+    """)
+    add_column(c, "users", "is_active", "INTEGER DEFAULT 1")
+    add_column(c, "users", "full_name", "TEXT")
+    add_column(c, "users", "created_at", "TEXT")
+    add_column(c, "users", "last_login", "TEXT")
+
+    # ---------------- PRODUCTS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS products (
+        id {pk()},
+        name TEXT UNIQUE,
+        price REAL,
+        stock INTEGER
+    )
+    """)
+    add_column(c, "products", "is_deleted", "INTEGER DEFAULT 0")
+    add_column(c, "products", "category", "TEXT")
+    add_column(c, "products", "material_type", "TEXT")
+
+    # ---------------- SALES ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS sales (
+        id {pk()},
+        product_id INTEGER,
+        product_name TEXT,
+        qty INTEGER,
+        total REAL,
+        username TEXT,
+        date TIMESTAMP,
+        voided INTEGER DEFAULT 0,
+        void_reason TEXT,
+        voided_at TIMESTAMP
+    )
+    """)
+    add_column(c, "sales", "product_id", "INTEGER")
+    add_column(c, "sales", "product_name", "TEXT")
+    add_column(c, "sales", "voided", "INTEGER DEFAULT 0")
+    add_column(c, "sales", "void_reason", "TEXT")
+    add_column(c, "sales", "voided_at", "TIMESTAMP")
+
+    # ---------------- GALLERY ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS gallery (
+        id {pk()},
+        name TEXT,
+        category TEXT,
+        image TEXT,
+        price REAL,
+        show_price INTEGER
+    )
+    """)
+
+    # ---------------- GALLERY DESIGNS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS gallery_designs (
+        id {pk()},
+        gallery_id INTEGER,
+        name TEXT,
+        image TEXT,
+        laser_settings TEXT,
+        created_at TEXT
+    )
+    """)
+
+    # ---------------- USER SETTINGS ----------------
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS user_settings (
+        user_id INTEGER PRIMARY KEY,
+        settings TEXT,
+        updated_at TEXT
+    )
+    """)
+
+    # ---------------- MATERIALS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS materials (
+        id {pk()},
+        name TEXT,
+        thickness REAL,
+        notes TEXT
+    )
+    """)
+
+    # ---------------- MATERIAL SETTINGS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS material_settings (
+        id {pk()},
+        material_id INTEGER NOT NULL,
+        process TEXT NOT NULL,
+        intensity TEXT,
+        power INTEGER NOT NULL,
+        speed INTEGER,
+        passes INTEGER NOT NULL,
+        notes TEXT
+    )
+    """)
+
+    # ---------------- AUDIT LOGS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id {pk()},
+        action TEXT,
+        product_name TEXT,
+        details TEXT,
+        created_at TEXT
+    )
+    """)
+
+
+def m002_design_quiz(c):
+    # ---------------- FEATURED DESIGNS ----------------
+    add_column(c, "gallery_designs", "is_featured", "INTEGER DEFAULT 0")
+
+    # ---------------- DESIGN TAGS ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS design_tags (
+        id {pk()},
+        design_id INTEGER NOT NULL,
+        tag_type TEXT NOT NULL,
+        tag_value TEXT NOT NULL
+    )
+    """)
+
+    # ---------------- DESIGN QUIZ ----------------
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS design_quiz_sessions (
+        id {pk()},
+        user_ip TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS design_quiz_answers (
+        id {pk()},
+        session_id INTEGER NOT NULL,
+        question_key TEXT NOT NULL,
+        answer_value TEXT
+    )
+    """)
+
+
+# (name, table, columns, partial-index predicate) for every hot query path
+# in app.py. Partial predicates must match the literal WHERE clause used
+# by the queries (e.g. "is_deleted = 0") or the planners won't use them.
+HOT_PATH_INDEXES = [
+    # inventory page, POS product list, duplicate-name checks, stock API
+    # (dropped by m017)
+    ("idx_products_active_name", "products", "name, stock", "is_deleted = 0"),
+    # /api/materials
+    ("idx_products_category_name", "products", "category, name", None),
+    # dashboard revenue / orders / sales-by-day (covering, dropped by m017)
+    ("idx_sales_active_date", "sales", "date, total", "voided = 0"),
+    # dashboard top products (covering, dropped by m017)
+    ("idx_sales_active_product", "sales", "product_name, qty", "voided = 0"),
+    # landing + gallery grouping
+    ("idx_gallery_category_name", "gallery", "category, name", None),
+    # landing featured strip, /api/featured-designs
+    ("idx_gallery_designs_featured", "gallery_designs", "id", "is_featured = 1"),
+    # /gallery/<id>/designs
+    ("idx_gallery_designs_gallery", "gallery_designs", "gallery_id, id", None),
+    # design quiz matching + results
+    ("idx_design_tags_design", "design_tags", "design_id", None),
+    ("idx_design_quiz_answers_session", "design_quiz_answers", "session_id", None),
+    # material guide join
+    ("idx_material_settings_material", "material_settings", "material_id", None),
+    # authenticate(): WHERE LOWER(username) = LOWER(%s)
+    ("idx_users_username_lower", "users", "LOWER(username)", None),
+    # audit history ordering
+    ("idx_audit_logs_created_at", "audit_logs", "created_at", None),
+]
+
+
+def m003_hot_path_indexes(c):
+    for name, table, columns, where in HOT_PATH_INDEXES:
+        create_index(c, name, table, columns, where)
+
+    # Refresh planner statistics so the new indexes are picked up at once
+    c.execute("ANALYZE")
+
+
+def m004_orders(c):
+    # Old SQLite databases carry an unused "orders" table for custom
+    # requests (customer_name, product, ...); keep it out of the way.
+    if table_exists(c, "orders") and not column_exists(c, "orders", "line_count"):
+        c.execute("ALTER TABLE orders RENAME TO legacy_orders")
+
+    # ---------------- ORDERS ----------------
+    # One header row per checkout. total/items are kept net of voided
+    # lines so reports can read one row per order.
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS orders (
+        id {pk()},
+        username TEXT,
+        created_at TIMESTAMP,
+        line_count INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0,
+        voided INTEGER DEFAULT 0,
+        voided_at TIMESTAMP
+    )
+    """)
+
+    add_column(c, "sales", "order_id", "INTEGER")
+
+    # Very old sales tables recorded the cashier in "user"
+    if not column_exists(c, "sales", "username"):
+        add_column(c, "sales", "username", "TEXT")
+        if column_exists(c, "sales", "user"):
+            c.execute('UPDATE sales SET username = "user"')
+
+    # Existing lines were never grouped, so each becomes its own order
+    c.execute("""
+        INSERT INTO orders (id, username, created_at, line_count, items, total, voided, voided_at)
+        SELECT
+            id, username, date, 1,
+            CASE WHEN voided = 1 THEN 0 ELSE qty END,
+            CASE WHEN voided = 1 THEN 0 ELSE total END,
+            voided, voided_at
+        FROM sales
+        WHERE order_id IS NULL
+    """)
+    c.execute("UPDATE sales SET order_id = id WHERE order_id IS NULL")
+    reset_sequence(c, "orders")
+
+    create_index(c, "idx_orders_active_created", "orders", "created_at, total", "voided = 0")
+    create_index(c, "idx_orders_cashier_created", "orders", "username, created_at")
+    create_index(c, "idx_sales_order", "sales", "order_id")
+
+
+def m005_idempotency_keys(c):
+    # ---------------- IDEMPOTENCY KEYS ----------------
+    # Client-supplied request keys for checkout retries. The response is
+    # stored in the same transaction as the sale it describes.
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        id {pk()},
+        username TEXT NOT NULL,
+        request_key TEXT NOT NULL,
+        fingerprint TEXT,
+        status_code INTEGER,
+        response TEXT,
+        created_at TIMESTAMP,
+        expires_at TIMESTAMP
+    )
+    """)
+
+    create_index(c, "idx_idempotency_keys_key", "idempotency_keys", "username, request_key", unique=True)
+    create_index(c, "idx_idempotency_keys_expires", "idempotency_keys", "expires_at")
+
+
+def m006_product_change_version(c):
+    # ---------------- CHANGE VERSIONS ----------------
+    # One counter per table. Bumping it takes a row lock (Postgres) or the
+    # write lock (SQLite), so versions become visible in commit order and a
+    # reader's "since" cursor never skips a row.
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS change_versions (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    if not column_exists(c, "products", "change_version"):
+        add_column(c, "products", "change_version", "INTEGER NOT NULL DEFAULT 0")
+        c.execute("UPDATE products SET change_version = id")
+
+    c.execute("""
+        INSERT INTO change_versions (name, value)
+        SELECT 'products', (SELECT COALESCE(MAX(change_version), 0) FROM products)
+        WHERE NOT EXISTS (SELECT 1 FROM change_versions WHERE name = 'products')
+    """)
+
+    # Triggers, so every write path (checkout, voids, edits, imports)
+    # stamps the rows it touches without having to remember to.
+    if is_postgres():
+        c.execute("""
+        CREATE OR REPLACE FUNCTION bump_product_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE change_versions SET value = value + 1
+            WHERE name = 'products'
+            RETURNING value INTO NEW.change_version;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """)
+        c.execute("DROP TRIGGER IF EXISTS products_change_version ON products")
+        c.execute("""
+        CREATE TRIGGER products_change_version
+        BEFORE INSERT OR UPDATE ON products
+        FOR EACH ROW EXECUTE PROCEDURE bump_product_version()
+        """)
+    else:
+        for event in ("INSERT", "UPDATE"):
+            c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS products_change_version_{event.lower()}
+            AFTER {event} ON products
+            BEGIN
+                UPDATE change_versions SET value = value + 1 WHERE name = 'products';
+                UPDATE products
+                SET change_version = (SELECT value FROM change_versions WHERE name = 'products')
+                WHERE id = NEW.id;
+            END
+            """)
+
+    create_index(c, "idx_products_change_version", "products", "change_version")
+
+
+def m007_events(c):
+    # ---------------- EVENTS ----------------
+    # Short-lived feed for the live-update streams (see events.py). Ids come
+    # from change_versions rather than a sequence so they commit in order.
+    id_type = "BIGINT" if is_postgres() else "INTEGER"
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS events (
+        id {id_type} PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT,
+        created_at TIMESTAMP
+    )
+    """)
+
+    c.execute("""
+        INSERT INTO change_versions (name, value)
+        SELECT 'events', 0
+        WHERE NOT EXISTS (SELECT 1 FROM change_versions WHERE name = 'events')
+    """)
+
+    create_index(c, "idx_events_created_at", "events", "created_at")
+
+
+def m008_stock_ledger(c):
+    # ---------------- STOCK LEDGER ----------------
+    # Append-only history of stock changes plus periodic per-product
+    # snapshots (see stock_ledger.py).
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS stock_movements (
+        id {pk()},
+        product_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        order_id INTEGER,
+        sale_id INTEGER,
+        username TEXT,
+        created_at TIMESTAMP
+    )
+    """)
+
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS stock_snapshots (
+        id {pk()},
+        product_id INTEGER NOT NULL,
+        stock INTEGER NOT NULL,
+        movement_id INTEGER NOT NULL,
+        taken_at TIMESTAMP
+    )
+    """)
+
+    # Opening balances: history starts now (app-local time, like every
+    # other timestamp the app writes)
+    c.execute("""
+        INSERT INTO stock_snapshots (product_id, stock, movement_id, taken_at)
+        SELECT id, COALESCE(stock, 0), 0, %s
+        FROM products
+        WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots)
+    """, (datetime.datetime.now(),))
+
+    create_index(c, "idx_stock_movements_product", "stock_movements", "product_id, id")
+    create_index(c, "idx_stock_movements_created", "stock_movements", "created_at")
+    create_index(c, "idx_stock_snapshots_product_taken", "stock_snapshots", "product_id, taken_at")
+    create_index(c, "idx_stock_snapshots_product_movement", "stock_snapshots", "product_id, movement_id")
+
+
+def m009_sales_rollups(c):
+    # ---------------- SALES ROLLUPS ----------------
+    # Kept current by checkout and voids (see rollups.py)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        day DATE PRIMARY KEY,
+        revenue REAL NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS sales_daily_product (
+        day DATE NOT NULL,
+        product_name TEXT NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_name)
+    )
+    """)
+
+    from rollups import rebuild
+    rebuild(c)
+
+
+def m010_history_filters(c):
+    # Who made an inventory/admin change; NULL for older entries
+    add_column(c, "audit_logs", "username", "TEXT")
+
+    # /history keyset pages: newest first, optionally per user or status
+    create_index(c, "idx_audit_logs_user_created", "audit_logs", "username, created_at, id")
+    create_index(c, "idx_sales_date_id", "sales", "date, id")
+    create_index(c, "idx_sales_user_date", "sales", "username, date, id")
+    create_index(c, "idx_sales_voided_date", "sales", "date, id", "voided = 1")
+
+
+def audit_text_to_timestamp():
+    # ISO text ("2026-01-10T22:08:01.498159") to the backend's timestamp;
+    # on SQLite that is the form the sqlite3 adapter writes for datetimes
+    if is_postgres():
+        return "CAST(created_at AS TIMESTAMP)"
+    return "REPLACE(created_at, 'T', ' ')"
+
+
+def backfill_audit_logs_timestamp(conn):
+    """
+    Copy audit_logs.created_at into a TIMESTAMP column (logged_at) in id
+    ranges of BACKFILL_BATCH rows, one short transaction each, so audit
+    writes keep going during the copy. Idempotent; several workers may run
+    it at once.
+    """
+    c = conn.cursor()
+
+    _lock(c)
+    if column_type(c, "audit_logs", "created_at") != "text":
+        conn.rollback()
+        return
+    add_column(c, "audit_logs", "logged_at", "TIMESTAMP")
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM audit_logs")
+    last_id = c.fetchone()[0]
+    conn.commit()
+
+    for start in range(0, last_id, BACKFILL_BATCH):
+        begin_write(conn)
+        c.execute(f"""
+            UPDATE audit_logs SET logged_at = {audit_text_to_timestamp()}
+            WHERE id > %s AND id <= %s AND logged_at IS NULL
+        """, (start, start + BACKFILL_BATCH))
+        conn.commit()
+
+
+def m011_audit_logs_timestamp(c):
+    # The bulk of the copy already ran in backfill_audit_logs_timestamp();
+    # this catches up rows written since and swaps the columns.
+    if column_exists(c, "audit_logs", "logged_at"):
+        c.execute(f"""
+            UPDATE audit_logs SET logged_at = {audit_text_to_timestamp()}
+            WHERE logged_at IS NULL AND created_at IS NOT NULL
+        """)
+
+        # SQLite refuses to drop an indexed column
+        c.execute("DROP INDEX IF EXISTS idx_audit_logs_created_at")
+        c.execute("DROP INDEX IF EXISTS idx_audit_logs_user_created")
+        c.execute("ALTER TABLE audit_logs DROP COLUMN created_at")
+        c.execute("ALTER TABLE audit_logs RENAME COLUMN logged_at TO created_at")
+
+    create_index(c, "idx_audit_logs_created_at", "audit_logs", "created_at, id")
+    create_index(c, "idx_audit_logs_user_created", "audit_logs", "username, created_at, id")
+
+
+m011_audit_logs_timestamp.backfill = backfill_audit_logs_timestamp
+
+
+# Full-text search columns, most important first:
+# table -> [(column, Postgres weight, SQLite bm25 weight)]
+SEARCH_COLUMNS = {
+    "audit_logs": [("product_name", "A", 10.0), ("action", "B", 5.0), ("details", "C", 1.0)],
+    "sales": [("product_name", "A", 10.0), ("username", "B", 5.0), ("void_reason", "C", 1.0)],
+}
+
+
+def m012_search(c):
+    # Kept current by the database itself (generated column / triggers),
+    # so every write path, including archive deletes, updates the index
+    for table, columns in SEARCH_COLUMNS.items():
+        names = [name for name, _, _ in columns]
+
+        if is_postgres():
+            vector = " || ".join(
+                f"setweight(to_tsvector('simple', COALESCE({name}, '')), '{weight}')"
+                for name, weight, _ in columns
+            )
+            add_column(c, table, "search", f"tsvector GENERATED ALWAYS AS ({vector}) STORED")
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_search ON {table} USING GIN (search)")
+            continue
+
+        create_fts(c, table, names, "unicode61 remove_diacritics 2")
+
+
+def create_fts(c, table, names, tokenize):
+    """
+    External-content FTS5 table `<table>_fts` over `names`, kept in step
+    with `table` by triggers, and filled from the rows already there.
+    """
+    fts = f"{table}_fts"
+    new = ", ".join(f"new.{name}" for name in names)
+    old = ", ".join(f"old.{name}" for name in names)
+
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {", ".join(names)},
+            content='{table}', content_rowid='id',
+            tokenize='{tokenize}'
+        )
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts} (rowid, {", ".join(names)}) VALUES (new.id, {new});
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {", ".join(names)}) VALUES ('delete', old.id, {old});
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {", ".join(names)} ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {", ".join(names)}) VALUES ('delete', old.id, {old});
+            INSERT INTO {fts} (rowid, {", ".join(names)}) VALUES (new.id, {new});
+        END
+    """)
+
+    # Index the rows that are already there
+    c.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+# (name, columns) of the inventory listing's keyset indexes. Sort
+# expressions must match catalog.SORTS exactly.
+INVENTORY_INDEXES = [
+    ("idx_products_active_name_id", "name, id"),
+    ("idx_products_active_price", "COALESCE(price, 0), id"),
+    ("idx_products_active_stock", "COALESCE(stock, 0), id"),
+    ("idx_products_active_category", "category, name, id"),
+    ("idx_products_active_material", "material_type, name, id"),
+]
+
+
+def m013_inventory_listing(c):
+    for name, columns in INVENTORY_INDEXES:
+        create_index(c, name, "products", columns, "is_deleted = 0")
+
+    # Substring search on product names: trigrams on both backends
+    if is_postgres():
+        c.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_products_name_trgm
+            ON products USING GIN (name gin_trgm_ops)
+            WHERE is_deleted = 0
+        """)
+    else:
+        create_fts(c, "products", ["name"], "trigram")
+
+
+# How product names are compared for uniqueness; write paths store names
+# as typed, so "Mug" and "mug " are the same product
+PRODUCT_NAME_KEY = "LOWER(TRIM(name))"
+
+
+def m014_unique_product_names(c):
+    # Older duplicates among active products keep the oldest row's name;
+    # the others get their id appended so the index can be built
+    c.execute(f"""
+        UPDATE products
+        SET name = TRIM(name) || ' #' || id
+        WHERE is_deleted = 0 AND name IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM products
+              WHERE is_deleted = 0
+              GROUP BY {PRODUCT_NAME_KEY}
+          )
+    """)
+    if c.rowcount:
+        migration_log.warning("Renamed %d duplicate product name(s)", c.rowcount)
+
+    create_index(
+        c, "idx_products_active_name_unique", "products", PRODUCT_NAME_KEY,
+        "is_deleted = 0", unique=True
+    )
+
+
+def m015_change_version_horizon(c):
+    # ---------------- CHANGE VERSION HORIZON ----------------
+    # On Postgres the change_versions row bumped by every product write
+    # (m006) stayed locked until commit, so checkouts, edits and imports
+    # queued behind each other whatever rows they touched. Versions are
+    # now the writer's transaction id and readers stop below the oldest
+    # one still running (see database.change_horizon). SQLite writers
+    # queue for the database lock anyway and keep the counter.
+    if not is_postgres():
+        return
+
+    c.execute("ALTER TABLE products ALTER COLUMN change_version TYPE BIGINT")
+    c.execute(f"""
+    CREATE OR REPLACE FUNCTION bump_product_version() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_version := {CURRENT_XID};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+
+
+def m016_product_name_constraint(c):
+    # ---------------- PRODUCT NAME CONSTRAINT ----------------
+    # The UNIQUE on products.name (m001) covers deleted products too, so
+    # their names could never be reused. The partial index from m014 is
+    # the only rule now.
+    if is_postgres():
+        c.execute("ALTER TABLE products DROP CONSTRAINT IF EXISTS products_name_key")
+        return
+
+    # origin "u": the automatic index behind a UNIQUE column constraint
+    c.execute("PRAGMA index_list(products)")
+    if not any(row[3] == "u" for row in c.fetchall()):
+        return
+
+    rebuild_table(c, "products", lambda sql: re.sub(
+        r"\bname\s+TEXT\s+UNIQUE\b", "name TEXT", sql, count=1, flags=re.IGNORECASE
+    ))
+
+
+# Indexes no query reads any more; each one still slows every write to
+# its table
+UNUSED_INDEXES = [
+    # the dashboard reads sales_daily / sales_daily_product (m009)
+    "idx_sales_active_date",
+    "idx_sales_active_product",
+    # product lists use idx_products_active_name_id (m013), name checks
+    # idx_products_active_name_unique (m014)
+    "idx_products_active_name",
+]
+
+
+def m017_drop_unused_indexes(c):
+    for name in UNUSED_INDEXES:
+        c.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+# Ordered list of (version, name, step). Never edit or reorder a step that
+# has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, "baseline", m001_baseline),
+    (2, "design_quiz", m002_design_quiz),
+    (3, "hot_path_indexes", m003_hot_path_indexes),
+    (4, "orders", m004_orders),
+    (5, "idempotency_keys", m005_idempotency_keys),
+    (6, "product_change_version", m006_product_change_version),
+    (7, "events", m007_events),
+    (8, "stock_ledger", m008_stock_ledger),
+    (9, "sales_rollups", m009_sales_rollups),
+    (10, "history_filters", m010_history_filters),
+    (11, "audit_logs_timestamp", m011_audit_logs_timestamp),
+    (12, "search", m012_search),
+    (13, "inventory_listing", m013_inventory_listing),
+    (14, "unique_product_names", m014_unique_product_names),
+    (15, "change_version_horizon", m015_change_version_horizon),
+    (16, "product_name_constraint", m016_product_name_constraint),
+    (17, "drop_unused_indexes", m017_drop_unused_indexes),
+]
+
+
+# -----------------------------
+# ENGINE
+# -----------------------------
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    c = conn.cursor()
+    try:
+        c.execute("SELECT MAX(version) FROM schema_version")
+        row = c.fetchone()
+    except Exception:
+        # No schema_version table yet (fresh or pre-migration database)
+        conn.rollback()
+        return 0
+
+    conn.rollback()
+    return row[0] or 0
+
+
+def _lock(c):
+    if is_postgres():
+        c.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    else:
+        c.execute("BEGIN IMMEDIATE")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+
+def migrate():
+    conn = connect()
+
+    try:
+        # Cheap path taken by every worker once the schema is current
+        current = current_version(conn)
+        if current >= latest_version():
+            return []
+
+        applied = []
+        c = conn.cursor()
+
+        for version, name, step in MIGRATIONS:
+            if version <= current:
+                continue
+
+            # Large backfills run first in short transactions of their
+            # own, so the step below only has a small remainder to lock
+            backfill = getattr(step, "backfill", None)
+            if backfill:
+                backfill(conn)
+
+            # Each step runs in its own transaction while holding the
+            # migration lock; re-check so that workers that waited on the
+            # lock skip what the winner already applied.
+            _lock(c)
+            c.execute(
+                "SELECT 1 FROM schema_version WHERE version = %s",
+                (version,)
+            )
+            if c.fetchone():
+                conn.rollback()
+                continue
+
+            try:
+                step(c)
+                c.execute("""
+                    INSERT INTO schema_version (version, name, applied_at)
+                    VALUES (%s, %s, %s)
+                """, (version, name, datetime.datetime.now().isoformat()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            applied.append(version)
+            migration_log.info("Applied migration %03d %s", version, name)
+
+        return applied
+    finally:
+        conn.close()
+
+
+def status():
+    conn = connect()
+    version = current_version(conn)
+    conn.close()
+
+    return {
+        "current": version,
+        "latest": latest_version(),
+        "pending": [
+            f"{v:03d} {name}" for v, name, _ in MIGRATIONS if v > version
+        ],
+    }
+
+
+if __name__ == "__main__":
+    applied = migrate()
+    info = status()
+    print(f"Schema version {info['current']} (latest {info['latest']}), "
+          f"applied {len(applied)} migration(s)")
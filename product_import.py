@@ -0,0 +1,336 @@
+"""
+Bulk product import from CSV or XLSX.
+
+The file is read as a stream and applied CHUNK rows at a time, each chunk
+in its own short transaction: one lookup of the names already in the
+catalogue, then one multi-row UPDATE for the products that exist and one
+multi-row INSERT for the ones that don't. On Postgres the chunk is first
+COPYed into a temporary staging table. Stock changes go to the ledger as
+"import" movements, and the whole import gets one summary audit entry.
+
+The header row names the columns: name, price and stock are required,
+material_type (or material) and category optional. Names are trimmed
+and lowercased, as /inventory/add stores them, and match existing
+products case-insensitively. A blank optional cell keeps the product's
+current value. Invalid rows are skipped and reported by their line
+number; the rest are imported.
+
+XLSX files need openpyxl.
+
+Usage:
+  python product_import.py catalogue.csv [username]
+"""
+
+import csv
+import datetime
+import io
+import itertools
+import sys
+
+from database import connect, begin_write, for_update, is_postgres, placeholders, values_rows
+from migrations import PRODUCT_NAME_KEY
+from audit import record as record_audit
+from events import publish, stock_payload
+from stock_ledger import record_movements
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_NAME_LENGTH = 200
+
+REQUIRED_COLUMNS = ("name", "price", "stock")
+COLUMN_ALIASES = {
+    "name": "name",
+    "product": "name",
+    "price": "price",
+    "stock": "stock",
+    "material_type": "material_type",
+    "material": "material_type",
+    "category": "category",
+}
+
+
+class ImportFileError(Exception):
+    """The file as a whole can't be imported (format, header)."""
+
+
+# -----------------------------
+# READING
+# -----------------------------
+def read_rows(stream, filename):
+    """Rows of the uploaded file as lists of strings, header first."""
+    if filename.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise ImportFileError("XLSX import needs openpyxl; upload a CSV instead")
+        return xlsx_rows(stream)
+    return csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+
+def xlsx_rows(stream):
+    # read_only streams the sheet instead of loading it whole
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield ["" if v is None else str(v) for v in values]
+    finally:
+        workbook.close()
+
+
+def parse_header(header):
+    columns = {}
+    for index, title in enumerate(header or []):
+        column = COLUMN_ALIASES.get(title.strip().lower())
+        if column and column not in columns:
+            columns[column] = index
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    return columns
+
+
+def parse_row(values, columns):
+    """
+    One data row to (name, material_type, category, price, stock).
+    Raises ValueError with a message for the error report.
+    """
+    def cell(column):
+        index = columns.get(column)
+        if index is None or index >= len(values):
+            return ""
+        return values[index].strip()
+
+    name = cell("name").lower()
+    if not name:
+        raise ValueError("Name is required")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError("Name is too long")
+
+    try:
+        price = float(cell("price"))
+    except ValueError:
+        raise ValueError(f"Invalid price: {cell('price')!r}")
+    if not price >= 0 or price == float("inf"):
+        raise ValueError(f"Invalid price: {cell('price')!r}")
+
+    try:
+        # Spreadsheets hand whole numbers over as "12.0"
+        stock = float(cell("stock"))
+        if stock != int(stock):
+            raise ValueError
+        stock = int(stock)
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid stock: {cell('stock')!r}")
+    if stock < 0:
+        raise ValueError("Stock can't be negative")
+
+    return name, cell("material_type") or None, cell("category") or None, price, stock
+
+
+# -----------------------------
+# WRITING
+# -----------------------------
+def staged(c, rows):
+    """
+    FROM-clause source for the chunk's rows, as (sql, params). Rows are
+    (id, name, material_type, category, price, stock); id is None for new
+    products.
+    """
+    if is_postgres():
+        c.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS product_import (
+                id INTEGER, name TEXT, material_type TEXT, category TEXT,
+                price REAL, stock INTEGER
+            ) ON COMMIT DELETE ROWS
+        """)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        c.copy_expert("COPY product_import FROM STDIN WITH (FORMAT csv)", buffer)
+        return "product_import", []
+
+    return f"""(
+        SELECT column1 AS id, column2 AS name, column3 AS material_type,
+               column4 AS category, column5 AS price, column6 AS stock
+        FROM (VALUES {values_rows(6, len(rows))}) AS v
+    )""", [v for row in rows for v in row]
+
+
+def apply_chunk(conn, chunk, username, summary):
+    """Validate and write one chunk of (line, values) in one transaction."""
+    rows, seen, columns = {}, summary["seen"], summary["columns"]
+    for line, values in chunk:
+        try:
+            name, material_type, category, price, stock = parse_row(values, columns)
+            if name in seen:
+                raise ValueError(f"Duplicate of line {seen[name]}")
+        except ValueError as e:
+            raw = values[columns["name"]] if columns["name"] < len(values) else ""
+            add_error(summary, line, raw.strip(), str(e))
+            continue
+        seen[name] = line
+        rows[name] = (line, material_type, category, price, stock)
+
+    if not rows:
+        return
+
+    c = conn.cursor()
+    begin_write(conn)
+
+    # Matched the way the unique name index compares names
+    names = list(rows)
+    c.execute(f"""
+        SELECT id, {PRODUCT_NAME_KEY}, material_type, category, price, stock
+        FROM products
+        WHERE is_deleted = 0 AND {PRODUCT_NAME_KEY} IN ({placeholders(len(names))})
+        {for_update()}
+    """, names)
+    existing = {row[1]: (row[0], *row[2:]) for row in c.fetchall()}
+
+    staging, old_stock = [], {}
+    for name, (line, material_type, category, price, stock) in rows.items():
+        current = existing.get(name)
+        if current is None:
+            staging.append((None, name, material_type, category, price, stock))
+            continue
+
+        pid, old_material, old_category, old_price, old = current
+        new = (material_type or old_material, category or old_category, price, stock)
+        if new == (old_material, old_category, old_price, old):
+            summary["unchanged"] += 1
+            continue
+        staging.append((pid, name, material_type, category, price, stock))
+        old_stock[pid] = old or 0
+
+    if not staging:
+        conn.commit()
+        return
+
+    source, params = staged(c, staging)
+    changed = []
+
+    if old_stock:
+        c.execute(f"""
+            UPDATE products
+            SET material_type = COALESCE(i.material_type, products.material_type),
+                category = COALESCE(i.category, products.category),
+                price = i.price,
+                stock = i.stock
+            FROM {source} AS i
+            WHERE products.id = i.id
+            RETURNING products.id, products.stock, products.is_deleted
+        """, params)
+        changed += c.fetchall()
+        summary["updated"] += len(old_stock)
+
+    if len(old_stock) < len(staging):
+        # Another writer may have just added one of these names
+        c.execute(f"""
+            INSERT INTO products (name, material_type, category, price, stock)
+            SELECT name, material_type, COALESCE(category, 'uncategorized'), price, stock
+            FROM {source} AS i
+            WHERE i.id IS NULL
+            ON CONFLICT DO NOTHING
+            RETURNING id, name, stock, is_deleted
+        """, params)
+        inserted = c.fetchall()
+        changed += [(pid, stock, is_deleted) for pid, _, stock, is_deleted in inserted]
+        summary["inserted"] += len(inserted)
+
+        added = {name for _, name, _, _ in inserted}
+        for pid, name, *_ in staging:
+            if pid is None and name not in added:
+                add_error(summary, rows[name][0], name, "Product name already exists")
+
+    now = datetime.datetime.now()
+    record_movements(c, [
+        (pid, (stock or 0) - old_stock.get(pid, 0), "import", None, None, username, now)
+        for pid, stock, _ in changed
+    ])
+    publish(c, "stock", stock_payload(sorted(changed)))
+
+    conn.commit()
+
+
+def add_error(summary, line, name, message):
+    summary["error_count"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append({"line": line, "name": name, "error": message})
+
+
+def import_products(conn, rows, username=None, source="upload"):
+    """
+    Import an iterable of rows (header first). Returns the summary:
+    rows, inserted, updated, unchanged, error_count and up to
+    MAX_REPORTED_ERRORS errors as {"line", "name", "error"}. Raises
+    ImportFileError if the file can't be read at all.
+    """
+    rows = iter(rows)
+    try:
+        columns = parse_header(next(rows, None))
+    except UnicodeDecodeError:
+        raise ImportFileError("File is not UTF-8 text")
+
+    summary = {
+        "columns": columns, "seen": {},
+        "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0,
+        "error_count": 0, "errors": [],
+    }
+
+    # Line numbers as a spreadsheet shows them: the header is line 1
+    numbered = ((line, values) for line, values in enumerate(rows, start=2) if any(values))
+    failure = None
+    try:
+        while True:
+            # Reading happens here, between transactions
+            chunk = list(itertools.islice(numbered, CHUNK))
+            if not chunk:
+                break
+            summary["rows"] += len(chunk)
+            apply_chunk(conn, chunk, username, summary)
+    except (UnicodeDecodeError, csv.Error) as e:
+        failure = ImportFileError(f"Unreadable file after {summary['rows']} rows: {e}")
+
+    # The chunks already committed get their audit entry even when the
+    # file turned out unreadable halfway
+    record_audit(
+        conn.cursor(), "IMPORT", source,
+        f"Rows:{summary['rows']} Inserted:{summary['inserted']} Updated:{summary['updated']} "
+        f"Unchanged:{summary['unchanged']} Errors:{summary['error_count']}",
+        username
+    )
+    conn.commit()
+
+    if failure:
+        raise failure
+
+    del summary["columns"], summary["seen"]
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+
+    path = sys.argv[1]
+    conn = connect()
+    with open(path, "rb") as f:
+        try:
+            result = import_products(conn, read_rows(f, path), sys.argv[2] if len(sys.argv) > 2 else None, path)
+        except ImportFileError as e:
+            print(f"IMPORT FAILED: {e}")
+            sys.exit(1)
+    conn.close()
+
+    for error in result["errors"]:
+        print(f"line {error['line']}: {error['error']} ({error['name']})")
+    print(
+        f"{result['rows']} rows: {result['inserted']} inserted, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {result['error_count']} errors"
+    )
@@ -0,0 +1,283 @@
+"""
+Daily sales rollups for the dashboard.
+
+sales_daily holds one row per day (net revenue, orders, items).
+sales_daily_product holds one row per day and product (qty, revenue).
+Checkout and voids apply signed deltas in their own transaction, so the
+dashboard never has to aggregate the sales table.
+
+Dashboard reads filter on the day key with plain `day >= ? AND day < ?`
+ranges, so they are index range scans at any history length. Weeks and
+months are bucketed in Python from the daily rows.
+
+Usage:
+  python rollups.py rebuild    # recompute both tables from orders/sales
+"""
+
+import datetime
+
+from database import connect, begin_write, placeholders, values_rows
+
+
+# -----------------------------
+# INCREMENTAL UPDATES
+# -----------------------------
+def day_of(value):
+    # sales.date / orders.created_at come back as datetimes on Postgres
+    # and as ISO strings on SQLite
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+class SalesDelta:
+    """
+    Accumulates signed changes to the rollups; apply() writes them with
+    one upsert per table.
+    """
+
+    def __init__(self):
+        self.daily = {}     # day -> [revenue, orders, items]
+        self.products = {}  # (day, product_name) -> [qty, revenue]
+
+    def order(self, day, sign=1):
+        self.daily.setdefault(day_of(day), [0, 0, 0])[1] += sign
+
+    def line(self, day, product_name, qty, total, sign=1):
+        day = day_of(day)
+        daily = self.daily.setdefault(day, [0, 0, 0])
+        daily[0] += sign * total
+        daily[2] += sign * qty
+
+        product = self.products.setdefault((day, product_name or ""), [0, 0])
+        product[0] += sign * qty
+        product[1] += sign * total
+
+    def apply(self, c):
+        # Sorted so concurrent writers touch the rows in the same order
+        if self.daily:
+            rows = sorted(self.daily.items())
+            c.execute(f"""
+                INSERT INTO sales_daily (day, revenue, orders, items)
+                VALUES {values_rows(4, len(rows))}
+                ON CONFLICT (day) DO UPDATE SET
+                    revenue = sales_daily.revenue + excluded.revenue,
+                    orders = sales_daily.orders + excluded.orders,
+                    items = sales_daily.items + excluded.items
+            """, [v for day, values in rows for v in (day, *values)])
+
+        if self.products:
+            rows = sorted(self.products.items())
+            c.execute(f"""
+                INSERT INTO sales_daily_product (day, product_name, qty, revenue)
+                VALUES {values_rows(4, len(rows))}
+                ON CONFLICT (day, product_name) DO UPDATE SET
+                    qty = sales_daily_product.qty + excluded.qty,
+                    revenue = sales_daily_product.revenue + excluded.revenue
+            """, [v for (day, name), values in rows for v in (day, name, *values)])
+
+        # Voids can take rows back to zero; drop them, as rebuild() would
+        voided_days = sorted({day for (day, _), (qty, _) in self.products.items() if qty < 0})
+        if voided_days:
+            c.execute(f"""
+                DELETE FROM sales_daily_product
+                WHERE qty = 0 AND day IN ({placeholders(len(voided_days))})
+            """, voided_days)
+
+        emptied_days = sorted(day for day, (_, orders, _) in self.daily.items() if orders < 0)
+        if emptied_days:
+            c.execute(f"""
+                DELETE FROM sales_daily
+                WHERE orders = 0 AND day IN ({placeholders(len(emptied_days))})
+            """, emptied_days)
+
+
+# -----------------------------
+# DASHBOARD QUERIES
+# -----------------------------
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366 * 20
+
+# Chart points sent to the browser; longer series are downsampled
+MAX_POINTS = 200
+
+
+def parse_range(from_value=None, to_value=None, granularity=None, today=None):
+    """
+    Dashboard filters to (start, end, granularity). `from` and `to` are
+    inclusive YYYY-MM-DD days; the returned end is exclusive. Defaults to
+    the last DEFAULT_RANGE_DAYS days by day. Raises ValueError.
+    """
+    today = today or datetime.date.today()
+
+    end = datetime.date.fromisoformat(to_value) if to_value else today
+    if from_value:
+        start = datetime.date.fromisoformat(from_value)
+    else:
+        start = end - datetime.timedelta(days=DEFAULT_RANGE_DAYS - 1)
+
+    granularity = granularity or "day"
+    if granularity not in GRANULARITIES:
+        raise ValueError("granularity")
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError("range")
+
+    return start, end + datetime.timedelta(days=1), granularity
+
+
+def bucket_of(day, granularity):
+    if granularity == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(bucket, granularity):
+    if granularity == "week":
+        return bucket + datetime.timedelta(days=7)
+    if granularity == "month":
+        return (bucket + datetime.timedelta(days=32)).replace(day=1)
+    return bucket + datetime.timedelta(days=1)
+
+
+def sales_series(c, start, end, granularity="day"):
+    """
+    Revenue, orders and items per bucket for [start, end), with empty
+    buckets filled in as zeros so the chart's time axis stays even.
+    """
+    c.execute("""
+        SELECT day, revenue, orders, items
+        FROM sales_daily
+        WHERE day >= %s AND day < %s
+        ORDER BY day
+    """, (start, end))
+
+    totals = {}
+    for day, revenue, orders, items in c.fetchall():
+        bucket = totals.setdefault(bucket_of(day_of(day), granularity), [0, 0, 0])
+        bucket[0] += revenue or 0
+        bucket[1] += orders or 0
+        bucket[2] += items or 0
+
+    series = []
+    bucket = bucket_of(start, granularity)
+    while bucket < end:
+        revenue, orders, items = totals.get(bucket, (0, 0, 0))
+        series.append({
+            "period": bucket.isoformat(),
+            "revenue": revenue,
+            "orders": orders,
+            "items": items,
+        })
+        bucket = next_bucket(bucket, granularity)
+
+    return series
+
+
+def top_products(c, start, end, limit=5):
+    c.execute("""
+        SELECT product_name, SUM(qty) AS total_sold
+        FROM sales_daily_product
+        WHERE day >= %s AND day < %s
+        GROUP BY product_name
+        HAVING SUM(qty) > 0
+        ORDER BY total_sold DESC
+        LIMIT %s
+    """, (start, end, limit))
+    return c.fetchall()
+
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indexes of
+    the points to keep: always the first and last, and from each bucket in
+    between the point that best preserves the shape of the line.
+    """
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+
+    keep = [0]
+    every = (count - 2) / (threshold - 2)
+    previous = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # Average of the next bucket is the triangle's third corner
+        following = range(end, min(int((i + 2) * every) + 1, count))
+        avg_x = sum(xs[j] for j in following) / len(following)
+        avg_y = sum(ys[j] for j in following) / len(following)
+
+        px, py = xs[previous], ys[previous]
+        best, best_area = start, -1
+        for j in range(start, end):
+            area = abs((px - avg_x) * (ys[j] - py) - (px - xs[j]) * (avg_y - py))
+            if area > best_area:
+                best, best_area = j, area
+
+        keep.append(best)
+        previous = best
+
+    keep.append(count - 1)
+    return keep
+
+
+def downsample(series, threshold=MAX_POINTS):
+    xs = [datetime.date.fromisoformat(p["period"]).toordinal() for p in series]
+    ys = [p["revenue"] for p in series]
+    return [series[i] for i in lttb(xs, ys, threshold)]
+
+
+# -----------------------------
+# REBUILD
+# -----------------------------
+def rebuild(c, since=None):
+    """
+    Recompute both rollups from orders and sales. Runs in the caller's
+    transaction, so readers see either the old or the new totals. Days
+    before `since` are left alone: their sales have been archived (see
+    archive.py) and can no longer be recounted.
+    """
+    since = since or datetime.date.min
+
+    c.execute("DELETE FROM sales_daily WHERE day >= %s", (since,))
+    c.execute("DELETE FROM sales_daily_product WHERE day >= %s", (since,))
+
+    c.execute("""
+        INSERT INTO sales_daily (day, revenue, orders, items)
+        SELECT DATE(created_at), SUM(total), COUNT(*), SUM(items)
+        FROM orders
+        WHERE voided = 0 AND created_at >= %s
+        GROUP BY DATE(created_at)
+    """, (since,))
+
+    c.execute("""
+        INSERT INTO sales_daily_product (day, product_name, qty, revenue)
+        SELECT DATE(date), COALESCE(product_name, ''), SUM(qty), SUM(total)
+        FROM sales
+        WHERE voided = 0 AND date >= %s
+        GROUP BY DATE(date), COALESCE(product_name, '')
+    """, (since,))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print(__doc__)
+        sys.exit(1)
+
+    from archive import archived_until
+
+    conn = connect()
+    begin_write(conn)
+    rebuild(conn.cursor(), since=archived_until("sales"))
+    conn.commit()
+    conn.close()
+    print("Rollups rebuilt")
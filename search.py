@@ -0,0 +1,129 @@
+"""
+Ranked full-text search over sales and audit log entries.
+
+The indexes are maintained by the database (see m012_search): FTS5
+tables kept in step by triggers on SQLite, a weighted tsvector column
+with a GIN index on Postgres. Product names weigh most, then the
+cashier/action, then free text (void reasons, details).
+
+Every word must match; the last one also matches as a prefix, so
+"acrylic key" finds "Acrylic Keychain". Results from the two tables are
+merged by score. Archived rows (archive.py) are not searched.
+"""
+
+import heapq
+import re
+
+from database import is_postgres
+from history import sale_entry, audit_entry
+from migrations import SEARCH_COLUMNS
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Deepest result reachable by paging; ranked results can't use a keyset
+MAX_RESULTS = 1000
+MAX_TERMS = 8
+
+
+def terms(text):
+    return re.findall(r"\w+", (text or "").lower())[:MAX_TERMS]
+
+
+def match_expression(words):
+    # Words are \w+ only, so quoting them is enough to make them literal
+    if is_postgres():
+        return " & ".join(words[:-1] + [words[-1] + ":*"])
+    return " ".join([f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def weights(table):
+    return ", ".join(str(weight) for _, _, weight in SEARCH_COLUMNS[table])
+
+
+# -----------------------------
+# SOURCES
+# -----------------------------
+def search_sales(c, expression, limit):
+    if is_postgres():
+        c.execute("""
+            SELECT id, date, product_name, voided, total, qty, username, order_id,
+                   ts_rank(search, query) AS score
+            FROM sales, to_tsquery('simple', %s) AS query
+            WHERE search @@ query AND date IS NOT NULL
+            ORDER BY score DESC, id DESC
+            LIMIT %s
+        """, (expression, limit))
+    else:
+        c.execute(f"""
+            SELECT s.id, s.date, s.product_name, s.voided, s.total, s.qty,
+                   s.username, s.order_id, -bm25(sales_fts, {weights("sales")}) AS score
+            FROM sales_fts
+            JOIN sales s ON s.id = sales_fts.rowid
+            WHERE sales_fts MATCH %s AND s.date IS NOT NULL
+            ORDER BY score DESC, s.id DESC
+            LIMIT %s
+        """, (expression, limit))
+
+    for *row, score in c.fetchall():
+        yield dict(sale_entry(*row), score=score)
+
+
+def search_audit_logs(c, expression, limit):
+    if is_postgres():
+        c.execute("""
+            SELECT id, created_at, action, product_name, details, username,
+                   ts_rank(search, query) AS score
+            FROM audit_logs, to_tsquery('simple', %s) AS query
+            WHERE search @@ query AND created_at IS NOT NULL
+            ORDER BY score DESC, id DESC
+            LIMIT %s
+        """, (expression, limit))
+    else:
+        c.execute(f"""
+            SELECT a.id, a.created_at, a.action, a.product_name, a.details,
+                   a.username, -bm25(audit_logs_fts, {weights("audit_logs")}) AS score
+            FROM audit_logs_fts
+            JOIN audit_logs a ON a.id = audit_logs_fts.rowid
+            WHERE audit_logs_fts MATCH %s AND a.created_at IS NOT NULL
+            ORDER BY score DESC, a.id DESC
+            LIMIT %s
+        """, (expression, limit))
+
+    for *row, score in c.fetchall():
+        yield dict(audit_entry(*row), score=score)
+
+
+# -----------------------------
+# SEARCH
+# -----------------------------
+def search(c, text, kind=None, page=1, limit=PAGE_SIZE):
+    """
+    One page of ranked matches as (rows, has_more). `kind` is SALE,
+    INVENTORY or None for both. Raises ValueError for a page beyond
+    MAX_RESULTS.
+    """
+    words = terms(text)
+    if not words:
+        return [], False
+
+    offset = (page - 1) * limit
+    if page < 1 or not 0 < limit <= MAX_PAGE_SIZE or offset + limit > MAX_RESULTS:
+        raise ValueError("page")
+
+    # Each source returns its best offset+limit+1; together they hold
+    # this page plus one row telling whether another follows
+    expression = match_expression(words)
+    wanted = offset + limit + 1
+    streams = []
+    if kind in (None, "SALE"):
+        streams.append(search_sales(c, expression, wanted))
+    if kind in (None, "INVENTORY"):
+        streams.append(search_audit_logs(c, expression, wanted))
+
+    ranked = list(heapq.merge(
+        *streams, key=lambda row: (row["score"], row["id"]), reverse=True
+    ))
+
+    return ranked[offset:offset + limit], len(ranked) > offset + limit
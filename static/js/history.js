@@ -1,5 +1,3 @@
-let activeTab = "SALE";
-
 /* ================= SWEETALERT HELPERS ================= */
 function alertSuccess(title, text = "") {
   return Swal.fire({
@@ -19,27 +17,6 @@ function alertError(title, text = "") {
   });
 }
 
-/* ================= TAB SWITCH ================= */
-function switchTab(type) {
-  activeTab = type;
-
-  document.querySelectorAll("tbody tr").forEach(row => {
-    row.style.display =
-      row.dataset.type === type ? "" : "none";
-  });
-
-  document.getElementById("tab-sales").className =
-    type === "SALE"
-      ? "px-4 py-2 rounded bg-blue-600"
-      : "px-4 py-2 rounded bg-gray-700";
-
-  document.getElementById("tab-inventory").className =
-    type === "INVENTORY"
-      ? "px-4 py-2 rounded bg-blue-600"
-      : "px-4 py-2 rounded bg-gray-700";
-}
-
-
 /* ================= VOID SALE ================= */
 async function voidSale(button) {
   const saleId = button.dataset.saleId;
@@ -80,7 +57,8 @@ function showDetailsFromButton(btn) {
     qty: btn.dataset.qty,
     amount: btn.dataset.amount,
     user: btn.dataset.user,
-    status: btn.dataset.status
+    status: btn.dataset.status,
+    order: btn.dataset.order
   };
 
   Swal.fire({
@@ -88,6 +66,7 @@ function showDetailsFromButton(btn) {
     html: `
       <div class="text-left space-y-2">
         <div><b>Record ID:</b> ${data.id}</div>
+        <div><b>Order #:</b> ${data.order}</div>
         <div><b>Time:</b> ${data.time}</div>
         <div><b>Type:</b> ${data.type}</div>
         <div><b>Event:</b> ${data.event}</div>
@@ -104,7 +83,22 @@ function showDetailsFromButton(btn) {
 }
 
 
-/* ================= INIT ================= */
-document.addEventListener("DOMContentLoaded", () => {
-  switchTab("SALE");
+/* ================= LIVE UPDATES ================= */
+function notifyNewActivity() {
+  Swal.fire({
+    toast: true,
+    position: "bottom-end",
+    icon: "info",
+    title: "New sales activity",
+    showConfirmButton: true,
+    confirmButtonText: "Refresh"
+  }).then(result => {
+    if (result.isConfirmed) location.reload();
+  });
+}
+
+subscribeLive({
+  sale: notifyNewActivity,
+  void: notifyNewActivity
 });
+
@@ -113,6 +113,48 @@ form.addEventListener("submit", async e => {
   }
 });
 
+  /* ================= IMPORT ================= */
+  const importFile = document.getElementById("importFile");
+
+  document.getElementById("importBtn").addEventListener("click", () => importFile.click());
+
+  importFile.addEventListener("change", async () => {
+    if (!importFile.files.length) return;
+
+    const body = new FormData();
+    body.append("file", importFile.files[0]);
+    importFile.value = "";
+
+    Swal.fire({ title: "Importing...", didOpen: () => Swal.showLoading() });
+
+    try {
+      const res = await fetch("/inventory/import", { method: "POST", body });
+      const result = await res.json();
+
+      if (result.status !== "success") {
+        alertError("Import failed", result.error || result.message || "");
+        return;
+      }
+
+      const lines = result.errors
+        .map(e => `Line ${e.line}: ${e.error}${e.name ? ` (${e.name})` : ""}`)
+        .join("\n");
+
+      await Swal.fire({
+        icon: result.error_count ? "warning" : "success",
+        title: "Import finished",
+        text:
+          `${result.inserted} added, ${result.updated} updated, ` +
+          `${result.unchanged} unchanged, ${result.error_count} skipped` +
+          (lines ? `\n\n${lines}` : "")
+      });
+      location.reload();
+    } catch (err) {
+      console.error(err);
+      alertError("Import failed", "Server error");
+    }
+  });
+
   /* ================= DELETE ITEM ================= */
   document.addEventListener("click", async (e) => {
     const btn = e.target.closest(".delete-btn");
@@ -155,22 +197,17 @@ form.addEventListener("submit", async e => {
  });
 
  /* ================= INVENTORY FILTER ================= */
+// Search, material, category and sort are applied by the server; the
+// low-stock toggle only filters the rows on this page
 function filterInventory() {
-  const search = document.getElementById("inventorySearch").value.toLowerCase();
-  const category = document.getElementById("categoryFilter").value.toLowerCase();
   const lowStockOnly = document.getElementById("lowStockFilter").checked;
 
   document.querySelectorAll(".inventory-row").forEach(row => {
-    const name = row.dataset.name || "";
-    const cat = row.dataset.category || "";
     const stock = parseInt(row.dataset.stock || "0", 10);
 
     const lowStockLevel = window.APP_SETTINGS?.lowStockLevel ?? 5;
 
-    const visible =
-      (name.includes(search) || cat.includes(search)) &&
-      (!category || cat === category) &&
-      (!lowStockOnly || stock <= lowStockLevel);
+    const visible = !lowStockOnly || stock <= lowStockLevel;
 
     row.style.display = visible ? "" : "none";
 
@@ -180,9 +217,25 @@ function filterInventory() {
   });
 }
 
-function resetInventoryFilters() {
-  document.getElementById("inventorySearch").value = "";
-  document.getElementById("categoryFilter").value = "";
-  document.getElementById("lowStockFilter").checked = false;
-  filterInventory();
+/* ================= LIVE STOCK ================= */
+function stockBadge(stock) {
+  const color =
+    stock <= 5 ? "text-red-400 font-semibold" :
+    stock <= 15 ? "text-yellow-400" :
+    "text-green-400";
+  return `<span class="${color}">${stock}</span>`;
 }
+
+subscribeLive({
+  stock: data => data.products.forEach(p => {
+    const row = document.getElementById(`inventory-row-${p.id}`);
+    if (!row) return;
+
+    if (p.deleted) {
+      row.remove();
+      return;
+    }
+
+    row.querySelector("[data-stock-cell]").innerHTML = stockBadge(p.stock);
+  })
+});
@@ -0,0 +1,17 @@
+"use strict";
+
+/* ===================== LIVE UPDATES ===================== */
+/* Server-sent events from /api/events ("stock", "sale", "void").
+   The browser reconnects on its own and catches up via Last-Event-ID.
+   Returns the EventSource, or null where it isn't supported. */
+function subscribeLive(handlers) {
+  if (!window.EventSource) return null;
+
+  const source = new EventSource("/api/events");
+
+  Object.entries(handlers).forEach(([kind, handler]) => {
+    source.addEventListener(kind, e => handler(JSON.parse(e.data)));
+  });
+
+  return source;
+}
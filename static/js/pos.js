@@ -13,7 +13,7 @@ const searchInput = document.getElementById("productSearch");
 /* ===================== RECEIPT TEMPLATE ===================== */
 const RECEIPT_TEMPLATES = {
 
-  compact: (items, total, cash) => {
+  compact: (items, total, cash, orderId) => {
     const change = cash - total;
     const date = new Date().toLocaleString();
 
@@ -23,7 +23,8 @@ const RECEIPT_TEMPLATES = {
     <strong style="font-size:16px;">AE LaserCraft</strong><br/>
     Custom Laser Engraving<br/>
     ------------------------------<br/>
-    ${date}
+    ${date}<br/>
+    Order #: ${orderId}
   </div>
 
   <hr/>
@@ -58,10 +59,9 @@ const RECEIPT_TEMPLATES = {
 `;
   },
 
-  detailed: (items, total, cash) => {
+  detailed: (items, total, cash, orderId) => {
     const change = cash - total;
     const date = new Date().toLocaleString();
-    const receiptNo = Math.floor(Math.random() * 1000000);
 
     return `
 <div style="font-family: Arial, sans-serif; font-size: 13px; width: 380px; padding: 10px">
@@ -75,7 +75,7 @@ const RECEIPT_TEMPLATES = {
   <hr/>
 
   <div style="font-size:11px">
-    Receipt #: ${receiptNo}<br/>
+    Receipt #: ${orderId}<br/>
     Date: ${date}
   </div>
 
@@ -185,6 +185,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   }
 
   await refreshStockFromServer();
+  syncOfflineQueue();
 });
 
 /* ===================== PRODUCT BUTTONS ===================== */
@@ -287,12 +288,133 @@ function updateChange() {
 searchInput.addEventListener("input", () => {
   const query = searchInput.value.toLowerCase();
   document.querySelectorAll(".product-btn").forEach(btn => {
-    btn.style.display = btn.dataset.name.toLowerCase().includes(query)
+    const match = btn.dataset.name.toLowerCase().includes(query);
+    btn.style.display = match && !btn.dataset.deleted
       ? "block"
       : "none";
   });
 });
 
+/* ===================== CHECKOUT REQUEST ===================== */
+const CHECKOUT_TIMEOUT_MS = 8000;
+const CHECKOUT_RETRIES = 3;
+
+function newRequestKey() {
+  if (window.crypto?.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+/* Retries reuse the same key, so the server applies the cart at most once */
+async function postCheckout(payload, requestKey) {
+  for (let attempt = 0; ; attempt++) {
+    if (!navigator.onLine) throw new Error("Offline");
+
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), CHECKOUT_TIMEOUT_MS);
+
+    try {
+      const res = await fetch("/sales/checkout", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "Idempotency-Key": requestKey
+        },
+        body: JSON.stringify(payload),
+        signal: controller.signal
+      });
+
+      if (res.status < 500 || attempt >= CHECKOUT_RETRIES) {
+        return await res.json();
+      }
+    } catch (err) {
+      if (attempt >= CHECKOUT_RETRIES) throw err;
+    } finally {
+      clearTimeout(timer);
+    }
+
+    await new Promise(r => setTimeout(r, 500 * 2 ** attempt));
+  }
+}
+
+/* ===================== OFFLINE QUEUE ===================== */
+/* Carts that could not reach the server are kept in localStorage with
+   their request key and synced through /sales/checkout/bulk. */
+const OFFLINE_QUEUE_KEY = "pos_offline_queue";
+const OFFLINE_BATCH_SIZE = 200;
+const OFFLINE_SYNC_MS = 30000;
+let syncingQueue = false;
+
+function loadOfflineQueue() {
+  try {
+    return JSON.parse(localStorage.getItem(OFFLINE_QUEUE_KEY)) || [];
+  } catch {
+    return [];
+  }
+}
+
+function saveOfflineQueue(queue) {
+  localStorage.setItem(OFFLINE_QUEUE_KEY, JSON.stringify(queue));
+}
+
+function queueOfflineOrder(order) {
+  const queue = loadOfflineQueue();
+  queue.push(order);
+  saveOfflineQueue(queue);
+}
+
+async function syncOfflineQueue() {
+  if (syncingQueue || !navigator.onLine) return;
+
+  let queue = loadOfflineQueue();
+  if (queue.length === 0) return;
+
+  syncingQueue = true;
+  const failed = [];
+
+  try {
+    while (queue.length > 0) {
+      const batch = queue.slice(0, OFFLINE_BATCH_SIZE);
+
+      const res = await fetch("/sales/checkout/bulk", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          orders: batch.map(o => ({ key: o.key, cart: o.cart, sold_at: o.sold_at }))
+        })
+      });
+      if (!res.ok) break;
+
+      const { results } = await res.json();
+      results
+        .filter(r => r.status !== "success")
+        .forEach(r => failed.push(r));
+
+      // Every order in the batch got a final answer; drop them
+      queue = loadOfflineQueue().slice(batch.length);
+      saveOfflineQueue(queue);
+    }
+  } catch (err) {
+    console.error("Offline sync failed", err);
+  } finally {
+    syncingQueue = false;
+  }
+
+  if (failed.length > 0) {
+    Swal.fire({
+      icon: "warning",
+      title: "Some offline sales were rejected",
+      html: failed
+        .map(r => `<div>${r.error}${r.items ? ": " + r.items.map(i => i.name).join(", ") : ""}</div>`)
+        .join("")
+    });
+  }
+
+  await refreshStockFromServer();
+}
+
+window.addEventListener("online", syncOfflineQueue);
+setInterval(syncOfflineQueue, OFFLINE_SYNC_MS);
+
 /* ===================== CHECKOUT ===================== */
 async function checkoutCart() {
   if (cart.length === 0) {
@@ -332,17 +454,13 @@ async function checkoutCart() {
     didOpen: () => Swal.showLoading()
   });
 
-  try {
-    const res = await fetch("/sales/checkout", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ cart })
-    });
+  const requestKey = newRequestKey();
 
-    const result = await res.json();
+  try {
+    const result = await postCheckout({ cart }, requestKey);
 
     if (result.status === "success") {
-      buildReceipt(total, cash);
+      buildReceipt(total, cash, result.order_id);
 
       if (window.APP_SETTINGS?.autoPrintReceipt) {
         printReceipt();
@@ -360,44 +478,102 @@ async function checkoutCart() {
       Swal.fire("Checkout Failed", result.error || "", "error");
     }
   } catch (err) {
+    /* Server unreachable: keep the sale and sync it later */
     console.error(err);
-    Swal.fire("Server Error", "Check backend logs", "error");
+    queueOfflineOrder({
+      key: requestKey,
+      cart,
+      sold_at: new Date().toISOString()
+    });
+
+    buildReceipt(total, cash, `OFFLINE-${requestKey.slice(0, 8)}`);
+
+    if (window.APP_SETTINGS?.autoPrintReceipt) {
+      printReceipt();
+    }
+
+    cart = [];
+    cashInput.value = "";
+    renderCart();
+
+    Swal.fire({
+      icon: "info",
+      title: "Saved Offline",
+      text: `${loadOfflineQueue().length} sale(s) will sync when the connection is back`,
+      timer: 1800,
+      showConfirmButton: false
+    });
   }
 }
 
 /* ===================== STOCK REFRESH ===================== */
-async function refreshStockFromServer() {
-  try {
-    const res = await fetch("/api/products/stock");
-    const data = await res.json();
+/* Stock changes are pushed over /api/events. Polling by change version
+   (unchanged catalogue = 304) only runs while the live stream is down. */
+const STOCK_POLL_MS = 15000;
+let stockVersion = null;
+
+function applyStock(products) {
+  products.forEach(p => {
+    const btn = document.getElementById(`product-btn-${p.id}`);
+    const label = document.getElementById(`stock-label-${p.id}`);
+    if (!btn || !label) return;
+
+    if (p.deleted) {
+      btn.dataset.deleted = "1";
+      btn.disabled = true;
+      btn.style.display = "none";
+      return;
+    }
 
-    data.forEach(p => {
-      const btn = document.getElementById(`product-btn-${p.id}`);
-      const label = document.getElementById(`stock-label-${p.id}`);
-      if (!btn || !label) return;
+    btn.dataset.stock = p.stock;
+    label.innerText = `Stock: ${p.stock}`;
 
-      btn.dataset.stock = p.stock;
-      label.innerText = `Stock: ${p.stock}`;
+    const out = p.stock <= 0;
+    btn.disabled = out;
+    btn.classList.toggle("opacity-50", out);
+    btn.classList.toggle("cursor-not-allowed", out);
+  });
+}
 
-      if (p.stock <= 0) {
-        btn.disabled = true;
-        btn.classList.add("opacity-50", "cursor-not-allowed");
-      }
-    });
+async function refreshStockFromServer() {
+  try {
+    const url = stockVersion === null
+      ? "/api/products/stock"
+      : `/api/products/stock?since=${stockVersion}`;
+    const res = await fetch(url);
+    if (!res.ok) return;
+
+    const data = await res.json();
+    stockVersion = data.version;
+    applyStock(data.products);
   } catch (err) {
     console.error("Stock refresh failed", err);
   }
 }
 
+const liveStock = subscribeLive({
+  stock: data => applyStock(data.products)
+});
+
+/* Catch up on anything missed while disconnected */
+liveStock?.addEventListener("open", refreshStockFromServer);
+
+setInterval(() => {
+  if (!liveStock || liveStock.readyState !== EventSource.OPEN) {
+    refreshStockFromServer();
+  }
+}, STOCK_POLL_MS);
+
 /* ===================== RECEIPT ===================== */
-function buildReceipt(total, cash) {
+function buildReceipt(total, cash, orderId) {
   const template =
     window.APP_SETTINGS?.receiptTemplate || "compact";
 
   const html = RECEIPT_TEMPLATES[template](
     cart,
     total,
-    cash
+    cash,
+    orderId
   );
 
   const receipt = document.getElementById("receipt");
@@ -0,0 +1,195 @@
+"""
+Append-only stock movement ledger.
+
+Every change to products.stock appends a row to stock_movements in the
+same transaction: sale, void, edit, import, or adjust. Adjust rows are
+written by compaction when the stock column has drifted from the ledger.
+products.stock stays the materialized current value that checkout locks
+and guards against.
+
+compact() periodically snapshots the products that moved since their last
+snapshot. "Stock as of X" is then the latest snapshot before X plus the
+movements after it, instead of a replay of all of history.
+
+Usage:
+  python stock_ledger.py compact
+  python stock_ledger.py as-of 2026-01-31
+"""
+
+import datetime
+import sys
+
+from database import connect, begin_write, is_postgres, values_rows
+
+
+MOVEMENT_REASONS = ("sale", "void", "edit", "import", "adjust")
+
+# Movement/snapshot rows per multi-row INSERT
+INSERT_CHUNK = 500
+
+
+# -----------------------------
+# RECORDING
+# -----------------------------
+def record_movements(c, rows):
+    """
+    Append ledger rows in the caller's transaction. Each row is
+    (product_id, delta, reason, order_id, sale_id, username, created_at).
+    """
+    rows = [row for row in rows if row[1]]
+
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        c.execute(f"""
+            INSERT INTO stock_movements
+                (product_id, delta, reason, order_id, sale_id, username, created_at)
+            VALUES {values_rows(7, len(chunk))}
+        """, [v for row in chunk for v in row])
+
+
+# -----------------------------
+# COMPACTION
+# -----------------------------
+def compact(conn):
+    """
+    Snapshot every product whose ledger moved since its last snapshot.
+    Where products.stock no longer matches the ledger (e.g. a hand edit in
+    the database), an "adjust" movement is appended first so the two agree
+    again. Returns (snapshots_taken, adjusted_product_ids).
+    """
+    c = conn.cursor()
+    begin_write(conn)
+
+    # Block new movements (reads still run) so the snapshot boundary is
+    # exact; SQLite's write lock already does this.
+    if is_postgres():
+        c.execute("LOCK TABLE stock_movements IN EXCLUSIVE MODE")
+
+    now = datetime.datetime.now()
+
+    c.execute("""
+        SELECT
+            p.id,
+            p.stock,
+            COALESCE(s.stock, 0) + COALESCE(SUM(m.delta), 0) AS ledger
+        FROM products p
+        LEFT JOIN stock_snapshots s ON s.id = (
+            SELECT id FROM stock_snapshots
+            WHERE product_id = p.id
+            ORDER BY movement_id DESC, id DESC
+            LIMIT 1
+        )
+        LEFT JOIN stock_movements m
+            ON m.product_id = p.id AND m.id > COALESCE(s.movement_id, 0)
+        GROUP BY p.id, p.stock, s.stock, s.id
+        HAVING COUNT(m.id) > 0 OR COALESCE(s.stock, 0) != COALESCE(p.stock, 0)
+    """)
+    moved = c.fetchall()
+
+    adjusted = [
+        (pid, (stock or 0) - ledger, "adjust", None, None, None, now)
+        for pid, stock, ledger in moved
+        if (stock or 0) != ledger
+    ]
+    record_movements(c, adjusted)
+
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements")
+    last_movement = c.fetchone()[0]
+
+    snapshots = [(pid, stock or 0, last_movement, now) for pid, stock, _ in moved]
+    for start in range(0, len(snapshots), INSERT_CHUNK):
+        chunk = snapshots[start:start + INSERT_CHUNK]
+        c.execute(f"""
+            INSERT INTO stock_snapshots (product_id, stock, movement_id, taken_at)
+            VALUES {values_rows(4, len(chunk))}
+        """, [v for row in chunk for v in row])
+
+    conn.commit()
+    return len(snapshots), [row[0] for row in adjusted]
+
+
+# -----------------------------
+# STOCK AS OF
+# -----------------------------
+def ledger_start(c):
+    # Opening snapshots, or the first movement on a database that had no
+    # products when the ledger was added
+    c.execute("""
+        SELECT MIN(t) FROM (
+            SELECT MIN(taken_at) AS t FROM stock_snapshots
+            UNION ALL
+            SELECT MIN(created_at) FROM stock_movements
+        ) AS starts
+    """)
+    return c.fetchone()[0]
+
+
+def stock_as_of(c, before):
+    """
+    Stock of every product that existed before `before` (exclusive), as
+    rows of (id, name, stock, is_deleted). Returns None when `before` is
+    not after the start of the ledger.
+    """
+    start = ledger_start(c)
+    if isinstance(start, str):
+        start = datetime.datetime.fromisoformat(start)
+    if start is None or before <= start:
+        return None
+
+    c.execute("""
+        SELECT
+            p.id,
+            p.name,
+            COALESCE(s.stock, 0) + COALESCE(SUM(m.delta), 0) AS stock,
+            p.is_deleted
+        FROM products p
+        LEFT JOIN stock_snapshots s ON s.id = (
+            SELECT id FROM stock_snapshots
+            WHERE product_id = p.id AND taken_at < %s
+            ORDER BY taken_at DESC, id DESC
+            LIMIT 1
+        )
+        LEFT JOIN stock_movements m
+            ON m.product_id = p.id
+            AND m.id > COALESCE(s.movement_id, 0)
+            AND m.created_at < %s
+        GROUP BY p.id, p.name, p.is_deleted, s.stock, s.id
+        HAVING s.id IS NOT NULL OR COUNT(m.id) > 0
+        ORDER BY p.id
+    """, (before, before))
+
+    return c.fetchall()
+
+
+def parse_as_of(value):
+    """
+    "YYYY-MM-DD" means the end of that day; a full timestamp is taken as
+    is. Returns the exclusive upper bound.
+    """
+    at = datetime.datetime.fromisoformat(value)
+    if len(value) == 10:
+        at += datetime.timedelta(days=1)
+    return at
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("compact", "as-of"):
+        print(__doc__)
+        sys.exit(1)
+
+    conn = connect()
+
+    if sys.argv[1] == "compact":
+        taken, adjusted = compact(conn)
+        print(f"Snapshots taken: {taken}")
+        if adjusted:
+            print(f"Adjusted drifted products: {adjusted}")
+    else:
+        rows = stock_as_of(conn.cursor(), parse_as_of(sys.argv[2]))
+        if rows is None:
+            print("No stock history that far back")
+            sys.exit(1)
+        for pid, name, stock, deleted in rows:
+            print(f"{pid:>6}  {stock:>8}  {name}{' (deleted)' if deleted else ''}")
+
+    conn.close()
@@ -0,0 +1,76 @@
+import audit
+import database
+
+
+def test_entries_commit_and_roll_back_with_the_change(app, fetch):
+    conn = database.connect()
+    c = conn.cursor()
+    audit.record(c, "EDIT", "mug", mode="transaction")
+    conn.rollback()
+    audit.record(c, "DELETE", "mug", mode="transaction")
+    conn.commit()
+    conn.close()
+
+    assert fetch("SELECT action FROM audit_logs") == [("DELETE",)]
+
+
+def test_async_entries_are_batched_and_flushed(login_admin, monkeypatch, fetch):
+    monkeypatch.setattr(audit, "AUDIT_MODE", "async")
+
+    login_admin.post("/inventory/add", json={"name": "mug", "price": 10, "stock": 1})
+    for i in range(1200):
+        audit.record(None, "IMPORT", f"item {i}")
+
+    audit.writer.flush()
+
+    assert fetch("SELECT action, username FROM audit_logs WHERE action = 'ADD'") == [("ADD", "admin")]
+    assert fetch("SELECT COUNT(*) FROM audit_logs WHERE action = 'IMPORT'") == [(1200,)]
+
+
+def test_close_writes_what_is_still_queued(app, monkeypatch, fetch):
+    monkeypatch.setattr(audit, "FLUSH_SECONDS", 30)
+
+    audit.record(None, "EDIT", "mug", mode="async")
+    audit.writer.close()
+
+    assert not audit.writer.thread.is_alive()
+    assert fetch("SELECT action FROM audit_logs") == [("EDIT",)]
+
+
+def test_sync_entries_wait_for_the_request_to_commit(app, monkeypatch, fetch):
+    monkeypatch.setattr(audit, "AUDIT_MODE", "sync")
+
+    with app.test_request_context():
+        conn = database.connect()
+        c = conn.cursor()
+        database.begin_write(conn)
+        assert conn.in_transaction
+        c.execute("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)", ("mug", 10, 1))
+        audit.record(c, "ADD", "mug")
+        conn.rollback()
+
+        database.begin_write(conn)
+        c.execute("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)", ("cup", 10, 1))
+        audit.record(c, "ADD", "cup")
+        assert fetch("SELECT COUNT(*) FROM audit_logs") == [(0,)]
+        conn.commit()
+
+    assert fetch("SELECT name FROM products") == [("cup",)]
+    assert fetch("SELECT product_name FROM audit_logs") == [("cup",)]
+
+
+def test_async_entries_are_queued_only_after_commit(app, fetch):
+    with app.test_request_context():
+        conn = database.connect()
+        c = conn.cursor()
+        database.begin_write(conn)
+        c.execute("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)", ("mug", 10, 1))
+        audit.record_many(c, [("ADD", "mug", ""), ("EDIT", "mug", "")], mode="async")
+        conn.rollback()
+
+        database.begin_write(conn)
+        audit.record_many(c, [("DELETE", "cup", "")], mode="async")
+        conn.commit()
+
+    audit.writer.flush()
+    assert fetch("SELECT action FROM audit_logs") == [("DELETE",)]
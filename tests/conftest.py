@@ -4,10 +4,19 @@ import sqlite3
 import pytest
 import tempfile
 from werkzeug.security import generate_password_hash
+from flask_login.utils import _create_identifier
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+# Run against a throwaway SQLite file unless a database URL is exported
+# explicitly (app import already runs migrations)
+os.environ.setdefault("DATABASE_URL", "")
+
+fd, TEST_DB_PATH = tempfile.mkstemp(suffix=".db")
+os.close(fd)
+os.environ["SQLITE_PATH"] = TEST_DB_PATH
+
 import database
 from app import app as flask_app
 
@@ -18,9 +27,7 @@ from app import app as flask_app
 
 @pytest.fixture(scope="session")
 def test_db_path():
-    fd, path = tempfile.mkstemp(suffix=".db")
-    os.close(fd)
-    return path
+    return TEST_DB_PATH
 
 
 # ----------------------------
@@ -28,28 +35,36 @@ def test_db_path():
 # ----------------------------
 
 @pytest.fixture
-def app(test_db_path, monkeypatch):
+def app(test_db_path, monkeypatch, tmp_path):
 
-    def test_connect():
-        conn = sqlite3.connect(test_db_path, timeout=30, check_same_thread=False)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        return conn
+    # Point the connection pool at the test DB
+    monkeypatch.setattr(database, "SQLITE_PATH", test_db_path)
+    database.close_pool()
 
-    # Override database.connect to use test DB
-    monkeypatch.setattr(database, "connect", test_connect)
+    # Slow statements go to a per-test file, not data/slow_queries.log
+    monkeypatch.setattr(database, "SLOW_QUERY_LOG", str(tmp_path / "slow_queries.log"))
+    monkeypatch.setattr(database.slow_query_log, "handlers", [])
+    database._setup_slow_query_log()
 
     flask_app.config.update({
         "TESTING": True,
-        "SECRET_KEY": "test-secret"
+        "SECRET_KEY": "test-secret",
+        # Fail any request that repeats one statement more than this
+        "DB_N_PLUS_ONE_LIMIT": 5
     })
 
     # Recreate tables cleanly (avoid SQLite WAL stale rows)
     conn = database.connect()
+    conn.execute("PRAGMA journal_mode=WAL;")
     c = conn.cursor()
 
     tables = [
         "users", "products", "sales", "gallery",
-        "designs", "laser_settings", "orders", "audit_logs"
+        "designs", "laser_settings", "orders", "audit_logs",
+        "gallery_designs", "design_tags", "design_quiz_sessions",
+        "design_quiz_answers", "idempotency_keys", "change_versions", "events",
+        "stock_movements", "stock_snapshots", "sales_daily", "sales_daily_product",
+        "audit_logs_fts", "sales_fts", "products_fts", "schema_version"
     ]
 
     for t in tables:
@@ -64,6 +79,8 @@ def app(test_db_path, monkeypatch):
 
     yield flask_app
 
+    database.close_pool()
+
 
 @pytest.fixture
 def client(app):
@@ -129,10 +146,16 @@ def force_login(client, username):
 
     conn.close()
 
+    # Session protection is "strong": the session must carry the same
+    # identifier flask_login derives from the client's address/user agent
+    with flask_app.test_request_context(environ_base=client.environ_base):
+        identifier = _create_identifier()
+
     with client.session_transaction() as sess:
         sess.clear()
         sess["_user_id"] = str(user_id)
         sess["_fresh"] = True
+        sess["_id"] = identifier
 
 
 
@@ -157,3 +180,47 @@ def login_user(client, normal_user):
 
 
 
+
+
+@pytest.fixture
+def login_as(app):
+    # A separate logged-in client per call, e.g. one per POS terminal
+    def login(username):
+        client = app.test_client()
+        force_login(client, username)
+        return client
+    return login
+
+
+# ----------------------------
+# DB Helper Fixtures
+# ----------------------------
+
+@pytest.fixture
+def fetch(app):
+    # fetch(sql, params) -> every row of one query on the test DB
+    def fetch(sql, params=()):
+        conn = database.connect()
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    return fetch
+
+
+@pytest.fixture
+def add_product(app):
+    # add_product(name, price, stock) -> id, inserted straight into the DB
+    def add_product(name, price, stock):
+        conn = database.connect()
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)",
+            (name, price, stock)
+        )
+        conn.commit()
+        product_id = c.lastrowid
+        conn.close()
+        return product_id
+    return add_product
@@ -0,0 +1,67 @@
+import logging
+
+import database
+
+
+def seed_designs(n):
+    conn = database.connect()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO gallery_designs (gallery_id, name, image) VALUES (%s, %s, %s)",
+        [(1, f"design {i}", "/static/x.png") for i in range(n)]
+    )
+    c.execute("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)", ("mug", 50, 100))
+    conn.commit()
+    conn.close()
+
+
+def test_server_timing_header(client):
+    res = client.get("/api/featured-designs")
+
+    assert res.headers["Server-Timing"].startswith("db;dur=")
+    assert 'desc="1 queries"' in res.headers["Server-Timing"]
+
+
+def test_slow_queries_are_logged(client, monkeypatch, caplog):
+    monkeypatch.setattr(database, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="ae_lasercraft.slow_queries"):
+        client.get("/gallery/7/designs")
+
+    assert "/gallery/7/designs" in caplog.text
+    assert "WHERE gallery_id = ? ORDER BY id DESC" in caplog.text
+
+
+def test_normalize_sql():
+    sql = "SELECT * FROM t WHERE a = %s AND b IN (%s, %s) AND c = 'x' LIMIT 10"
+
+    assert database.normalize_sql(sql) == "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? LIMIT ?"
+
+
+def test_quiz_results_without_n_plus_one(client):
+    seed_designs(10)
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO design_tags (design_id, tag_type, tag_value) VALUES (%s, %s, %s)",
+        (10, "style", "Modern, Rustic")
+    )
+    conn.commit()
+    conn.close()
+
+    session_id = client.post("/api/design-quiz/submit", json={"style": "rustic"}).get_json()["session_id"]
+    res = client.get(f"/design-quiz/results/{session_id}")
+
+    assert res.status_code == 200
+    # The only matching design ranks first
+    html = res.get_data(as_text=True)
+    assert html.index("design 9") < html.index("design 0")
+
+
+def test_checkout_without_n_plus_one(login_admin):
+    seed_designs(0)
+    cart = [{"id": 1, "name": "mug", "qty": 1, "price": 50}] * 10
+
+    res = login_admin.post("/sales/checkout", json={"cart": cart})
+
+    assert res.status_code == 200
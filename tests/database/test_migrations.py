@@ -0,0 +1,97 @@
+import database
+import migrations
+
+
+def test_schema_is_current_after_setup(app):
+    assert migrations.status()["pending"] == []
+    assert database.setup() == []
+
+
+def test_unused_indexes_are_dropped(app):
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    indexes = {row[0] for row in c.fetchall()}
+    conn.close()
+
+    assert indexes.isdisjoint(migrations.UNUSED_INDEXES)
+    assert {"idx_products_active_name_id", "idx_products_active_name_unique"} <= indexes
+
+
+def test_legacy_database_is_upgraded(app):
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("DROP TABLE products")
+    c.execute("DROP TABLE schema_version")
+    c.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT UNIQUE, price REAL, stock INTEGER)")
+    conn.commit()
+    conn.close()
+
+    applied = database.setup()
+
+    assert applied == [v for v, _, _ in migrations.MIGRATIONS]
+
+    conn = database.connect()
+    c = conn.cursor()
+    assert migrations.column_exists(c, "products", "is_deleted")
+    assert migrations.column_exists(c, "gallery_designs", "is_featured")
+    # Only active names are unique once the old column constraint is gone
+    c.executemany("INSERT INTO products (name, is_deleted) VALUES (%s, %s)", [("lamp", 1), ("lamp", 0)])
+    conn.close()
+
+
+def test_design_quiz_tables_exist(client):
+    res = client.post("/api/design-quiz/submit", json={"style": "rustic"})
+    assert res.status_code == 200
+    assert res.get_json()["session_id"] == 1
+
+
+def test_audit_log_text_times_are_converted_in_batches(app, monkeypatch):
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("DROP TABLE audit_logs")
+    c.execute("""
+        CREATE TABLE audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT, product_name TEXT,
+            details TEXT, created_at TEXT, username TEXT
+        )
+    """)
+    c.executemany(
+        "INSERT INTO audit_logs (action, created_at) VALUES (%s, %s)",
+        [("EDIT", f"2026-01-10T22:{i:02d}:01.500000") for i in range(7)]
+    )
+    c.execute("DELETE FROM schema_version WHERE version >= 11")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH", 3)
+
+    assert database.setup()[0] == 11
+
+    conn = database.connect()
+    c = conn.cursor()
+    assert migrations.column_type(c, "audit_logs", "created_at") == "timestamp"
+    assert not migrations.column_exists(c, "audit_logs", "logged_at")
+    c.execute("SELECT created_at FROM audit_logs ORDER BY created_at DESC, id DESC LIMIT 1")
+    assert str(c.fetchone()[0]) == "2026-01-10 22:06:01.500000"
+    conn.close()
+
+
+def test_duplicate_product_names_are_renamed_before_indexing(app):
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("DROP INDEX idx_products_active_name_unique")
+    c.executemany(
+        "INSERT INTO products (name, is_deleted) VALUES (%s, %s)",
+        [("Mug", 0), ("mug ", 0), ("MUG", 1), ("Cup", 0)]
+    )
+    c.execute("DELETE FROM schema_version WHERE version >= 14")
+    conn.commit()
+    conn.close()
+
+    assert database.setup() == [14, 15, 16, 17]
+
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("SELECT name FROM products ORDER BY id")
+    assert [row[0] for row in c.fetchall()] == ["Mug", "mug #2", "MUG", "Cup"]
+    conn.close()
@@ -0,0 +1,58 @@
+import database
+
+
+def test_request_shares_one_connection(app):
+    with app.app_context():
+        first = database.connect()
+        second = database.connect()
+        second.close()
+
+        assert first is second
+        assert database.pool_stats()["in_use"] == 1
+
+    assert database.pool_stats()["in_use"] == 0
+
+
+def test_connection_reused_outside_request(app):
+    conn = database.connect()
+    raw = conn._raw
+    conn.close()
+
+    conn = database.connect()
+    assert conn._raw is raw
+    conn.close()
+
+    stats = database.pool_stats()
+    assert stats["in_use"] == 0
+    assert stats["opened"] == 1
+
+
+def test_nested_close_keeps_outer_transaction(app):
+    outer = database.connect()
+    c = outer.cursor()
+    c.execute("INSERT INTO gallery (name) VALUES (%s)", ("pool-test",))
+
+    inner = database.connect()
+    inner.close()
+
+    outer.commit()
+    c.execute("SELECT COUNT(*) FROM gallery WHERE name = %s", ("pool-test",))
+    assert c.fetchone()[0] == 1
+    outer.close()
+
+
+def test_sqlite_profile_applied_per_connection(app, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_PROFILE", "production")
+    database.close_pool()
+
+    conn = database.connect()
+    c = conn.cursor()
+
+    c.execute("PRAGMA journal_mode")
+    assert c.fetchone()[0] == "wal"
+    c.execute("PRAGMA synchronous")
+    assert c.fetchone()[0] == 1
+    c.execute("PRAGMA busy_timeout")
+    assert c.fetchone()[0] == 10000
+
+    conn.close()
@@ -0,0 +1,187 @@
+import datetime
+import io
+import pytest
+from flask import has_request_context
+
+import catalog
+import database
+import history
+import rollups
+
+
+# Routes behind the hot read paths, with the table aliases that are
+# allowed to be scanned in full because the route really reads (nearly)
+# every row; the planner rightly prefers a table scan for those.
+HOT_ROUTES = [
+    # "matching" is the capped count subquery's result, not a table; with
+    # no filter that count reads every active product
+    ("GET", "/api/inventory?category=wood", {"matching"}),
+    ("GET", "/api/inventory?cursor=" + catalog.encode_cursor(
+        "name", {"name": "product 4000", "id": 4000}), {"matching", "products"}),
+    ("GET", "/api/inventory?sort=-price&cursor=" + catalog.encode_cursor(
+        "-price", {"price": 30, "id": 2000}), {"matching", "products"}),
+    ("GET", "/api/inventory?q=uct 42", {"matching"}),
+    ("GET", "/inventory", {"matching", "products"}),
+    ("POST", "/inventory/import", set()),
+    ("GET", "/api/products/stock", {"products"}),
+    ("GET", "/api/products/stock?since=4990", set()),
+    ("GET", "/sales", set()),
+    ("GET", "/api/materials", set()),
+    # inventory levels list every product
+    ("GET", "/dashboard?from=2025-02-01&to=2025-02-28", {"products"}),
+    ("GET", "/api/dashboard/sales?from=2025-02-01&to=2025-02-28", set()),
+    ("GET", "/api/orders/7", set()),
+    ("GET", "/landing", set()),
+    ("GET", "/api/featured-designs", set()),
+    ("GET", "/gallery/3/designs", set()),
+    # quiz matching scores every design
+    ("GET", "/design-quiz/results/5", {"d"}),
+    ("GET", "/material_guide", {"m"}),
+    ("POST", "/login", set()),
+    ("GET", "/api/history?cursor=" + history.encode_cursor(
+        {"time": datetime.datetime(2025, 3, 1), "type": "SALE", "id": 900}), set()),
+    ("GET", "/api/history?type=SALE&user=cashier", set()),
+    ("GET", "/api/history?type=SALE&status=VOIDED", set()),
+    ("GET", "/api/history?type=INVENTORY&user=admin&to=2025-01-01", set()),
+    ("GET", "/api/history?type=INVENTORY", set()),
+]
+
+# Request bodies for the POST routes above
+FORMS = {
+    "/inventory/import": lambda: {
+        "file": (io.BytesIO(b"Name,Price,Stock\nproduct 42,10,1\nproduct 43,10,1\n"), "import.csv")
+    },
+    "/login": lambda: {"username": "User42", "password": "wrong"},
+}
+
+
+def full_table_scans(c, sql, params=()):
+    """
+    Return the tables (or aliases) that the planner would read with a full
+    sequential scan for the given statement.
+    """
+    scans = []
+
+    if database.is_postgres():
+        c.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = c.fetchone()[0]
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node.get("Node Type") == "Seq Scan":
+                scans.append(node.get("Alias") or node.get("Relation Name"))
+            nodes.extend(node.get("Plans", []))
+        return scans
+
+    c.execute("EXPLAIN QUERY PLAN " + sql, params)
+    for row in c.fetchall():
+        detail = row[-1]
+        # Virtual tables (FTS5) are searched through their own index
+        if detail.startswith("SCAN ") and " USING " not in detail and " VIRTUAL TABLE " not in detail:
+            scans.append(detail.split()[1])
+    return scans
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    # (sql, params) of every statement the instrumented cursors run while
+    # a request is being handled
+    seen = []
+    execute = database.InstrumentedCursor.execute
+
+    def record(self, sql, params=()):
+        if has_request_context():
+            seen.append((sql, params))
+        return execute(self, sql, params)
+
+    monkeypatch.setattr(database.InstrumentedCursor, "execute", record)
+    return seen
+
+
+@pytest.fixture
+def seeded(app):
+    # Big enough that the planners stop preferring scans of tiny tables
+    conn = database.connect()
+    c = conn.cursor()
+    now = datetime.datetime(2025, 1, 1)
+
+    c.executemany(
+        "INSERT INTO products (name, price, stock, is_deleted, category) VALUES (%s, %s, %s, %s, %s)",
+        [(f"product {i}", 10 + i % 50, i % 30, int(i % 20 == 0), "product" if i % 4 else "wood")
+         for i in range(5000)]
+    )
+    c.executemany(
+        "INSERT INTO sales (product_id, product_name, qty, total, username, date, voided) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        [(i % 5000, f"product {i % 5000}", 1 + i % 3, 25.0, "cashier",
+          now + datetime.timedelta(minutes=17 * i), int(i % 50 == 0))
+         for i in range(20000)]
+    )
+    c.executemany(
+        "INSERT INTO orders (username, created_at, line_count, items, total, voided) VALUES (%s, %s, %s, %s, %s, %s)",
+        [("cashier", now + datetime.timedelta(minutes=17 * i), 1, 1, 25.0, int(i % 50 == 0))
+         for i in range(20000)]
+    )
+    c.execute("UPDATE sales SET order_id = id")
+    c.executemany(
+        "INSERT INTO gallery (name, category) VALUES (%s, %s)",
+        [(f"gallery {i}", f"cat {i % 10}") for i in range(200)]
+    )
+    c.executemany(
+        "INSERT INTO gallery_designs (gallery_id, name, image, is_featured) VALUES (%s, %s, %s, %s)",
+        [(i % 200, f"design {i}", "x.png", int(i % 100 == 0)) for i in range(4000)]
+    )
+    c.executemany(
+        "INSERT INTO design_tags (design_id, tag_type, tag_value) VALUES (%s, %s, %s)",
+        [(i % 4000, "style", "rustic") for i in range(12000)]
+    )
+    c.executemany(
+        "INSERT INTO design_quiz_answers (session_id, question_key, answer_value) VALUES (%s, %s, %s)",
+        [(i % 1000, "style", "rustic") for i in range(5000)]
+    )
+    c.executemany(
+        "INSERT INTO materials (name, thickness) VALUES (%s, %s)",
+        [(f"material {i}", 3) for i in range(50)]
+    )
+    c.executemany(
+        "INSERT INTO material_settings (material_id, process, power, passes) VALUES (%s, %s, %s, %s)",
+        [(i % 50, "engrave", 50, 1) for i in range(3000)]
+    )
+    c.executemany(
+        "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+        [(f"user{i}", "x", "staff") for i in range(2000)]
+    )
+    c.executemany(
+        "INSERT INTO audit_logs (action, product_name, created_at) VALUES (%s, %s, %s)",
+        [("EDIT", f"product {i}", now + datetime.timedelta(minutes=i))
+         for i in range(10000)]
+    )
+    rollups.rebuild(c)
+    c.execute("ANALYZE")
+    conn.commit()
+
+    yield c
+
+    conn.close()
+
+
+def test_hot_routes_use_indexes(app, seeded, login_admin, statements, monkeypatch):
+    # The login form carries no CSRF token here
+    monkeypatch.setitem(app.config, "WTF_CSRF_ENABLED", False)
+    failures = {}
+
+    for method, url, allowed in HOT_ROUTES:
+        # Cached inventory totals would hide the count query
+        catalog.clear_cache()
+        statements.clear()
+        form = FORMS.get(url)
+        res = login_admin.open(url, method=method, data=form and form())
+        assert res.status_code < 400, f"{method} {url}: {res.status_code}"
+
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            scans = set(full_table_scans(seeded, sql, params)) - allowed
+            if scans:
+                failures[f"{method} {url}: {database.normalize_sql(sql)}"] = sorted(scans)
+
+    assert not failures, f"full table scans: {failures}"
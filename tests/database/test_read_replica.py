@@ -0,0 +1,71 @@
+import sqlite3
+import tempfile
+import pytest
+
+import database
+
+
+def add_featured_design(path, name):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO gallery (name, category) VALUES (?, ?)", ("Tumbler", "drinkware")
+    )
+    conn.execute(
+        "INSERT INTO gallery_designs (gallery_id, name, image, is_featured) VALUES (last_insert_rowid(), ?, ?, 1)",
+        (name, "/static/x.png")
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def replica(app, test_db_path, monkeypatch):
+    # Second SQLite file standing in for a replica: a copy of the primary
+    # schema whose data deliberately differs.
+    path = tempfile.mkstemp(suffix=".db")[1]
+    src = sqlite3.connect(test_db_path)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+    add_featured_design(test_db_path, "from primary")
+    add_featured_design(path, "from replica")
+
+    monkeypatch.setattr(database, "SQLITE_READ_PATH", path)
+    database.close_pool()
+    return path
+
+
+def featured_names(client):
+    return [d["name"] for d in client.get("/api/featured-designs").get_json()]
+
+
+def test_read_only_route_uses_replica(client, replica):
+    assert featured_names(client) == ["from replica"]
+    assert database.pool_stats()["replica"]["checkouts"] == 1
+
+
+def test_reads_stick_to_primary_after_write(client, replica):
+    client.post("/api/design-quiz/submit", json={"style": "rustic"})
+
+    assert featured_names(client) == ["from primary"]
+
+
+def test_unreachable_replica_falls_back_to_primary(client, replica, monkeypatch, caplog):
+    monkeypatch.setattr(database, "SQLITE_READ_PATH", replica + ".missing")
+    monkeypatch.setattr(database, "_replica_warned_at", 0)
+
+    assert featured_names(client) == ["from primary"]
+    assert database.pool_stats()["replica"]["down"]
+
+    # Retried on the next request, but warned about only once
+    monkeypatch.setattr(database, "_replica_down_until", 0)
+    assert featured_names(client) == ["from primary"]
+    assert [r.levelname for r in caplog.records if r.name == "ae_lasercraft.replica"] == ["WARNING"]
+
+
+def test_writes_leave_the_session_alone_without_a_replica(client):
+    res = client.post("/api/design-quiz/submit", json={"style": "rustic"})
+
+    assert "Set-Cookie" not in res.headers
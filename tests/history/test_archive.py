@@ -0,0 +1,142 @@
+import datetime
+
+import pytest
+
+import archive
+import database
+import rollups
+
+
+TODAY = datetime.date(2026, 10, 17)
+
+
+def seed_sales(rows):
+    conn = database.connect()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO sales (product_name, qty, total, username, date, voided) VALUES (%s, %s, %s, %s, %s, %s)",
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_archive():
+    conn = database.connect()
+    added = archive.archive(conn, retention_days=365, today=TODAY)
+    conn.close()
+    return added
+
+
+@pytest.fixture
+def archive_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def all_history(client, **params):
+    rows = []
+    while True:
+        data = client.get("/api/history", query_string=dict(params, limit=2)).get_json()
+        rows += [(row["type"], row["id"]) for row in data["history"]]
+        if not data["next_cursor"]:
+            return rows
+        params["cursor"] = data["next_cursor"]
+
+
+def test_old_months_move_to_compressed_partitions(archive_dir, fetch):
+    seed_sales([
+        ("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0),
+        ("mug", 2, 20.0, "ben", datetime.datetime(2024, 3, 20, 9), 1),
+        ("cup", 1, 15.0, "ana", datetime.datetime(2025, 9, 30, 23), 0),
+        ("cup", 1, 15.0, "ana", datetime.datetime(2025, 10, 1, 8), 0),
+    ])
+    conn = database.connect()
+    conn.cursor().execute(
+        "INSERT INTO audit_logs (action, product_name, created_at) VALUES (%s, %s, %s)",
+        ("EDIT", "mug", datetime.datetime(2024, 3, 6))
+    )
+    conn.commit()
+    conn.close()
+
+    added = run_archive()
+
+    assert sorted(p["path"] for p in added) == [
+        "audit_logs/2024-03/part-001.ndjson.gz",
+        "sales/2024-03/part-001.ndjson.gz",
+        "sales/2025-09/part-001.ndjson.gz",
+    ]
+    assert (archive_dir / "sales/2024-03/part-001.ndjson.gz").exists()
+    assert fetch("SELECT id FROM sales") == [(4,)]
+    assert fetch("SELECT COUNT(*) FROM audit_logs") == [(0,)]
+    assert archive.verify() == []
+    assert run_archive() == []
+
+
+def test_history_reads_archived_ranges(login_admin, archive_dir):
+    seed_sales([
+        ("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0),
+        ("mug", 2, 20.0, "ben", datetime.datetime(2024, 3, 20, 9), 1),
+        ("cup", 1, 15.0, "ana", datetime.datetime(2024, 5, 1, 9), 0),
+        ("cup", 1, 15.0, "ana", datetime.datetime(2026, 10, 1, 8), 0),
+    ])
+    run_archive()
+
+    # A backdated sale in an archived month becomes a second part
+    seed_sales([("pen", 1, 5.0, "ana", datetime.datetime(2024, 3, 10, 9), 0)])
+    run_archive()
+
+    assert all_history(login_admin) == [("SALE", 4), ("SALE", 3), ("SALE", 2), ("SALE", 5), ("SALE", 1)]
+    assert all_history(login_admin, user="ana", status="COMPLETED") == [("SALE", 4), ("SALE", 3), ("SALE", 5), ("SALE", 1)]
+    assert all_history(login_admin, **{"from": "2024-03-01", "to": "2024-03-15"}) == [("SALE", 5), ("SALE", 1)]
+
+
+def test_older_pages_skip_months_newer_than_the_cursor(login_admin, archive_dir, monkeypatch):
+    seed_sales([
+        ("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0),
+        ("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 6, 9), 0),
+        ("cup", 1, 15.0, "ana", datetime.datetime(2024, 5, 1, 9), 0),
+    ])
+    run_archive()
+
+    cursor = login_admin.get("/api/history?limit=2").get_json()["next_cursor"]
+
+    read = []
+    read_partition = archive.read_partition
+    monkeypatch.setattr(archive, "read_partition", lambda part: read.append(part["month"]) or read_partition(part))
+
+    data = login_admin.get("/api/history", query_string={"limit": 2, "cursor": cursor}).get_json()
+    assert [row["id"] for row in data["history"]] == [1]
+    assert read == ["2024-03"]
+
+
+def test_rows_left_behind_by_a_crash_are_not_listed_twice(login_admin, archive_dir):
+    seed_sales([("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0)])
+    run_archive()
+
+    conn = database.connect()
+    conn.cursor().execute(
+        "INSERT INTO sales (id, product_name, qty, total, username, date, voided) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (1, "mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0)
+    )
+    conn.commit()
+    conn.close()
+
+    assert all_history(login_admin) == [("SALE", 1)]
+
+
+def test_rollup_rebuild_keeps_archived_days(archive_dir, fetch):
+    seed_sales([("mug", 1, 10.0, "ana", datetime.datetime(2024, 3, 5, 9), 0)])
+    conn = database.connect()
+    rollups.rebuild(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    run_archive()
+
+    conn = database.connect()
+    rollups.rebuild(conn.cursor(), since=archive.archived_until("sales"))
+    conn.commit()
+    conn.close()
+
+    assert fetch("SELECT product_name, qty FROM sales_daily_product") == [("mug", 1)]
@@ -0,0 +1,82 @@
+import datetime
+
+import database
+
+
+def seed(sales=(), logs=()):
+    conn = database.connect()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO sales (product_name, qty, total, username, date, voided) VALUES (%s, %s, %s, %s, %s, %s)",
+        sales
+    )
+    c.executemany(
+        "INSERT INTO audit_logs (action, product_name, details, created_at, username) VALUES (%s, %s, %s, %s, %s)",
+        logs
+    )
+    conn.commit()
+    conn.close()
+
+
+def pages(client, **params):
+    seen = []
+    while True:
+        data = client.get("/api/history", query_string=params).get_json()
+        seen.append([(row["type"], row["id"]) for row in data["history"]])
+        if not data["next_cursor"]:
+            return seen
+        params["cursor"] = data["next_cursor"]
+
+
+def test_pages_merge_both_sources_newest_first(login_admin):
+    t = datetime.datetime(2026, 5, 1, 12, 0)
+    seed(
+        sales=[(f"item {i}", 1, 10.0, "admin", t + datetime.timedelta(minutes=i // 2), 0) for i in range(7)],
+        logs=[("EDIT", f"item {i}", "", t + datetime.timedelta(minutes=i), "admin") for i in range(4)],
+    )
+
+    seen = pages(login_admin, limit=3)
+
+    merged = [row for page in seen for row in page]
+    assert [len(page) for page in seen] == [3, 3, 3, 2]
+    assert len(set(merged)) == 11
+    # Same minute: sales first, then audit entries, newest id first
+    assert merged[:5] == [("SALE", 7), ("INVENTORY", 4), ("SALE", 6), ("SALE", 5), ("INVENTORY", 3)]
+
+
+def test_filters_are_applied_server_side(login_admin):
+    t = datetime.datetime(2026, 5, 1, 12, 0)
+    seed(
+        sales=[
+            ("mug", 1, 10.0, "ana", t, 0),
+            ("mug", 1, 10.0, "ben", t, 1),
+            ("mug", 1, 10.0, "ana", t + datetime.timedelta(days=3), 1),
+        ],
+        logs=[("EDIT", "mug", "", t, "ana")],
+    )
+
+    def ids(**params):
+        data = login_admin.get("/api/history", query_string=params).get_json()
+        return [(row["type"], row["id"]) for row in data["history"]]
+
+    assert ids(user="ana") == [("SALE", 3), ("SALE", 1), ("INVENTORY", 1)]
+    assert ids(type="INVENTORY") == [("INVENTORY", 1)]
+    assert ids(status="VOIDED") == [("SALE", 3), ("SALE", 2)]
+    assert ids(**{"from": "2026-05-01", "to": "2026-05-01"}) == [("SALE", 2), ("SALE", 1), ("INVENTORY", 1)]
+    assert login_admin.get("/api/history?type=ORDERS").status_code == 400
+
+
+def test_history_page_renders_one_page(login_admin):
+    t = datetime.datetime(2026, 5, 1, 12, 0)
+    seed(sales=[(f"item {i}", 1, 10.0, "admin", t + datetime.timedelta(minutes=i), 0) for i in range(60)])
+
+    html = login_admin.get("/history").get_data(as_text=True)
+
+    assert html.count('data-event="Sale Completed"') == 50
+    assert "Older →" in html
+
+
+def test_audit_entries_record_the_user(login_admin, fetch):
+    login_admin.post("/inventory/add", json={"name": "mug", "price": 10, "stock": 1})
+
+    assert fetch("SELECT action, username FROM audit_logs") == [("ADD", "admin")]
@@ -0,0 +1,85 @@
+import datetime
+
+import database
+
+
+NOW = datetime.datetime(2026, 10, 17, 9, 30)
+
+
+def execute(sql, params=()):
+    conn = database.connect()
+    conn.cursor().execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def add_product(client, name):
+    client.post("/inventory/add", json={"name": name, "price": 10, "stock": 50})
+    conn = database.connect()
+    c = conn.cursor()
+    c.execute("SELECT id FROM products WHERE name = %s", (name.lower(),))
+    product_id = c.fetchone()[0]
+    conn.close()
+    return product_id
+
+
+def search(client, q, **params):
+    res = client.get("/api/search", query_string=dict(params, q=q))
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_finds_voided_sale_by_reason_and_product_prefix(login_admin):
+    keychain = add_product(login_admin, "Acrylic Keychain")
+    mug = add_product(login_admin, "Mug")
+    login_admin.post("/sales/checkout", json={"cart": [{"id": keychain, "qty": 1}, {"id": mug, "qty": 1}]})
+    login_admin.post("/sales/void/1", json={"reason": "customer changed mind"})
+
+    results = search(login_admin, "acryl", type="SALE")["results"]
+    assert [(r["id"], r["status"]) for r in results] == [(1, "VOIDED")]
+
+    results = search(login_admin, "keychain changed")["results"]
+    assert [(r["type"], r["id"]) for r in results] == [("SALE", 1)]
+
+    # Product name outranks the same word in free text
+    execute(
+        "INSERT INTO audit_logs (action, product_name, details, created_at) VALUES (%s, %s, %s, %s)",
+        ("EDIT", "Wallet", "engraved a mug logo", NOW)
+    )
+    results = search(login_admin, "mug", type="INVENTORY")["results"]
+    assert [r["subject"] for r in results] == ["mug", "Wallet"]
+
+
+def test_index_follows_updates_and_deletes(login_admin):
+    execute("INSERT INTO sales (product_name, qty, total, username, date) VALUES (%s, %s, %s, %s, %s)",
+            ("Coaster", 1, 10.0, "ana", NOW))
+
+    execute("UPDATE sales SET product_name = %s WHERE id = 1", ("Bamboo Coaster",))
+    assert [r["subject"] for r in search(login_admin, "bamboo")["results"]] == ["Bamboo Coaster"]
+
+    execute("DELETE FROM sales WHERE id = 1")
+    assert search(login_admin, "bamboo")["results"] == []
+
+
+def test_results_are_paginated(login_admin):
+    for i in range(25):
+        execute("INSERT INTO audit_logs (action, product_name, created_at) VALUES (%s, %s, %s)",
+                ("EDIT", f"Tumbler {i}", NOW))
+
+    first = search(login_admin, "tumbler")
+    second = search(login_admin, "tumbler", page=2)
+
+    assert (len(first["results"]), first["has_more"]) == (20, True)
+    assert (len(second["results"]), second["has_more"]) == (5, False)
+    assert login_admin.get("/api/search?q=tumbler&page=999").status_code == 400
+    assert search(login_admin, "  ")["results"] == []
+
+
+def test_history_page_shows_search_results(login_admin):
+    execute("INSERT INTO audit_logs (action, product_name, created_at) VALUES (%s, %s, %s)",
+            ("EDIT", "Slate Coaster", NOW))
+
+    html = login_admin.get("/history?q=slate").get_data(as_text=True)
+
+    assert "Slate Coaster" in html
+    assert "Best matches" in html
@@ -0,0 +1,75 @@
+def add_products(client):
+    client.post("/inventory/add", json={"name": "Mug", "category": "drinkware", "price": 150, "stock": 4})
+    client.post("/inventory/add", json={"name": "Coaster", "price": 80, "stock": 10})
+    client.post("/inventory/add", json={"name": "Keychain", "material_type": "acrylic", "price": 45, "stock": 30})
+
+
+def bulk_edit(client, updates):
+    return client.post("/inventory/bulk-edit", json={"updates": updates})
+
+
+def test_applies_partial_updates_and_returns_diff(login_admin, fetch):
+    add_products(login_admin)
+
+    res = bulk_edit(login_admin, [
+        {"id": 1, "price": 175, "stock_delta": -1},
+        {"id": 2, "stock": 12, "category": "tableware", "material_type": "cork"},
+        {"id": 3, "price": 45},
+    ])
+    assert res.status_code == 200
+    data = res.get_json()
+
+    assert (data["updated"], data["unchanged"]) == (2, 1)
+    assert data["changes"] == [
+        {"id": 1, "name": "mug", "changes": {"price": [150, 175], "stock": [4, 3]}},
+        {"id": 2, "name": "coaster", "changes": {
+            "material_type": [None, "cork"], "category": ["uncategorized", "tableware"], "stock": [10, 12]
+        }},
+    ]
+
+    assert fetch("SELECT name, material_type, category, price, stock FROM products ORDER BY id") == [
+        ("mug", None, "drinkware", 175, 3),
+        ("coaster", "cork", "tableware", 80, 12),
+        ("keychain", "acrylic", "uncategorized", 45, 30),
+    ]
+    assert fetch("""
+        SELECT product_id, delta FROM stock_movements
+        WHERE id > 3 ORDER BY product_id
+    """) == [(1, -1), (2, 2)]
+    assert fetch("""
+        SELECT product_name, details FROM audit_logs
+        WHERE action = 'EDIT' ORDER BY id
+    """) == [
+        ("mug", "Price:150.0->175.0 Stock:4->3"),
+        ("coaster", "Material_type:None->cork Category:uncategorized->tableware Stock:10->12"),
+    ]
+
+
+def test_any_invalid_update_rejects_the_whole_batch(login_admin, fetch):
+    add_products(login_admin)
+
+    res = bulk_edit(login_admin, [
+        {"id": 1, "price": 99},
+        {"id": 2, "stock_delta": -11},
+        {"id": 42, "price": 1},
+    ])
+    assert res.status_code == 400
+    assert res.get_json()["errors"] == [
+        {"index": 1, "id": 2, "error": "Stock would go negative"},
+        {"index": 2, "id": 42, "error": "Product not found"},
+    ]
+    assert fetch("SELECT price, stock FROM products WHERE id = 1") == [(150, 4)]
+
+    res = bulk_edit(login_admin, [
+        {"id": 1, "stock": 5, "stock_delta": 1},
+        {"id": 2},
+        {"id": 3, "price": "cheap"},
+        {"id": 3, "stock": 1},
+    ])
+    assert [e["error"] for e in res.get_json()["errors"]] == [
+        "Give stock or stock_delta, not both", "Nothing to change", "Invalid price"
+    ]
+
+
+def test_bulk_edit_requires_staff(login_user):
+    assert bulk_edit(login_user, [{"id": 1, "price": 1}]).status_code == 403
@@ -0,0 +1,126 @@
+import pytest
+
+import catalog
+import database
+
+
+@pytest.fixture(autouse=True)
+def fresh_totals():
+    catalog.clear_cache()
+    yield
+    catalog.clear_cache()
+
+
+def insert_products(rows):
+    # rows: (name, material_type, category, price, stock, is_deleted)
+    conn = database.connect()
+    conn.cursor().executemany("""
+        INSERT INTO products (name, material_type, category, price, stock, is_deleted)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def listing(client, **params):
+    res = client.get("/api/inventory", query_string=params)
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def all_pages(client, **params):
+    names, cursor = [], None
+    while True:
+        data = listing(client, cursor=cursor or "", **params)
+        names += [item["name"] for item in data["items"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            return names
+
+
+def test_keyset_pages_follow_each_sort(login_admin):
+    insert_products([
+        (f"item {i:02d}", "wood", "coasters", float(i % 4), i % 3, int(i == 7))
+        for i in range(20)
+    ])
+    active = [i for i in range(20) if i != 7]
+
+    assert all_pages(login_admin, limit=3) == [f"item {i:02d}" for i in active]
+
+    # Ties on the sort key fall back to id, in the sort's direction
+    by_price = sorted(active, key=lambda i: (-(i % 4), -i))
+    assert all_pages(login_admin, sort="-price", limit=4) == [f"item {i:02d}" for i in by_price]
+
+    by_stock = sorted(active, key=lambda i: (i % 3, i))
+    assert all_pages(login_admin, sort="stock", limit=5) == [f"item {i:02d}" for i in by_stock]
+
+
+def test_search_and_filters(login_admin):
+    insert_products([
+        ("acrylic keychain", "acrylic", "keychains", 120, 5, 0),
+        ("wooden keychain", "wood", "keychains", 90, 5, 0),
+        ("walnut coaster", "wood", "coasters", 150, 5, 0),
+        ("old keychain", "wood", "keychains", 10, 5, 1),
+    ])
+
+    # Substring through the trigram index, case-insensitive
+    assert all_pages(login_admin, q="KeyCh") == ["acrylic keychain", "wooden keychain"]
+    # Too short for trigrams: name prefix
+    assert all_pages(login_admin, q="wa") == ["walnut coaster"]
+
+    assert all_pages(login_admin, material="wood") == ["walnut coaster", "wooden keychain"]
+    assert all_pages(login_admin, q="chain", material="wood", category="keychains") == ["wooden keychain"]
+
+    # Renames reach the search index
+    login_admin.post("/inventory/edit", json={
+        "id": 3, "name": "walnut keychain", "category": "keychains", "price": 150, "stock": 5
+    })
+    assert all_pages(login_admin, q="nut key") == ["walnut keychain"]
+
+
+def test_totals_are_capped_and_cached(login_admin, monkeypatch):
+    insert_products([(f"tumbler {i}", "metal", "tumblers", 300, 1, 0) for i in range(5)])
+    monkeypatch.setattr(catalog, "COUNT_CAP", 3)
+
+    data = listing(login_admin, limit=2)
+    assert (data["total"], data["total_capped"]) == (3, True)
+    assert listing(login_admin, category="none")["total"] == 0
+
+    # Served from the cache until it expires
+    insert_products([("tumbler 5", "metal", "none", 300, 1, 0)])
+    assert listing(login_admin, category="none")["total"] == 0
+    catalog.clear_cache()
+    assert listing(login_admin, category="none")["total"] == 1
+
+
+def test_rejects_bad_paging_input(login_admin):
+    insert_products([(f"item {i}", None, None, 1, 1, 0) for i in range(3)])
+    cursor = listing(login_admin, limit=1)["next_cursor"]
+
+    assert login_admin.get("/api/inventory?sort=colour").status_code == 400
+    assert login_admin.get("/api/inventory?cursor=not-a-cursor").status_code == 400
+    # A cursor taken under one sort can't continue another
+    assert login_admin.get(f"/api/inventory?sort=price&cursor={cursor}").status_code == 400
+
+
+def test_inventory_page_links_to_next_page(login_admin):
+    insert_products([(f"item {i:02d}", None, None, 1, 1, 0) for i in range(30)])
+
+    res = login_admin.get("/inventory?sort=name")
+    assert res.status_code == 200
+    assert b"item 24" in res.data and b"item 25" not in res.data
+    assert b"cursor=" in res.data
+
+
+def test_cache_is_bounded_and_cleared_by_writes(login_admin, monkeypatch):
+    monkeypatch.setattr(catalog, "CACHE_MAX_ENTRIES", 3)
+    for q in ("mug", "cup", "lamp", "vase", "bowl"):
+        listing(login_admin, q=q)
+    assert len(catalog._cache) <= 3
+
+    assert listing(login_admin, category="none")["total"] == 0
+    login_admin.post("/inventory/add", json={"name": "Tray", "category": "none", "price": 5, "stock": 1})
+    assert listing(login_admin, category="none")["total"] == 1
+
+    login_admin.post("/inventory/delete/1")
+    assert listing(login_admin, category="none")["total"] == 0
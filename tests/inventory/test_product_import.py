@@ -0,0 +1,91 @@
+import io
+
+import product_import
+
+
+def upload(client, text, filename="catalogue.csv"):
+    return client.post(
+        "/inventory/import",
+        data={"file": (io.BytesIO(text.encode("utf-8")), filename)},
+        content_type="multipart/form-data"
+    )
+
+
+def test_import_inserts_updates_and_reports_bad_rows(login_admin, monkeypatch, fetch):
+    # Small chunks so the file spans several transactions
+    monkeypatch.setattr(product_import, "CHUNK", 3)
+    login_admin.post("/inventory/add", json={"name": "Mug", "category": "drinkware", "price": 150, "stock": 4})
+    login_admin.post("/inventory/add", json={"name": "Coaster", "price": 80, "stock": 10})
+
+    res = upload(login_admin, "\n".join([
+        "Name,Price,Stock,Material",
+        "Mug,175,10,ceramic",
+        "coaster,80,10,",
+        "Keychain,45,30,acrylic",
+        ",10,1,",
+        "Tumbler,abc,5,metal",
+        "Wallet,300,-2,leather",
+        "",
+        "KEYCHAIN,50,1,",
+        "Slate Board,220,7,stone",
+    ]))
+    assert res.status_code == 200
+    data = res.get_json()
+
+    assert (data["rows"], data["inserted"], data["updated"], data["unchanged"], data["error_count"]) == (8, 2, 1, 1, 4)
+    assert [(e["line"], e["name"], e["error"]) for e in data["errors"]] == [
+        (5, "", "Name is required"),
+        (6, "Tumbler", "Invalid price: 'abc'"),
+        (7, "Wallet", "Stock can't be negative"),
+        (9, "KEYCHAIN", "Duplicate of line 4"),
+    ]
+
+    products = fetch("SELECT name, material_type, category, price, stock FROM products ORDER BY id")
+    assert products == [
+        ("mug", "ceramic", "drinkware", 175, 10),
+        ("coaster", None, "uncategorized", 80, 10),
+        ("keychain", "acrylic", "uncategorized", 45, 30),
+        ("slate board", "stone", "uncategorized", 220, 7),
+    ]
+
+    # Ledger agrees with the new stock; one audit entry for the whole file
+    assert fetch("""
+        SELECT product_id, SUM(delta) FROM stock_movements GROUP BY product_id ORDER BY product_id
+    """) == [(1, 10), (2, 10), (3, 30), (4, 7)]
+    assert fetch("SELECT COUNT(*) FROM stock_movements WHERE reason = 'import'") == [(3,)]
+    assert fetch("SELECT product_name, details, username FROM audit_logs WHERE action = 'IMPORT'") == [
+        ("catalogue.csv", "Rows:8 Inserted:2 Updated:1 Unchanged:1 Errors:4", "admin")
+    ]
+
+
+def test_deleted_names_are_inserted_again(login_admin, fetch):
+    login_admin.post("/inventory/add", json={"name": "Lamp", "price": 500, "stock": 1})
+    login_admin.post("/inventory/delete/1")
+
+    data = upload(login_admin, "name,price,stock\nlamp,450,3\nbookmark,20,40\n").get_json()
+
+    assert (data["inserted"], data["updated"], data["errors"]) == (2, 0, [])
+    assert fetch("SELECT id, name, is_deleted FROM products ORDER BY id") == [
+        (1, "lamp", 1), (2, "lamp", 0), (3, "bookmark", 0)
+    ]
+
+
+def test_rejects_unusable_files(login_admin, fetch):
+    res = upload(login_admin, "name,cost\nmug,10\n")
+    assert res.status_code == 400
+    assert res.get_json()["error"] == "Missing column(s): price, stock"
+
+    res = login_admin.post("/inventory/import", data={}, content_type="multipart/form-data")
+    assert res.status_code == 400
+
+    res = login_admin.post(
+        "/inventory/import",
+        data={"file": (io.BytesIO(b"name,price,stock\n\xff\xfe,1,1\n"), "bad.csv")},
+        content_type="multipart/form-data"
+    )
+    assert res.status_code == 400
+    assert fetch("SELECT COUNT(*) FROM products") == [(0,)]
+
+
+def test_import_requires_staff(login_user):
+    assert upload(login_user, "name,price,stock\nmug,10,1\n").status_code == 403
@@ -0,0 +1,66 @@
+import datetime
+
+import database
+import stock_ledger
+
+
+def add(fetch, client, name, stock):
+    client.post("/inventory/add", json={"name": name, "price": 10, "stock": stock})
+    return fetch("SELECT id FROM products WHERE name = %s", (name,))[0][0]
+
+
+def as_of(client, at):
+    res = client.get("/api/inventory/stock-as-of", query_string={"at": at.isoformat()})
+    return {p["id"]: p["stock"] for p in res.get_json()["products"]}
+
+
+def test_every_stock_change_is_in_the_ledger(login_admin, fetch):
+    mug = add(fetch, login_admin, "mug", 10)
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 3}]})
+    sale_id = fetch("SELECT id FROM sales")[0][0]
+    login_admin.post(f"/sales/void/{sale_id}", json={"reason": "test"})
+    login_admin.post("/inventory/edit", json={
+        "id": mug, "name": "mug", "price": 10, "stock": 4
+    })
+
+    assert fetch("SELECT delta, reason FROM stock_movements ORDER BY id") == [
+        (10, "edit"), (-3, "sale"), (3, "void"), (-6, "edit")
+    ]
+
+
+def test_stock_as_of_uses_snapshots_and_later_movements(login_admin, fetch):
+    mug = add(fetch, login_admin, "mug", 10)
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 3}]})
+    after_sale = datetime.datetime.now()
+
+    conn = database.connect()
+    assert stock_ledger.compact(conn) == (1, [])
+    conn.close()
+
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 2}]})
+    after_second_sale = datetime.datetime.now()
+    login_admin.post("/inventory/edit", json={
+        "id": mug, "name": "mug", "price": 10, "stock": 20
+    })
+
+    assert as_of(login_admin, after_sale) == {mug: 7}
+    assert as_of(login_admin, after_second_sale) == {mug: 5}
+    assert as_of(login_admin, datetime.datetime.now()) == {mug: 20}
+
+    res = login_admin.get("/api/inventory/stock-as-of", query_string={"at": "2000-01-01"})
+    assert res.status_code == 404
+
+
+def test_compaction_reconciles_drift(login_admin, fetch):
+    mug = add(fetch, login_admin, "mug", 10)
+
+    # Changed behind the app's back
+    conn = database.connect()
+    conn.cursor().execute("UPDATE products SET stock = 25 WHERE id = %s", (mug,))
+    conn.commit()
+
+    assert stock_ledger.compact(conn) == (1, [mug])
+    conn.close()
+
+    assert fetch("SELECT SUM(delta) FROM stock_movements") == [(25,)]
+    assert fetch("SELECT stock FROM stock_snapshots WHERE product_id = %s", (mug,)) == [(25,)]
@@ -0,0 +1,56 @@
+import io
+
+
+def add(client, name, **fields):
+    return client.post("/inventory/add", json=dict({"name": name, "price": 10, "stock": 5}, **fields))
+
+
+def edit(client, product_id, name):
+    return client.post("/inventory/edit", json={"id": product_id, "name": name, "price": 10, "stock": 5})
+
+
+def test_add_rejects_names_that_normalize_the_same(login_admin, fetch):
+    assert add(login_admin, "Mug").status_code == 200
+
+    res = add(login_admin, "  MUG ")
+    assert res.status_code == 400
+    assert res.get_json()["message"] == "Product name already exists"
+    assert fetch("SELECT name FROM products") == [("mug",)]
+
+
+def test_edit_maps_the_constraint_to_duplicate_error(login_admin, fetch):
+    add(login_admin, "Mug")
+    add(login_admin, "Cup", stock=3)
+
+    res = edit(login_admin, 2, "MUG")
+    assert res.status_code == 400
+    assert res.get_json()["message"] == "Duplicate product name"
+    assert fetch("SELECT name, stock FROM products WHERE id = 2") == [("cup", 3)]
+    assert fetch("SELECT COUNT(*) FROM stock_movements WHERE product_id = 2") == [(1,)]
+
+    # Renaming a product to its own name in another case is fine
+    assert edit(login_admin, 1, "Mug").status_code == 200
+
+
+def test_deleted_products_release_their_normalized_name(login_admin):
+    add(login_admin, "Lamp")
+    login_admin.post("/inventory/delete/1")
+    add(login_admin, "Shade")
+
+    assert edit(login_admin, 2, "LAMP").status_code == 200
+
+    login_admin.post("/inventory/delete/2")
+    assert add(login_admin, "Lamp").status_code == 200
+
+
+def test_import_matches_names_case_insensitively(login_admin, fetch):
+    add(login_admin, "Mug")
+    edit(login_admin, 1, "Mug")
+
+    res = login_admin.post(
+        "/inventory/import",
+        data={"file": (io.BytesIO(b"name,price,stock\nmug,12,8\n"), "mugs.csv")},
+        content_type="multipart/form-data"
+    )
+    assert (res.get_json()["updated"], res.get_json()["inserted"]) == (1, 0)
+    assert fetch("SELECT name, price, stock FROM products") == [("Mug", 12, 8)]
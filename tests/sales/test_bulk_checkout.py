@@ -0,0 +1,43 @@
+def test_bulk_checkout_applies_each_order_once(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 25)
+    coaster = add_product("coaster", 20, 3)
+
+    orders = [
+        {"key": f"q-{i}", "cart": [{"id": mug, "qty": 1}], "sold_at": "2026-01-05T10:00:00"}
+        for i in range(20)
+    ]
+    orders.append({"key": "q-short", "cart": [{"id": coaster, "qty": 4}]})
+
+    res = login_admin.post("/sales/checkout/bulk", json={"orders": orders})
+    results = res.get_json()["results"]
+
+    assert res.status_code == 200
+    assert [r["status"] for r in results] == ["success"] * 20 + ["error"]
+    assert results[-1]["error"] == "Insufficient stock"
+    assert fetch("SELECT stock FROM products ORDER BY id") == [(5,), (3,)]
+    assert fetch("SELECT COUNT(*), MIN(created_at) FROM orders") == [(20, "2026-01-05 10:00:00")]
+
+    # The terminal lost the response and sends the whole queue again
+    again = login_admin.post("/sales/checkout/bulk", json={"orders": orders}).get_json()["results"]
+
+    assert [r.get("order_id") for r in again[:20]] == [r["order_id"] for r in results[:20]]
+    assert all(r["replayed"] for r in again[:20])
+    assert fetch("SELECT stock FROM products ORDER BY id") == [(5,), (3,)]
+
+
+def test_bulk_checkout_orders_share_stock_in_queue_order(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 3)
+
+    res = login_admin.post("/sales/checkout/bulk", json={"orders": [
+        {"key": "a", "cart": [{"id": mug, "qty": 2}]},
+        {"key": "b", "cart": [{"id": mug, "qty": 2}]},
+        {"key": "c", "cart": [{"id": mug, "qty": 1}]},
+        {"cart": [{"id": mug, "qty": 1}]},
+    ]})
+
+    assert [r["status"] for r in res.get_json()["results"]] == [
+        "success", "error", "success", "error"
+    ]
+    assert fetch("SELECT stock FROM products") == [(0,)]
+    # The rejected order's key is free to be retried
+    assert fetch("SELECT request_key FROM idempotency_keys ORDER BY request_key") == [("a",), ("c",)]
@@ -0,0 +1,43 @@
+def test_checkout_decrements_stock_and_records_lines(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+
+    res = login_admin.post("/sales/checkout", json={"cart": [
+        {"id": mug, "name": "mug", "qty": 2, "price": 50},
+        {"id": coaster, "name": "coaster", "qty": 5, "price": 20},
+    ]})
+
+    assert res.get_json()["status"] == "success"
+    assert fetch("SELECT id, stock FROM products ORDER BY id") == [(mug, 8), (coaster, 0)]
+    assert fetch("SELECT product_name, qty, total, username FROM sales ORDER BY id") == [
+        ("mug", 2, 100.0, "admin"),
+        ("coaster", 5, 100.0, "admin"),
+    ]
+
+
+def test_checkout_reports_every_short_line(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 1)
+    coaster = add_product("coaster", 20, 2)
+    keychain = add_product("keychain", 10, 50)
+
+    res = login_admin.post("/sales/checkout", json={"cart": [
+        {"id": mug, "qty": 3},
+        {"id": keychain, "qty": 1},
+        {"id": coaster, "qty": 4},
+    ]})
+
+    assert res.status_code == 400
+    assert res.get_json()["items"] == [
+        {"id": mug, "name": "mug", "requested": 3, "available": 1},
+        {"id": coaster, "name": "coaster", "requested": 4, "available": 2},
+    ]
+    assert fetch("SELECT stock FROM products ORDER BY id") == [(1,), (2,), (50,)]
+    assert fetch("SELECT COUNT(*) FROM sales") == [(0,)]
+
+
+def test_checkout_rejects_invalid_items(login_admin):
+    res = login_admin.post("/sales/checkout", json={"cart": [
+        {"id": "custom-test", "name": "Test Item", "qty": 1, "price": 10}
+    ]})
+
+    assert res.status_code == 400
@@ -0,0 +1,61 @@
+import datetime
+
+import database
+
+
+def post(client, cart, key):
+    return client.post(
+        "/sales/checkout",
+        json={"cart": cart},
+        headers={"Idempotency-Key": key}
+    )
+
+
+def test_retried_checkout_is_applied_once(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    cart = [{"id": mug, "qty": 2}]
+
+    first = post(login_admin, cart, "cart-1")
+    retry = post(login_admin, cart, "cart-1")
+
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json()
+    assert fetch("SELECT stock FROM products") == [(8,)]
+    assert fetch("SELECT COUNT(*) FROM orders") == [(1,)]
+
+
+def test_key_reused_for_another_cart_is_rejected(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    post(login_admin, [{"id": mug, "qty": 2}], "cart-1")
+
+    res = post(login_admin, [{"id": mug, "qty": 3}], "cart-1")
+
+    assert res.status_code == 422
+    assert fetch("SELECT stock FROM products") == [(8,)]
+
+
+def test_failed_checkout_does_not_burn_the_key(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 1)
+    cart = [{"id": mug, "qty": 2}]
+
+    assert post(login_admin, cart, "cart-1").status_code == 400
+    assert fetch("SELECT COUNT(*) FROM idempotency_keys") == [(0,)]
+
+
+def test_expired_keys_are_purged(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    post(login_admin, [{"id": mug, "qty": 1}], "old")
+
+    conn = database.connect()
+    conn.cursor().execute(
+        "UPDATE idempotency_keys SET expires_at = %s",
+        (datetime.datetime.now() - datetime.timedelta(seconds=1),)
+    )
+    conn.commit()
+    conn.close()
+
+    # The expired key is purged, so its second use is a fresh sale
+    assert "Idempotent-Replayed" not in post(login_admin, [{"id": mug, "qty": 1}], "old").headers
+    assert fetch("SELECT stock FROM products") == [(8,)]
+    assert fetch("SELECT COUNT(*) FROM idempotency_keys") == [(1,)]
@@ -0,0 +1,77 @@
+import json
+
+import database
+import events
+
+
+def published():
+    return [(kind, json.loads(payload)) for _, kind, payload in events.fetch_since(0)]
+
+
+def test_write_paths_publish_events(login_admin, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+
+    order_id = login_admin.post("/sales/checkout", json={"cart": [
+        {"id": mug, "qty": 2}, {"id": coaster, "qty": 1}
+    ]}).get_json()["order_id"]
+    login_admin.post(f"/inventory/delete/{coaster}")
+
+    assert published() == [
+        ("sale", {"orders": [{"id": order_id, "username": "admin", "total": 120.0}]}),
+        ("stock", {"products": [
+            {"id": mug, "stock": 8, "deleted": False},
+            {"id": coaster, "stock": 4, "deleted": False},
+        ]}),
+        ("stock", {"products": [{"id": coaster, "stock": 4, "deleted": True}]}),
+    ]
+
+
+def test_stream_replays_backlog_then_pushes_new_events(login_admin, monkeypatch, add_product):
+    monkeypatch.setattr(events, "POLL_SECONDS", 0.05)
+    mug = add_product("mug", 50, 10)
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 1}]})
+
+    stream = events.stream(last_event_id=0)
+    try:
+        assert next(stream).startswith("retry:")
+        assert next(stream).startswith("id: 1\nevent: sale\n")
+        assert next(stream).startswith("id: 2\nevent: stock\n")
+
+        # Published by another request while this stream is connected
+        login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 1}]})
+
+        assert next(stream).startswith("id: 3\nevent: sale\n")
+        assert '"stock": 8' in next(stream)
+    finally:
+        stream.close()
+
+
+def test_events_endpoint_streams(login_admin):
+    res = login_admin.get("/api/events", headers={"Last-Event-ID": "0"})
+    try:
+        assert res.mimetype == "text/event-stream"
+        assert next(res.response).startswith(b"retry:")
+    finally:
+        res.close()
+
+
+def test_reconnect_replays_a_backlog_longer_than_one_batch(app):
+    conn = database.connect()
+    c = conn.cursor()
+    for i in range(events.BATCH + 100):
+        events.publish(c, "stock", {"products": []})
+    conn.commit()
+    conn.close()
+
+    # Another client has already moved the hub's cursor to the end
+    live = events.stream()
+    behind = events.stream(last_event_id=0)
+    try:
+        next(live)
+        next(behind)
+        ids = [int(next(behind).split("\n")[0][4:]) for _ in range(events.BATCH + 100)]
+        assert ids == list(range(1, events.BATCH + 101))
+    finally:
+        behind.close()
+        live.close()
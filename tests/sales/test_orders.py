@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app import limiter
+
+
+def checkout(client, *cart):
+    res = client.post("/sales/checkout", json={"cart": list(cart)})
+    assert res.status_code == 200
+    return res.get_json()["order_id"]
+
+
+def test_checkout_writes_one_order_header(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+
+    order_id = checkout(login_admin, {"id": mug, "qty": 2}, {"id": coaster, "qty": 3})
+
+    assert fetch("SELECT id, username, line_count, items, total, voided FROM orders") == [
+        (order_id, "admin", 2, 5, 160.0, 0)
+    ]
+    assert fetch("SELECT DISTINCT order_id FROM sales") == [(order_id,)]
+
+    receipt = login_admin.get(f"/api/orders/{order_id}").get_json()
+    assert receipt["total"] == 160.0
+    assert [(l["name"], l["qty"]) for l in receipt["lines"]] == [("mug", 2), ("coaster", 3)]
+
+
+def test_voiding_lines_keeps_order_total_net(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+    order_id = checkout(login_admin, {"id": mug, "qty": 2}, {"id": coaster, "qty": 3})
+    mug_line, coaster_line = [r[0] for r in fetch("SELECT id FROM sales ORDER BY id")]
+
+    login_admin.post(f"/sales/void/{mug_line}", json={"reason": "test"})
+    assert fetch("SELECT items, total, voided FROM orders") == [(3, 60.0, 0)]
+
+    login_admin.post(f"/sales/void/{coaster_line}", json={"reason": "test"})
+    assert fetch("SELECT items, total, voided FROM orders") == [(0, 0.0, 1)]
+    assert fetch("SELECT stock FROM products ORDER BY id") == [(10,), (5,)]
+
+    res = login_admin.post(f"/sales/orders/{order_id}/void", json={})
+    assert res.status_code == 400
+
+
+def test_void_order_restocks_every_line(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+    kept = checkout(login_admin, {"id": mug, "qty": 1})
+    order_id = checkout(login_admin, {"id": mug, "qty": 2}, {"id": coaster, "qty": 3})
+
+    res = login_admin.post(f"/sales/orders/{order_id}/void", json={"reason": "refund"})
+
+    assert res.get_json()["status"] == "success"
+    assert fetch("SELECT stock FROM products ORDER BY id") == [(9,), (5,)]
+    assert fetch("SELECT COUNT(*) FROM sales WHERE voided = 1") == [(2,)]
+    assert fetch("SELECT id FROM orders WHERE voided = 0") == [(kept,)]
+
+
+def test_concurrent_line_voids_void_the_order(login_admin, fetch, add_product, login_as, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    items = [add_product(name, 10, 5) for name in ("mug", "coaster", "keychain", "tumbler")]
+    order_id = checkout(login_admin, *[{"id": pid, "qty": 1} for pid in items])
+    lines = [r[0] for r in fetch("SELECT id FROM sales ORDER BY id")]
+
+    terminals = [login_as("admin") for _ in lines]
+    with ThreadPoolExecutor(max_workers=len(lines)) as pool:
+        codes = list(pool.map(
+            lambda i: terminals[i].post(f"/sales/void/{lines[i]}", json={}).status_code,
+            range(len(lines))
+        ))
+
+    assert codes == [200] * len(lines)
+    assert fetch("SELECT items, total, voided FROM orders WHERE id = %s", (order_id,)) == [(0, 0.0, 1)]
@@ -0,0 +1,100 @@
+import datetime
+
+import database
+import rollups
+
+
+def rollup_rows(fetch):
+    return (
+        fetch("SELECT day, revenue, orders, items FROM sales_daily ORDER BY day"),
+        fetch("SELECT day, product_name, qty, revenue FROM sales_daily_product ORDER BY day, product_name"),
+    )
+
+
+def test_checkout_and_voids_keep_rollups_equal_to_rebuild(login_admin, fetch, add_product):
+    mug = add_product("mug", 50, 20)
+    coaster = add_product("coaster", 20, 20)
+
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 2}, {"id": coaster, "qty": 1}]})
+    order_id = login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 1}]}).get_json()["order_id"]
+    login_admin.post("/sales/checkout/bulk", json={"orders": [
+        {"key": "offline", "cart": [{"id": coaster, "qty": 3}], "sold_at": "2026-01-05T09:00:00"}
+    ]})
+    coaster_line = fetch("SELECT id FROM sales WHERE product_name = 'coaster' ORDER BY id")[0][0]
+    login_admin.post(f"/sales/void/{coaster_line}", json={"reason": "test"})
+    login_admin.post(f"/sales/orders/{order_id}/void", json={"reason": "test"})
+
+    incremental = rollup_rows(fetch)
+
+    conn = database.connect()
+    rollups.rebuild(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    assert incremental == rollup_rows(fetch)
+    daily, _ = incremental
+    assert [row[1:] for row in daily] == [(60.0, 1, 3), (100.0, 1, 2)]
+
+
+def test_dashboard_reads_rollups(login_admin, add_product):
+    mug = add_product("mug", 50, 20)
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 3}]})
+
+    # Sale lines alone (no rollup rows) no longer show up on the dashboard
+    conn = database.connect()
+    conn.cursor().execute("DELETE FROM sales_daily_product")
+    conn.commit()
+    conn.close()
+
+    html = login_admin.get("/dashboard").get_data(as_text=True)
+
+    top_product = html.split("Top Product", 1)[1].split("</h2>", 1)[0]
+    assert "₱150.0" in html
+    assert "N/A" in top_product
+
+
+def test_chart_api_filters_and_buckets_by_range(login_admin, add_product):
+    mug = add_product("mug", 50, 20)
+    login_admin.post("/sales/checkout/bulk", json={"orders": [
+        {"key": "a", "cart": [{"id": mug, "qty": 1}], "sold_at": "2026-03-02T10:00:00"},
+        {"key": "b", "cart": [{"id": mug, "qty": 2}], "sold_at": "2026-03-08T10:00:00"},
+        {"key": "c", "cart": [{"id": mug, "qty": 4}], "sold_at": "2026-04-01T10:00:00"},
+    ]})
+
+    data = login_admin.get("/api/dashboard/sales?from=2026-03-01&to=2026-03-31&granularity=week").get_json()
+
+    assert data["totals"] == {"revenue": 150.0, "orders": 2, "items": 3}
+    assert [p["period"] for p in data["series"]][:3] == ["2026-02-23", "2026-03-02", "2026-03-09"]
+    assert [p["revenue"] for p in data["series"]][:3] == [0, 150.0, 0]
+
+    months = login_admin.get("/api/dashboard/sales?from=2026-03-01&to=2026-04-30&granularity=month").get_json()
+    assert [(p["period"], p["revenue"]) for p in months["series"]] == [("2026-03-01", 150.0), ("2026-04-01", 200.0)]
+
+    assert login_admin.get("/api/dashboard/sales?from=2026-04-01&to=2026-03-01").status_code == 400
+    assert login_admin.get("/api/dashboard/sales?granularity=hour").status_code == 400
+
+
+def test_long_ranges_are_downsampled(login_admin):
+    data = login_admin.get("/api/dashboard/sales?from=2020-01-01&to=2025-12-31").get_json()
+
+    assert data["downsampled"]
+    assert len(data["series"]) == rollups.MAX_POINTS
+    assert data["series"][0]["period"] == "2020-01-01"
+    assert data["series"][-1]["period"] == "2025-12-31"
+
+
+def test_lttb_keeps_peaks():
+    ys = [0] * 1000
+    ys[500] = 99
+
+    keep = rollups.lttb(list(range(1000)), ys, 20)
+
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep
+
+
+def test_parse_range_defaults_to_last_30_days():
+    start, end, granularity = rollups.parse_range(today=datetime.date(2026, 10, 17))
+
+    assert (start, end, granularity) == (datetime.date(2026, 9, 18), datetime.date(2026, 10, 18), "day")
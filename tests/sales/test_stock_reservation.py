@@ -0,0 +1,44 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from app import limiter
+
+
+CHECKOUTS = 300
+TERMINALS = 16
+
+
+def test_parallel_checkouts_never_oversell(admin_user, monkeypatch, fetch, add_product, login_as):
+    monkeypatch.setattr(limiter, "enabled", False)
+    product = add_product("last keychains", 15, 100)
+    material = add_product("acrylic sheet", 30, 40)
+
+    terminals = [login_as("admin") for _ in range(TERMINALS)]
+
+    def sell(i):
+        qty = random.choice([1, 2, 3])
+        cart = [{"id": product, "name": "last keychains", "qty": qty, "price": 15}]
+        if i % 3 == 0:
+            # custom item priced from the pricing page uses material stock
+            cart.append({"id": material, "name": "custom sign", "qty": 1,
+                         "price": 120, "source": "pricing"})
+
+        res = terminals[i % TERMINALS].post("/sales/checkout", json={"cart": cart})
+        return res.status_code, res.get_json(), qty
+
+    with ThreadPoolExecutor(max_workers=TERMINALS) as pool:
+        results = list(pool.map(sell, range(CHECKOUTS)))
+
+    assert {status for status, _, _ in results} <= {200, 400}
+    assert all(body["error"] == "Insufficient stock" for status, body, _ in results if status == 400)
+
+    sold = sum(qty for status, _, qty in results if status == 200)
+    stock = dict(fetch("SELECT id, stock FROM products"))
+    lines = dict(fetch("SELECT product_id, SUM(qty) FROM sales GROUP BY product_id"))
+
+    assert stock[product] >= 0 and stock[material] >= 0
+    assert stock[product] + lines[product] == 100
+    assert stock[material] + lines[material] == 40
+    assert lines[product] == sold
+    # demand far exceeds supply, so everything that could sell did
+    assert stock[product] < 3
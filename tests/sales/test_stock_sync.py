@@ -0,0 +1,68 @@
+import audit
+import database
+import events
+
+
+def test_since_returns_only_changed_products(login_admin, add_product):
+    mug = add_product("mug", 50, 10)
+    coaster = add_product("coaster", 20, 5)
+    keychain = add_product("keychain", 10, 8)
+
+    full = login_admin.get("/api/products/stock").get_json()
+    assert [p["id"] for p in full["products"]] == [mug, coaster, keychain]
+
+    login_admin.post("/sales/checkout", json={"cart": [{"id": coaster, "qty": 2}]})
+    login_admin.post(f"/inventory/delete/{keychain}")
+
+    delta = login_admin.get(f"/api/products/stock?since={full['version']}").get_json()
+
+    assert delta["version"] > full["version"]
+    assert delta["products"] == [
+        {"id": coaster, "stock": 3, "deleted": False},
+        {"id": keychain, "stock": 8, "deleted": True},
+    ]
+
+    caught_up = login_admin.get(f"/api/products/stock?since={delta['version']}").get_json()
+    assert caught_up["products"] == []
+
+
+def test_unchanged_catalogue_is_not_modified(login_admin, add_product):
+    mug = add_product("mug", 50, 10)
+
+    first = login_admin.get("/api/products/stock?since=0")
+    again = login_admin.get(
+        "/api/products/stock?since=0",
+        headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert again.status_code == 304
+
+    login_admin.post("/sales/checkout", json={"cart": [{"id": mug, "qty": 1}]})
+    changed = login_admin.get(
+        "/api/products/stock?since=0",
+        headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert changed.status_code == 200
+
+
+def test_cursor_ahead_of_the_horizon_gets_the_full_list(login_admin, add_product):
+    mug = add_product("mug", 50, 10)
+
+    data = login_admin.get("/api/products/stock?since=1000000").get_json()
+    assert data["version"] < 1000000
+    assert [p["id"] for p in data["products"]] == [mug]
+
+
+def test_etag_ignores_writes_outside_products(login_admin, add_product):
+    add_product("mug", 50, 10)
+    first = login_admin.get("/api/products/stock?since=0")
+
+    conn = database.connect()
+    c = conn.cursor()
+    audit.record(c, "LOGIN", "admin")
+    events.publish(c, "sale", {"orders": []})
+    conn.commit()
+    conn.close()
+
+    again = login_admin.get("/api/products/stock?since=0")
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.get_json()["version"] == first.get_json()["version"]